@@ -0,0 +1,244 @@
+"""Load analytics backed by incrementally maintained summary tables.
+
+The dashboard polls these numbers every minute for hundreds of teams, so
+they are never computed by scanning `feedback` and `sessions`:
+
+- `PlanWeekStat` (one row per plan/week) is written together with the plan
+  (`week_stat_rows`, from the generated plan in memory) and its feedback
+  totals are bumped by `add_feedback` (one row, `main.store_feedback`) or
+  `add_feedback_batch` (`feedback.store_feedback_batch`, used by the batch
+  endpoint and the write-behind buffer)
+- `LevelWeekStat` (one row per level/week) is bumped the same way
+- bumps are INSERT ... ON CONFLICT DO UPDATE upserts, so concurrent
+  writers cannot race on a missing summary row
+- `add_feedback_batch` aggregates many feedback rows in memory first and
+  applies one bump per summary row, with a constant number of statements
+- reads (`plan_weeks`, `level_trends`) are primary-key range lookups on the
+  summary tables; averages are derived from the stored sums
+
+`backfill` rebuilds the summary tables from the base tables once, for
+databases created before they existed.
+"""
+
+from sqlalchemy import func, insert, select
+
+from . import models
+from .db import dialect_insert
+from .schemas import CUMPLIMIENTO_MAX, CUMPLIMIENTO_MIN, RPE_MAX, RPE_MIN
+
+
+def week_stat_rows(plan_id, plan):
+    """Return the PlanWeekStat rows of a freshly generated `types.Plan`."""
+    rows = []
+    for week_idx, week in enumerate(plan.weeks):
+        rows.append(
+            {
+                'plan_id': plan_id,
+                'week_idx': week_idx,
+                'sesiones': len(week),
+                'carga_planificada': week.carga,
+                'rpe_planificado_sum': sum(s.rpe for s in week),
+                'feedback_count': 0,
+                'cumplimiento_sum': 0,
+                'rpe_percibido_sum': 0,
+            }
+        )
+    return rows
+
+
+def _bump(db, model, key, values):
+    """Add one feedback to the summary row `key`, creating it if needed.
+
+    A single INSERT ... ON CONFLICT DO UPDATE, so concurrent writers (e.g.
+    several Postgres workers, where `write_lock` does nothing) cannot both
+    miss the row and race to insert it.
+    """
+    _bump_many(db, model, tuple(key), {tuple(key.values()): (1, values['cumplimiento_pct'], values['rpe_promedio'])})
+
+
+def check_feedback(values):
+    """Raise ValueError unless the feedback values are within their scales.
+
+    The API validates them already (`schemas.FeedbackIn`); this guards the
+    summary tables against other writers, since a single out-of-range
+    value would skew the running averages for good.
+    """
+    if values['week_idx'] < 0:
+        raise ValueError(f"week_idx must be >= 0, got {values['week_idx']}")
+    if not CUMPLIMIENTO_MIN <= values['cumplimiento_pct'] <= CUMPLIMIENTO_MAX:
+        raise ValueError(f"cumplimiento_pct out of range: {values['cumplimiento_pct']}")
+    if not RPE_MIN <= values['rpe_promedio'] <= RPE_MAX:
+        raise ValueError(f"rpe_promedio out of range: {values['rpe_promedio']}")
+
+
+def add_feedback(db, values):
+    """Add a feedback row and update the summary tables (no commit).
+
+    `values` holds the Feedback columns (plan_id, week_idx, cumplimiento_pct,
+    rpe_promedio, notas). Feedback for an unknown plan is stored but not
+    aggregated; out-of-range values raise ValueError (`check_feedback`).
+    """
+    check_feedback(values)
+    db.add(models.Feedback(**values))
+    nivel = db.scalar(select(models.Plan.nivel).where(models.Plan.id == values['plan_id']))
+    if nivel is not None:
+        PW, LW = models.PlanWeekStat, models.LevelWeekStat
+        _bump(db, PW, {'plan_id': values['plan_id'], 'week_idx': values['week_idx']}, values)
+        _bump(db, LW, {'nivel': nivel, 'week_idx': values['week_idx']}, values)
+    return nivel
+
+
+def _bump_many(db, model, key_cols, totals):
+    """Add aggregated feedback totals {key: (count, cumplimiento, rpe)} to
+    the summary rows of `model`, creating missing rows.
+
+    One executemany INSERT ... ON CONFLICT DO UPDATE: existing rows get the
+    totals added and missing ones are created, atomically per row.
+    """
+    t = model.__table__
+    stmt = dialect_insert(db)(t)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[t.c[c] for c in key_cols],
+        set_={
+            'feedback_count': t.c.feedback_count + stmt.excluded.feedback_count,
+            'cumplimiento_sum': t.c.cumplimiento_sum + stmt.excluded.cumplimiento_sum,
+            'rpe_percibido_sum': t.c.rpe_percibido_sum + stmt.excluded.rpe_percibido_sum,
+        },
+    )
+    rows = [
+        dict(zip(key_cols, key), feedback_count=n, cumplimiento_sum=c, rpe_percibido_sum=r)
+        for key, (n, c, r) in totals.items()
+    ]
+    db.execute(stmt, rows)
+
+
+def add_feedback_batch(db, rows):
+    """Add many feedback rows and update the summary tables (no commit).
+
+    Same result as calling `add_feedback` for each row, but the summary
+    deltas are summed per plan/week and level/week first, so the cost is a
+    fixed handful of statements however many rows there are. Returns the
+    number of rows stored. A row with out-of-range values raises ValueError
+    before anything is written.
+    """
+    if not rows:
+        return 0
+    for r in rows:
+        check_feedback(r)
+    db.execute(insert(models.Feedback), [dict(r) for r in rows])
+    P = models.Plan
+    niveles = dict(db.execute(select(P.id, P.nivel).where(P.id.in_({r['plan_id'] for r in rows}))).all())
+    plan_totals, level_totals = {}, {}
+    for r in rows:
+        nivel = niveles.get(r['plan_id'])
+        if nivel is None:
+            continue
+        for totals, key in ((plan_totals, (r['plan_id'], r['week_idx'])), (level_totals, (nivel, r['week_idx']))):
+            n, c, rpe = totals.get(key, (0, 0, 0))
+            totals[key] = (n + 1, c + r['cumplimiento_pct'], rpe + r['rpe_promedio'])
+    if plan_totals:
+        _bump_many(db, models.PlanWeekStat, ('plan_id', 'week_idx'), plan_totals)
+        _bump_many(db, models.LevelWeekStat, ('nivel', 'week_idx'), level_totals)
+    return len(rows)
+
+
+def _avg(total, count):
+    return round(total / count, 2) if count else None
+
+
+def plan_weeks(db, plan_ids):
+    """Return {plan_id: [week summary, ...]} for the given plans.
+
+    Each week summary has the planned load, planned vs perceived average
+    RPE and average compliance (None until feedback arrives).
+    """
+    W = models.PlanWeekStat
+    rows = db.execute(select(W).where(W.plan_id.in_(plan_ids)).order_by(W.plan_id, W.week_idx)).scalars()
+    out = {plan_id: [] for plan_id in plan_ids}
+    for r in rows:
+        out[r.plan_id].append(
+            {
+                'week_idx': r.week_idx,
+                'sesiones': r.sesiones,
+                'carga_planificada': r.carga_planificada,
+                'rpe_planificado': _avg(r.rpe_planificado_sum, r.sesiones),
+                'rpe_percibido': _avg(r.rpe_percibido_sum, r.feedback_count),
+                'cumplimiento': _avg(r.cumplimiento_sum, r.feedback_count),
+                'feedback': r.feedback_count,
+            }
+        )
+    return out
+
+
+def level_trends(db, nivel=None):
+    """Return compliance and perceived RPE per level and plan week."""
+    L = models.LevelWeekStat
+    stmt = select(L).order_by(L.nivel, L.week_idx)
+    if nivel is not None:
+        stmt = stmt.where(L.nivel == nivel)
+    return [
+        {
+            'nivel': r.nivel,
+            'week_idx': r.week_idx,
+            'feedback': r.feedback_count,
+            'cumplimiento': _avg(r.cumplimiento_sum, r.feedback_count),
+            'rpe_percibido': _avg(r.rpe_percibido_sum, r.feedback_count),
+        }
+        for r in db.execute(stmt).scalars()
+    ]
+
+
+def backfill(bind):
+    """Fill empty summary tables from `sessions` and `feedback` (one-off).
+
+    Does nothing when the summary tables already have rows, so it is cheap
+    to call on every startup. Feedback rows outside the `check_feedback`
+    ranges (stored before they were validated) are left out, so emptying
+    the summary tables and running it again repairs skewed averages.
+    """
+    P, S, F = models.Plan, models.Session, models.Feedback
+    PW, LW = models.PlanWeekStat, models.LevelWeekStat
+    valid = (
+        F.week_idx >= 0,
+        F.cumplimiento_pct.between(CUMPLIMIENTO_MIN, CUMPLIMIENTO_MAX),
+        F.rpe_promedio.between(RPE_MIN, RPE_MAX),
+    )
+    with bind.begin() as conn:
+        if conn.scalar(select(PW.plan_id).limit(1)) is not None or conn.scalar(select(LW.nivel).limit(1)) is not None:
+            return
+        if conn.scalar(select(F.id).limit(1)) is None and conn.scalar(select(S.id).limit(1)) is None:
+            return
+        feedback = {
+            (plan_id, week_idx): (n, cumplimiento, rpe)
+            for plan_id, week_idx, n, cumplimiento, rpe in conn.execute(
+                select(F.plan_id, F.week_idx, func.count(), func.sum(F.cumplimiento_pct), func.sum(F.rpe_promedio))
+                .join(P, P.id == F.plan_id)
+                .where(*valid)
+                .group_by(F.plan_id, F.week_idx)
+            )
+        }
+        rows = []
+        for plan_id, week_idx, n, carga, rpe in conn.execute(
+            select(S.plan_id, S.week_idx, func.count(), func.sum(S.carga), func.sum(S.rpe)).group_by(S.plan_id, S.week_idx)
+        ):
+            fb = feedback.pop((plan_id, week_idx), (0, 0, 0))
+            rows.append({'plan_id': plan_id, 'week_idx': week_idx, 'sesiones': n, 'carga_planificada': carga or 0,
+                         'rpe_planificado_sum': rpe or 0, 'feedback_count': fb[0], 'cumplimiento_sum': fb[1] or 0,
+                         'rpe_percibido_sum': fb[2] or 0})
+        for (plan_id, week_idx), fb in feedback.items():
+            rows.append({'plan_id': plan_id, 'week_idx': week_idx, 'sesiones': 0, 'carga_planificada': 0,
+                         'rpe_planificado_sum': 0, 'feedback_count': fb[0], 'cumplimiento_sum': fb[1] or 0,
+                         'rpe_percibido_sum': fb[2] or 0})
+        if rows:
+            conn.execute(insert(PW), rows)
+        levels = [
+            {'nivel': nivel, 'week_idx': week_idx, 'feedback_count': n, 'cumplimiento_sum': c or 0, 'rpe_percibido_sum': r or 0}
+            for nivel, week_idx, n, c, r in conn.execute(
+                select(P.nivel, F.week_idx, func.count(), func.sum(F.cumplimiento_pct), func.sum(F.rpe_promedio))
+                .join(P, P.id == F.plan_id)
+                .where(*valid)
+                .group_by(P.nivel, F.week_idx)
+            )
+        ]
+        if levels:
+            conn.execute(insert(LW), levels)
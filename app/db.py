@@ -1,16 +1,128 @@
-"""Database configuration and session factory.
+"""Database configuration and session factories.
 
 By default this uses a local SQLite file `app.db`. In production set the
 `DATABASE_URL` environment variable to a proper database URI (e.g. Postgres).
+
+Two engines are configured from the same URL:
+
+- `async_engine` / `AsyncSessionLocal` are used by the FastAPI handlers so
+  database I/O never blocks the event loop. The driver is derived from
+  `DATABASE_URL` (aiosqlite for SQLite, asyncpg for Postgres) unless
+  `ASYNC_DATABASE_URL` is set explicitly. Pool size is configured with
+  `DB_POOL_SIZE` / `DB_MAX_OVERFLOW`.
+- `engine` / `SessionLocal` are the synchronous equivalents used by scripts
+  (seeding, benchmarks) and schema creation.
+
+File-based SQLite databases are switched to WAL mode so readers are not
+blocked by the (single) writer.
 """
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool, StaticPool
+import asyncio
+import contextlib
 import os
 
 # Use DATABASE_URL env var if present, otherwise fall back to local sqlite
 DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///./app.db')
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+
+# Map sync driver prefixes to their asyncio counterparts
+_ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgres': 'postgresql+asyncpg',
+    'postgresql': 'postgresql+asyncpg',
+    'postgresql+psycopg2': 'postgresql+asyncpg',
+}
+
+
+def async_url(url: str):
+    """Return the asyncio-driver variant of a database URL."""
+    scheme, sep, rest = url.partition('://')
+    return _ASYNC_DRIVERS.get(scheme, scheme) + sep + rest
+
+
+def _is_sqlite_file(url: str):
+    """Return True for SQLite URLs backed by a file (not in-memory)."""
+    return url.startswith('sqlite') and not (':memory:' in url or url.endswith('://'))
+
+
+def _engine_kwargs(url: str):
+    """Return create_engine kwargs appropriate for the URL's backend."""
+    if url.startswith('sqlite'):
+        # SQLite connections may be used from FastAPI's threadpool
+        return {'connect_args': {'check_same_thread': False}}
+    return {}
+
+
+def _async_engine_kwargs(url: str):
+    """Return create_async_engine kwargs including the pool configuration."""
+    if url.startswith('sqlite') and not _is_sqlite_file(url):
+        # an in-memory database only exists inside its single connection
+        return {'poolclass': StaticPool}
+    kwargs = {'pool_size': DB_POOL_SIZE, 'max_overflow': DB_MAX_OVERFLOW, 'pool_pre_ping': not url.startswith('sqlite')}
+    if url.startswith('sqlite'):
+        # aiosqlite defaults to NullPool (a new connection + thread per
+        # session); pooling keeps connections warm under concurrency.
+        kwargs['poolclass'] = AsyncAdaptedQueuePool
+    return kwargs
+
+
+def _enable_sqlite_wal(dbapi_conn, _record):
+    """Let SQLite readers run alongside the writer and fsync less often.
+
+    WAL keeps concurrent requests from queueing behind every write and
+    `synchronous=NORMAL` is durable across application crashes (only an OS
+    crash can lose the last transactions).
+    """
+    cursor = dbapi_conn.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.close()
+
+
+ASYNC_DATABASE_URL = os.getenv('ASYNC_DATABASE_URL') or async_url(DATABASE_URL)
+
+engine = create_engine(DATABASE_URL, **_engine_kwargs(DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **_async_engine_kwargs(ASYNC_DATABASE_URL))
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+for _url, _engine in ((DATABASE_URL, engine), (ASYNC_DATABASE_URL, async_engine.sync_engine)):
+    if _is_sqlite_file(_url):
+        event.listen(_engine, 'connect', _enable_sqlite_wal)
+
+# SQLite allows a single writer per database. Concurrent writers otherwise
+# spin in SQLite's busy handler (sleeping up to 100 ms per retry, and failing
+# with "database is locked" after 5 s), so in-process writers queue on an
+# asyncio lock instead. Other backends handle concurrent writers themselves.
+_sqlite_write_lock = asyncio.Lock() if ASYNC_DATABASE_URL.startswith('sqlite') else None
+
+
+@contextlib.asynccontextmanager
+async def write_lock():
+    """Serialize write transactions when the backend is SQLite (no-op otherwise)."""
+    if _sqlite_write_lock is None:
+        yield
+        return
+    async with _sqlite_write_lock:
+        yield
+
+
+def dialect_insert(db):
+    """Return the `insert` construct of the session's backend.
+
+    Unlike the generic `sqlalchemy.insert`, it supports
+    `on_conflict_do_update` / `on_conflict_do_nothing`, the race-free
+    upserts of SQLite and Postgres.
+    """
+    return postgresql.insert if db.get_bind().dialect.name == 'postgresql' else sqlite.insert
+
+
 Base = declarative_base()
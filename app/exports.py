@@ -0,0 +1,103 @@
+"""Streaming CSV export of persisted plans.
+
+The export (`stream_snapshot_csv`) is a generator: plans are read from the
+database in partitions of `CSV_CHUNK_PLANS` using a server-side cursor
+(`yield_per`), written to a small reusable buffer and yielded as soon as
+each partition is encoded. Memory therefore stays bounded by one partition
+no matter how many plans are exported, and the first bytes reach the
+client before the query has finished.
+
+The generator opens its own database session because it keeps running
+after the request handler has returned the `StreamingResponse`.
+
+Each plan's rows come from its compressed snapshot (`models.Plan.snapshot`),
+one database row per plan instead of one per block; plans without a
+current snapshot fall back to `plan_rows_query` (one extra query per
+partition that has any).
+"""
+
+import csv
+import datetime
+import io
+
+from sqlalchemy import select
+
+from . import models
+from .db import AsyncSessionLocal
+from .persistence import snapshot_json
+from .responses import loads
+
+CSV_HEADER = ['plan_id', 'week_idx', 'dia', 'intensidad', 'duracion_min', 'rpe', 'carga', 'bloque_tipo', 'bloque_min', 'bloque_desc']
+
+# Plan snapshots fetched per round-trip and per yielded chunk
+CSV_CHUNK_PLANS = 50
+
+
+def _filter_plans(stmt, plan_ids, desde, hasta):
+    P = models.Plan
+    if plan_ids is not None:
+        stmt = stmt.where(P.id.in_(plan_ids))
+    if desde is not None:
+        stmt = stmt.where(P.created_at >= datetime.datetime.combine(desde, datetime.time.min))
+    if hasta is not None:
+        stmt = stmt.where(P.created_at < datetime.datetime.combine(hasta + datetime.timedelta(days=1), datetime.time.min))
+    return stmt
+
+
+def plan_rows_query(plan_ids=None, desde=None, hasta=None):
+    """Build the flat (plan, session, block) row query for a CSV export.
+
+    - `plan_ids`: only these plans
+    - `desde` / `hasta`: plans created in this inclusive date range
+    Rows are ordered by plan, session and block so each plan's rows stay
+    together and in generation order.
+    """
+    P, S, B = models.Plan, models.Session, models.Block
+    stmt = (
+        select(P.id, S.week_idx, S.day_name, S.intensidad, S.duracion_min, S.rpe, S.carga, B.tipo, B.min, B.descripcion)
+        .join(S, S.plan_id == P.id)
+        .join(B, B.session_id == S.id)
+        .order_by(P.id, S.id, B.id)
+    )
+    return _filter_plans(stmt, plan_ids, desde, hasta)
+
+
+def plan_snapshots_query(plan_ids=None, desde=None, hasta=None):
+    """Build the per-plan snapshot query for `stream_snapshot_csv` (same filters
+    as `plan_rows_query`, ordered by plan id)."""
+    P = models.Plan
+    stmt = select(P.id, P.revision, P.snapshot_revision, P.snapshot).order_by(P.id)
+    return _filter_plans(stmt, plan_ids, desde, hasta)
+
+
+def snapshot_rows(plan_id, raw):
+    """Yield the CSV rows of one plan from its snapshot JSON bytes."""
+    for s in loads(raw)['sessions']:
+        for b in s['bloques']:
+            yield (plan_id, s['week_idx'], s['dia'], s['intensidad'], s['duracion_min'], s['rpe'], s['carga'],
+                   b['tipo'], b['min'], b['descripcion'])
+
+
+async def stream_snapshot_csv(stmt, chunk_plans=CSV_CHUNK_PLANS):
+    """Yield the CSV export of `plan_snapshots_query` rows, one chunk per
+    `chunk_plans` plans."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADER)
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(stmt.execution_options(yield_per=chunk_plans))
+        async for partition in result.partitions():
+            snapshots = [(row.id, snapshot_json(row)) for row in partition]
+            stale = [plan_id for plan_id, raw in snapshots if raw is None]
+            fallback = {}
+            if stale:
+                for row in await db.execute(plan_rows_query(plan_ids=stale)):
+                    fallback.setdefault(row[0], []).append(row)
+            for plan_id, raw in snapshots:
+                writer.writerows(fallback.get(plan_id, ()) if raw is None else snapshot_rows(plan_id, raw))
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    # header-only export (no matching plans)
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
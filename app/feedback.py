@@ -0,0 +1,198 @@
+"""Bulk feedback writes and the optional write-behind buffer.
+
+Wearable integrations post RPE/compliance in bursts of thousands. Storing
+each post in its own transaction makes SQLite writers queue behind one
+commit (and fsync) per row, so feedback can be written in bulk:
+
+- `store_feedback_batch` stores many rows in one transaction: one
+  multi-row INSERT of the feedback, the summary tables bumped once per
+  plan/week and level/week (`analytics.add_feedback_batch`) and one
+  adaptation task per distinct plan/week (`jobs.enqueue_many`) instead of
+  one per row. `POST /api/feedback/batch` uses it directly.
+- `FeedbackBuffer` coalesces individual `POST /api/feedback` calls when
+  FEEDBACK_WRITE_BEHIND=1: posts are appended in memory and a daemon
+  thread writes them with `store_feedback_batch` whenever
+  FEEDBACK_FLUSH_ROWS rows are waiting or every FEEDBACK_FLUSH_SECONDS.
+
+Durability: without write-behind (the default) a 200 from POST
+/api/feedback means the row is committed. With write-behind the endpoint
+answers 202 as soon as the row is buffered:
+
+- a clean shutdown (the app's lifespan) flushes the buffer before exiting
+- a crash or kill loses what was buffered since the last flush, i.e. at
+  most FEEDBACK_FLUSH_ROWS rows or FEEDBACK_FLUSH_SECONDS of feedback
+- a failed flush (e.g. database unavailable) keeps the rows, in order, for
+  the next attempt; once FEEDBACK_BUFFER_MAX rows are waiting new posts are
+  refused (503) instead of growing without bound
+- a row the database rejects (IntegrityError/DataError, e.g. a plan that
+  was deleted after the post was accepted) or whose values are out of
+  range (ValueError) would fail every retry, so the
+  flush bisects the batch to isolate it, stores the good rows and moves
+  the bad one to `dead_letters` (logged, last FEEDBACK_DEAD_LETTERS kept)
+  instead of putting it back
+- the endpoint checks that the plan exists before buffering (404
+  otherwise), so rejected rows are rare
+
+Like the task worker, the flush thread uses the synchronous engine and
+relies on SQLite's busy timeout rather than the async handlers'
+`write_lock`.
+"""
+
+import collections
+import logging
+import os
+import threading
+
+from sqlalchemy.exc import DataError, IntegrityError
+
+from . import analytics, jobs
+from .db import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+FEEDBACK_WRITE_BEHIND = os.getenv('FEEDBACK_WRITE_BEHIND', '0') == '1'
+FEEDBACK_FLUSH_ROWS = int(os.getenv('FEEDBACK_FLUSH_ROWS', '500'))
+FEEDBACK_FLUSH_SECONDS = float(os.getenv('FEEDBACK_FLUSH_SECONDS', '1'))
+FEEDBACK_BUFFER_MAX = int(os.getenv('FEEDBACK_BUFFER_MAX', '50000'))
+FEEDBACK_DEAD_LETTERS = int(os.getenv('FEEDBACK_DEAD_LETTERS', '1000'))
+
+# Errors caused by the rows themselves: retrying the same rows cannot help
+# (ValueError: values refused by `analytics.check_feedback`)
+ROW_ERRORS = (IntegrityError, DataError, ValueError)
+
+
+def store_feedback_batch(db, rows):
+    """Store feedback rows, their analytics and adaptation tasks in one transaction.
+
+    Returns the ids of the adaptation tasks, one per distinct (plan_id,
+    week_idx) in order of first appearance.
+    """
+    try:
+        analytics.add_feedback_batch(db, rows)
+        weeks = list(dict.fromkeys((r['plan_id'], r['week_idx']) for r in rows))
+        task_ids = jobs.enqueue_many(db, 'adapt_plan', [{'plan_id': p, 'week_idx': w} for p, w in weeks])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return task_ids
+
+
+class FeedbackBuffer:
+    """Thread-safe in-memory buffer of feedback rows with periodic bulk flushes."""
+
+    def __init__(self, session_factory=SessionLocal, flush_rows=FEEDBACK_FLUSH_ROWS,
+                 flush_seconds=FEEDBACK_FLUSH_SECONDS, max_rows=FEEDBACK_BUFFER_MAX, on_flush=None):
+        self.session_factory = session_factory
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.max_rows = max_rows
+        # called after each successful flush (e.g. to wake the task worker)
+        self.on_flush = on_flush
+        self.flushed = 0
+        self.failures = 0
+        # rows the database rejected, never retried (most recent last)
+        self.dead_letters = collections.deque(maxlen=FEEDBACK_DEAD_LETTERS)
+        self.dead_lettered = 0
+        self._rows = []
+        self._lock = threading.Lock()
+        # serializes flushes (thread, shutdown and explicit calls)
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __len__(self):
+        return len(self._rows)
+
+    def add(self, values):
+        """Buffer one feedback row; return False when the buffer is full."""
+        with self._lock:
+            if len(self._rows) >= self.max_rows:
+                return False
+            self._rows.append(values)
+            full = len(self._rows) >= self.flush_rows
+        if full:
+            self._wake.set()
+        return True
+
+    def flush(self):
+        """Write every buffered row; return how many were stored.
+
+        The rows are written in one transaction. When the database rejects
+        it because of the data (ROW_ERRORS), the batch is split in halves
+        until the offending rows are isolated; those go to `dead_letters`
+        and the rest is stored. Any other error puts the rows not stored
+        yet back at the front of the buffer and is raised.
+        """
+        with self._flush_lock:
+            with self._lock:
+                rows, self._rows = self._rows, []
+            if not rows:
+                return 0
+            stored = 0
+            # stack of chunks still to write, next chunk last
+            pending = [rows]
+            while pending:
+                chunk = pending.pop()
+                try:
+                    self._write(chunk)
+                except ROW_ERRORS:
+                    if len(chunk) == 1:
+                        self._dead_letter(chunk[0])
+                    else:
+                        mid = len(chunk) // 2
+                        pending += [chunk[mid:], chunk[:mid]]
+                except Exception:
+                    with self._lock:
+                        self._rows[:0] = chunk + [r for c in reversed(pending) for r in c]
+                    self.failures += 1
+                    raise
+                else:
+                    stored += len(chunk)
+            self.flushed += stored
+        if stored and self.on_flush is not None:
+            self.on_flush()
+        return stored
+
+    def _write(self, rows):
+        """Store `rows` in one transaction of a fresh session."""
+        with self.session_factory() as db:
+            store_feedback_batch(db, rows)
+
+    def _dead_letter(self, row):
+        logger.error('feedback row rejected by the database, dropped: %r', row)
+        self.dead_letters.append(row)
+        self.dead_lettered += 1
+
+    def start(self):
+        """Start the flush thread (no-op when already running)."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='feedback-flush', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        """Stop the flush thread and write what is still buffered."""
+        if self._thread is not None:
+            self._stop.set()
+            self._wake.set()
+            self._thread.join(timeout)
+            self._thread = None
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('final feedback flush failed; %d rows lost', len(self._rows))
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('feedback flush failed; %d rows kept for retry', len(self._rows))
+
+
+FEEDBACK_BUFFER = FeedbackBuffer(on_flush=jobs.TASK_WORKER.notify)
@@ -0,0 +1,98 @@
+"""Per-user plan history with keyset (cursor) pagination.
+
+Athletes accumulate hundreds of plans over seasons, so the history is never
+paged with OFFSET (which reads and discards every skipped row):
+
+- pages are ordered newest first by (created_at, id) and each query seeks
+  past the last row of the previous page with a row-value comparison, an
+  index range scan on `ix_plans_user_created_id` (user_id, created_at, id)
+- only summary columns are selected: no sessions/blocks and no snapshot
+- the optional load totals are one grouped primary-key range lookup on
+  `PlanWeekStat` for the plans of the page
+
+Every page therefore costs the same one or two queries whatever its
+position in the history. The cursor is opaque to clients (urlsafe base64 of
+the last row's created_at and id).
+"""
+
+import base64
+import datetime
+import json
+
+from sqlalchemy import func, select, tuple_
+
+from . import models
+
+# Default and largest page size of GET /api/users/{id}/plans
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(created_at, plan_id):
+    """Return the opaque cursor pointing after the row (created_at, plan_id)."""
+    raw = json.dumps([created_at.isoformat(), plan_id], separators=(',', ':')).encode('ascii')
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Return the (created_at, plan_id) of a cursor; ValueError if malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, plan_id = json.loads(raw)
+        return datetime.datetime.fromisoformat(created_at), int(plan_id)
+    except (TypeError, ValueError, UnicodeDecodeError) as exc:
+        raise ValueError('invalid cursor') from exc
+
+
+def plan_loads(db, plan_ids):
+    """Return {plan_id: {'carga_total', 'feedback'}} from the week summaries."""
+    W = models.PlanWeekStat
+    rows = db.execute(
+        select(W.plan_id, func.sum(W.carga_planificada), func.sum(W.feedback_count))
+        .where(W.plan_id.in_(plan_ids))
+        .group_by(W.plan_id)
+    )
+    return {plan_id: {'carga_total': carga or 0, 'feedback': feedback or 0} for plan_id, carga, feedback in rows}
+
+
+def user_plans(db, user_id, limit=PAGE_SIZE, cursor=None, cargas=False):
+    """Return one page of a user's plans, newest first.
+
+    `cursor` is the `next_cursor` of the previous page (ValueError if
+    malformed). With `cargas` each plan also gets its total planned load
+    and feedback count. Returns {'plans': [...], 'next_cursor': str or None}.
+    """
+    P = models.Plan
+    stmt = (
+        select(P.id, P.created_at, P.semanas, P.nivel, P.dias_por_semana, P.duracion_sesion_min,
+               P.objetivos_json, P.revision)
+        .where(P.user_id == user_id)
+        .order_by(P.created_at.desc(), P.id.desc())
+        .limit(limit + 1)
+    )
+    if cursor is not None:
+        created_at, plan_id = decode_cursor(cursor)
+        stmt = stmt.where(tuple_(P.created_at, P.id) < tuple_(created_at, plan_id))
+    rows = db.execute(stmt).all()
+    more = len(rows) > limit
+    rows = rows[:limit]
+
+    plans = [
+        {
+            'id': r.id,
+            'created_at': r.created_at.isoformat() if r.created_at else None,
+            'semanas': r.semanas,
+            'nivel': r.nivel,
+            'dias_por_semana': r.dias_por_semana,
+            'duracion_sesion_min': r.duracion_sesion_min,
+            'objetivos': json.loads(r.objetivos_json) if r.objetivos_json else [],
+            'revision': r.revision,
+        }
+        for r in rows
+    ]
+    if cargas and plans:
+        loads = plan_loads(db, [p['id'] for p in plans])
+        for p in plans:
+            p.update(loads.get(p['id'], {'carga_total': 0, 'feedback': 0}))
+    next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id) if more else None
+    return {'plans': plans, 'next_cursor': next_cursor}
@@ -0,0 +1,167 @@
+"""Background task queue: a persistent task table and an in-process worker.
+
+Work that does not need to finish inside a request (e.g. adapting the next
+plan week after feedback) is stored as a `Task` row in the same transaction
+as the data that triggered it, and picked up by a worker thread in the web
+process. No external broker is needed and tasks survive restarts:
+
+- `enqueue` adds a pending task to the caller's session (committed with the
+  caller's transaction, so a task exists iff its trigger was stored);
+  `enqueue_many` does the same for many tasks with one INSERT
+- `run_pending` claims pending tasks one at a time (a conditional UPDATE, so
+  several workers never run the same task) and calls the handler from
+  `HANDLERS` with its own database session; failures are retried up to
+  MAX_ATTEMPTS times and then kept with status 'error'
+- `TaskWorker` runs `run_pending` in a daemon thread, woken by `notify()`
+  after an enqueue and otherwise every JOBS_POLL_SECONDS; on start it
+  re-queues tasks left 'running' by a crashed process
+
+The worker uses the synchronous engine. On SQLite its short write
+transactions rely on the driver's busy timeout rather than the async
+handlers' `write_lock`. Tests call `run_pending()` directly instead of
+starting the thread.
+"""
+
+import json
+import logging
+import os
+import threading
+
+from sqlalchemy import insert, select, update
+
+from . import models
+from .db import SessionLocal
+from .persistence import apply_adaptation
+
+logger = logging.getLogger(__name__)
+
+JOBS_WORKER = os.getenv('JOBS_WORKER', '1') != '0'
+JOBS_POLL_SECONDS = float(os.getenv('JOBS_POLL_SECONDS', '5'))
+MAX_ATTEMPTS = 3
+
+# task kind -> handler(db, **payload); handlers commit their own work
+HANDLERS = {
+    'adapt_plan': apply_adaptation,
+}
+
+
+def enqueue(db, kind, **payload):
+    """Add a pending task to `db` (not committed) and return it."""
+    task = models.Task(kind=kind, payload_json=json.dumps(payload), status='pending', attempts=0)
+    db.add(task)
+    return task
+
+
+def enqueue_many(db, kind, payloads):
+    """Insert pending tasks for `payloads` (not committed); return their ids in order."""
+    if not payloads:
+        return []
+    rows = [{'kind': kind, 'payload_json': json.dumps(p), 'status': 'pending', 'attempts': 0} for p in payloads]
+    return db.execute(
+        insert(models.Task).returning(models.Task.id, sort_by_parameter_order=True), rows
+    ).scalars().all()
+
+
+def _claim(db):
+    """Mark the oldest pending task as running and return it, or None."""
+    T = models.Task
+    while True:
+        task_id = db.scalar(select(T.id).where(T.status == 'pending').order_by(T.id).limit(1))
+        if task_id is None:
+            return None
+        claimed = db.execute(
+            update(T).where(T.id == task_id, T.status == 'pending').values(status='running', attempts=T.attempts + 1)
+        ).rowcount
+        db.commit()
+        if claimed:
+            return db.get(T, task_id)
+
+
+def _finish(session_factory, task_id, error=None):
+    with session_factory() as db:
+        task = db.get(models.Task, task_id)
+        if error is None:
+            task.status, task.error = 'done', None
+        else:
+            task.status = 'error' if task.attempts >= MAX_ATTEMPTS else 'pending'
+            task.error = error
+        db.commit()
+
+
+def run_pending(session_factory=SessionLocal, limit=None):
+    """Run pending tasks until none are left (or `limit` ran); return the count."""
+    done = 0
+    while limit is None or done < limit:
+        with session_factory() as db:
+            task = _claim(db)
+            if task is None:
+                break
+            task_id, kind, payload = task.id, task.kind, json.loads(task.payload_json)
+        try:
+            with session_factory() as db:
+                HANDLERS[kind](db, **payload)
+        except Exception as exc:
+            logger.exception('task %s (%s) failed', task_id, kind)
+            _finish(session_factory, task_id, error=repr(exc))
+        else:
+            _finish(session_factory, task_id)
+        done += 1
+    return done
+
+
+def requeue_running(session_factory=SessionLocal):
+    """Put tasks left 'running' (by a process that died) back in the queue."""
+    with session_factory() as db:
+        db.execute(update(models.Task).where(models.Task.status == 'running').values(status='pending'))
+        db.commit()
+
+
+def task_status(db, task_id):
+    """Return {'id', 'kind', 'status', 'attempts', 'error'} or None."""
+    task = db.get(models.Task, task_id)
+    if task is None:
+        return None
+    return {'id': task.id, 'kind': task.kind, 'status': task.status, 'attempts': task.attempts, 'error': task.error}
+
+
+class TaskWorker:
+    """Daemon thread running `run_pending` whenever tasks may be waiting."""
+
+    def __init__(self, session_factory=SessionLocal, poll_seconds=JOBS_POLL_SECONDS):
+        self.session_factory = session_factory
+        self.poll_seconds = poll_seconds
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        requeue_running(self.session_factory)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='task-worker', daemon=True)
+        self._thread.start()
+
+    def notify(self):
+        """Wake the worker (call after committing an enqueue)."""
+        self._wake.set()
+
+    def stop(self, timeout=5):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.clear()
+            try:
+                run_pending(self.session_factory)
+            except Exception:
+                logger.exception('task worker iteration failed')
+            self._wake.wait(self.poll_seconds)
+
+
+TASK_WORKER = TaskWorker()
@@ -9,27 +9,42 @@ Rules applied here:
 - Do not perform heavy computation inside the request handlers; delegate.
 """
 
-from fastapi import FastAPI, Request, Depends, HTTPException
-from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
+from fastapi import FastAPI, Request, Depends, HTTPException, Body, Query
+from fastapi.concurrency import iterate_in_threadpool, run_in_threadpool
+from fastapi.responses import FileResponse, HTMLResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from .schemas import PlanRequest, FeedbackIn
-from . import models
-from .db import engine, SessionLocal
-from sqlalchemy.orm import Session
-from .planner.engine import build_week_plan
-from .planner.drills import load_drills
-import csv
-import io
-from reportlab.platypus import SimpleDocTemplate, Paragraph
-from reportlab.lib.styles import getSampleStyleSheet
-import json
+from typing import List, Optional
+from . import analytics, feedback, history, jobs, models
+from .db import engine, async_engine, AsyncSessionLocal, write_lock
+from sqlalchemy.ext.asyncio import AsyncSession
+from .planner.cache import PLAN_CACHE, cached_generate_plan, cached_plan_weeks
+from .planner.types import Plan
+from .planner.library import DRILL_LIBRARY, etag_matches
+from .planner.batch import generate_plans
+from .persistence import save_plan, save_plans, plan_body, plan_export
+from .exports import plan_snapshots_query, stream_snapshot_csv
+from .pdf import PDF_JOBS
+from .responses import FastJSONResponse, dumps
+from .startup import lifespan
+from .metrics import METRICS_ENABLED, MetricsMiddleware, instrument_engine, register_collector, render as render_metrics, stage
+from sqlalchemy import select
+import asyncio
+import datetime
+import logging
 import os
 
-# ensure DB schema exists (safe to call on startup)
-models.Base.metadata.create_all(bind=engine)
+logger = logging.getLogger(__name__)
 
-app = FastAPI()
+# Schema creation, library loading and workers run in the lifespan hook
+# (see app.startup), not at import time.
+app = FastAPI(default_response_class=FastJSONResponse, lifespan=lifespan)
+
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+    instrument_engine(engine)
+    instrument_engine(async_engine.sync_engine)
 
 # Serve static files (JS/CSS) from app/static
 app.mount(
@@ -38,164 +53,425 @@ app.mount(
     name='static',
 )
 
+# Upper bound for POST /api/plans/batch (a whole club in one request)
+BATCH_MAX_PLANS = int(os.getenv('BATCH_MAX_PLANS', '1000'))
+# Upper bound for POST /api/feedback/batch (a wearable sync burst)
+FEEDBACK_BATCH_MAX = int(os.getenv('FEEDBACK_BATCH_MAX', '10000'))
+
 templates = Jinja2Templates(directory=os.path.join(os.path.dirname(__file__), 'templates'))
 
 
-def get_db():
-    """Yield a database session for dependency injection and close it after use."""
-    db = SessionLocal()
-    try:
+async def get_db():
+    """Yield an async database session for dependency injection and close it after use.
+
+    Handlers must not block the event loop: use `await db.execute(...)` or
+    run synchronous ORM helpers with `await db.run_sync(fn, ...)`.
+    """
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
 @app.get('/', response_class=HTMLResponse)
-def index(request: Request):
+async def index(request: Request):
     """Render the main UI. Loads drill templates for the client-side form."""
-    drills = load_drills()
+    drills = DRILL_LIBRARY.current().drills
     return templates.TemplateResponse('index.html', {'request': request, 'drills': drills})
 
 
 @app.post('/api/plan')
-async def api_plan(plan_req: PlanRequest, db: Session = Depends(get_db)):
+async def api_plan(plan_req: PlanRequest, db: AsyncSession = Depends(get_db)):
     """API endpoint that generates a plan and persists a minimal representation.
 
     Flow:
-    - call the planner to generate a microcycle (weeks)
-    - persist a Plan row and related Sessions/Blocks
+    - call the planner to generate the mesocycle (`semanas` weeks)
+    - persist a Plan row and related Sessions/Blocks (one transaction)
     - return the generated plan and its id
     """
-    # delegate plan generation
-    plan = build_week_plan(
-        plan_req.disponibilidad,
-        plan_req.duracion_sesion_min,
-        plan_req.nivel,
-        plan_req.objetivos,
-        plan_req.equipamiento,
-        plan_req.historial_carga,
-    )
-
-    # persist Plan (store JSON-serializable fields as text)
-    p = models.Plan(
-        fecha_inicio='hoje',  # placeholder; could be converted to proper date
-        semanas=plan_req.semanas,
-        nivel=plan_req.nivel,
-        dias_por_semana=len(plan_req.disponibilidad),
-        duracion_sesion_min=plan_req.duracion_sesion_min,
-        objetivos_json=json.dumps(plan_req.objetivos, ensure_ascii=False),
-        equipamiento_json=json.dumps(plan_req.equipamiento, ensure_ascii=False),
-    )
-    db.add(p)
-    db.commit()
-    db.refresh(p)
-
-    # Persist Sessions and Blocks related to the plan
-    for week_idx, week in enumerate(plan['weeks']):
-        for s in week:
-            sess = models.Session(
-                plan_id=p.id,
-                week_idx=week_idx,
-                day_name=s['dia'],
-                intensidad=s['intensidad'],
-                duracion_min=s['duracion_min'],
-                rpe=s['indicadores']['RPE'],
-                carga=s['indicadores']['carga_sesion'],
-            )
-            db.add(sess)
-            db.commit()
-            db.refresh(sess)
-            for b in s['bloques']:
-                bl = models.Block(session_id=sess.id, tipo=b['tipo'], min=b['min'], descripcion=b['descripcion'])
-                db.add(bl)
-            db.commit()
-
-    return JSONResponse({'plan_id': p.id, 'plan': plan})
+    # delegate plan generation (served from the plan cache when an
+    # equivalent request was generated recently); a miss is CPU-bound, so
+    # it runs in the threadpool instead of stalling the event loop
+    plan = await run_in_threadpool(cached_generate_plan, **plan_req.planner_kwargs())
+
+    # persist Plan + Sessions + Blocks in a single transaction
+    async with write_lock():
+        with stage('persistence'):
+            plan_id = await db.run_sync(save_plan, plan_req, plan)
+
+    with stage('serialization'):
+        return FastJSONResponse({'plan_id': plan_id, 'plan': plan.to_dict()})
+
+
+async def stream_plan(plan_req: PlanRequest):
+    """Yield the NDJSON lines of POST /api/plan/stream.
+
+    Opens its own database session: the generator keeps running after the
+    handler has returned the `StreamingResponse`. The 200 status is sent
+    with the first line, so a failure while generating or saving is
+    reported in-band as a final {"error"} line with a generic message; the
+    details only go to the log.
+    """
+    weeks = []
+    try:
+        # each week is built in the threadpool and sent before the next starts
+        async for week in iterate_in_threadpool(cached_plan_weeks(**plan_req.planner_kwargs())):
+            with stage('serialization'):
+                line = dumps({'week_idx': len(weeks), 'semanas': plan_req.semanas, 'sessions': [s.to_dict() for s in week]})
+            weeks.append(week)
+            yield line + b'\n'
+    except Exception:
+        logger.exception('streamed plan generation failed after %d weeks', len(weeks))
+        yield dumps({'error': 'plan generation failed'}) + b'\n'
+        return
+    try:
+        async with AsyncSessionLocal() as db:
+            async with write_lock():
+                with stage('persistence'):
+                    plan_id = await db.run_sync(save_plan, plan_req, Plan(len(weeks), weeks))
+    except Exception:
+        logger.exception('streamed plan not saved')
+        yield dumps({'error': 'plan not saved'}) + b'\n'
+        return
+    yield dumps({'plan_id': plan_id}) + b'\n'
+
+
+@app.post('/api/plan/stream')
+async def api_plan_stream(plan_req: PlanRequest):
+    """`POST /api/plan` streamed as NDJSON (application/x-ndjson).
+
+    One line per week as soon as the planner has built it
+    ({"week_idx", "semanas", "sessions"}, sessions shaped as in the
+    `weeks` of POST /api/plan), then {"plan_id"} once the whole plan is
+    persisted. If generating or saving fails midway, the stream ends with
+    {"error": "plan generation failed"} or {"error": "plan not saved"}
+    instead (the details are logged). The first week arrives after
+    one week of work whatever `semanas` is.
+    """
+    return StreamingResponse(stream_plan(plan_req), media_type='application/x-ndjson')
+
+
+@app.post('/api/plans/batch')
+async def api_plans_batch(plan_reqs: List[PlanRequest] = Body(...), db: AsyncSession = Depends(get_db)):
+    """Generate and persist plans for a whole team in one call.
+
+    Identical requests are generated once (large batches use a process
+    pool) and every plan is written in a single transaction. Returns the
+    new plan ids in the same order as the submitted requests.
+    """
+    if len(plan_reqs) > BATCH_MAX_PLANS:
+        raise HTTPException(status_code=413, detail=f'At most {BATCH_MAX_PLANS} plans per batch')
+    # generation may take a while for a whole club: keep it off the event loop
+    plans = await run_in_threadpool(generate_plans, [r.planner_kwargs() for r in plan_reqs])
+    async with write_lock():
+        with stage('persistence'):
+            plan_ids = await db.run_sync(save_plans, list(zip(plan_reqs, plans)))
+    return FastJSONResponse({'plan_ids': plan_ids})
 
 
 @app.get('/api/templates')
-def api_templates():
-    """Return available drills/templates to the client (used by UI forms)."""
-    drills = load_drills()
-    return JSONResponse({'drills': drills})
+async def api_templates(request: Request):
+    """Return available drills/templates to the client (used by UI forms).
+
+    The JSON body is serialized once per library version; clients sending
+    the current ETag in If-None-Match get an empty 304 instead.
+    """
+    lib = DRILL_LIBRARY.current()
+    headers = {'ETag': lib.etag}
+    if etag_matches(request.headers.get('if-none-match'), lib.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(lib.templates_body, media_type='application/json', headers=headers)
+
+
+@register_collector
+def planner_metrics():
+    """Plan cache, drill pool cache and drill library counters for /metrics."""
+    cache = PLAN_CACHE.stats()
+    index = DRILL_LIBRARY.current().index
+    return [
+        ('plan_cache_hits_total', 'counter', 'Plan cache hits.', cache['hits']),
+        ('plan_cache_misses_total', 'counter', 'Plan cache misses.', cache['misses']),
+        ('plan_cache_evictions_total', 'counter', 'Plan cache evictions.', cache['evictions']),
+        ('plan_cache_entries', 'gauge', 'Plans currently cached.', cache['entries']),
+        ('plan_cache_bytes', 'gauge', 'Approximate size of the cached plans.', cache['bytes']),
+        ('drill_pool_cache_hits', 'gauge', 'Drill pool memo hits since the drill library was loaded.', index.pool_hits),
+        ('drill_pool_cache_misses', 'gauge', 'Drill pool memo misses since the drill library was loaded.', index.pool_misses),
+        ('drill_library_reloads_total', 'counter', 'Drill library reloads.', DRILL_LIBRARY.reloads),
+        ('feedback_buffer_rows', 'gauge', 'Feedback rows waiting for the next write-behind flush.', len(feedback.FEEDBACK_BUFFER)),
+        ('feedback_buffer_flushed_total', 'counter', 'Feedback rows written by write-behind flushes.', feedback.FEEDBACK_BUFFER.flushed),
+        ('feedback_buffer_flush_failures_total', 'counter', 'Failed write-behind flushes.', feedback.FEEDBACK_BUFFER.failures),
+        ('feedback_buffer_dead_letters_total', 'counter', 'Feedback rows rejected by the database and dropped.', feedback.FEEDBACK_BUFFER.dead_lettered),
+    ]
+
+
+@app.get('/metrics')
+async def metrics():
+    """Prometheus metrics (404 when METRICS_ENABLED=0)."""
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail='Metrics disabled')
+    return Response(render_metrics(), media_type='text/plain; version=0.0.4')
+
+
+def store_feedback(db, values):
+    """Store feedback, its analytics and the adaptation task in one transaction.
+
+    Returns the id of the task that adapts the following plan week.
+    """
+    try:
+        analytics.add_feedback(db, values)
+        task = jobs.enqueue(db, 'adapt_plan', plan_id=values['plan_id'], week_idx=values['week_idx'])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return task.id
+
+
+async def check_feedback_targets(items: List[FeedbackIn], db: AsyncSession):
+    """Refuse feedback before anything is stored or queued.
+
+    404 when a plan id is unknown, 422 when a `week_idx` is past the end of
+    its plan (the adaptation task would otherwise run against nothing).
+    """
+    plan_ids = {fb.plan_id for fb in items}
+    rows = await db.execute(select(models.Plan.id, models.Plan.semanas).where(models.Plan.id.in_(plan_ids)))
+    # plans stored before `semanas` was required were generated with one week
+    semanas = {plan_id: n or 1 for plan_id, n in rows}
+    unknown = sorted(plan_ids - set(semanas))
+    if unknown:
+        detail = 'Plan not found' if len(items) == 1 else f'Unknown plan ids: {unknown}'
+        raise HTTPException(status_code=404, detail=detail)
+    past_end = sorted({(fb.plan_id, fb.week_idx) for fb in items if fb.week_idx >= semanas[fb.plan_id]})
+    if past_end:
+        raise HTTPException(status_code=422, detail=f'week_idx past the end of the plan (plan_id, week_idx): {past_end}')
 
 
 @app.post('/api/feedback')
-def api_feedback(fb: FeedbackIn, db: Session = Depends(get_db)):
-    """Store user feedback about a plan (compliance, perceived RPE, notes)."""
-    f = models.Feedback(
-        plan_id=fb.plan_id,
-        week_idx=fb.week_idx,
-        cumplimiento_pct=fb.cumplimiento_pct,
-        rpe_promedio=fb.rpe_promedio,
-        notas=fb.notas,
-    )
-    db.add(f)
-    db.commit()
-    return JSONResponse({'status': 'ok'})
+async def api_feedback(fb: FeedbackIn, db: AsyncSession = Depends(get_db)):
+    """Store user feedback about a plan (compliance, perceived RPE, notes).
+
+    Adapting the next week to this feedback runs in the background task
+    worker; the response carries the task id (see GET /api/tasks/{id}).
+    404 for an unknown plan and 422 for a week past its end
+    (`check_feedback_targets`). With FEEDBACK_WRITE_BEHIND=1 the feedback
+    is only buffered and written with the next bulk flush: the answer is
+    202 without a task id (see `app.feedback` for what that means for
+    durability).
+    """
+    await check_feedback_targets([fb], db)
+    if feedback.FEEDBACK_WRITE_BEHIND:
+        if not feedback.FEEDBACK_BUFFER.add(fb.dict()):
+            raise HTTPException(status_code=503, detail='Feedback buffer full, retry later')
+        return FastJSONResponse({'status': 'queued'}, status_code=202)
+    async with write_lock():
+        task_id = await db.run_sync(store_feedback, fb.dict())
+    jobs.TASK_WORKER.notify()
+    return FastJSONResponse({'status': 'ok', 'task_id': task_id})
+
+
+@app.post('/api/feedback/batch')
+async def api_feedback_batch(items: List[FeedbackIn] = Body(...), db: AsyncSession = Depends(get_db)):
+    """Store many feedback rows in one transaction (wearable sync bursts).
+
+    The summary tables are bumped once per plan week and one adaptation
+    task is queued per distinct plan week (`task_ids`, in order of first
+    appearance). Committed before the response, whatever
+    FEEDBACK_WRITE_BEHIND says. Nothing is stored when any row is refused
+    (404 unknown plan id, 422 week past the plan's end).
+    """
+    if len(items) > FEEDBACK_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f'At most {FEEDBACK_BATCH_MAX} feedback rows per batch')
+    await check_feedback_targets(items, db)
+    async with write_lock():
+        task_ids = await db.run_sync(feedback.store_feedback_batch, [fb.dict() for fb in items])
+    jobs.TASK_WORKER.notify()
+    return FastJSONResponse({'status': 'ok', 'stored': len(items), 'task_ids': task_ids})
+
+
+@app.get('/api/tasks/{task_id}')
+async def api_task(task_id: int, db: AsyncSession = Depends(get_db)):
+    """Status of a background task: pending, running, done or error."""
+    status = await db.run_sync(jobs.task_status, task_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail='Task not found')
+    return FastJSONResponse(status)
+
+
+def parse_plan_ids(plan_ids: str):
+    """Parse a comma-separated `plan_ids` query parameter (422 if invalid)."""
+    try:
+        return [int(x) for x in plan_ids.split(',') if x.strip()]
+    except ValueError:
+        raise HTTPException(status_code=422, detail='plan_ids must be comma-separated integers')
+
+
+@app.get('/api/analytics/plans')
+async def analytics_plans(plan_ids: str, db: AsyncSession = Depends(get_db)):
+    """Weekly planned load, planned vs perceived RPE and compliance for
+    several plans (`plan_ids=1,2,3`) in one call."""
+    ids = parse_plan_ids(plan_ids)
+    weeks = await db.run_sync(analytics.plan_weeks, ids)
+    return FastJSONResponse({'plans': [{'plan_id': i, 'weeks': weeks[i]} for i in ids]})
+
+
+@app.get('/api/analytics/plans/{plan_id}')
+async def analytics_plan(plan_id: int, db: AsyncSession = Depends(get_db)):
+    """Weekly planned load, planned vs perceived RPE and compliance of a plan."""
+    weeks = (await db.run_sync(analytics.plan_weeks, [plan_id]))[plan_id]
+    if not weeks and await db.get(models.Plan, plan_id) is None:
+        raise HTTPException(status_code=404, detail='Plan not found')
+    return FastJSONResponse({'plan_id': plan_id, 'weeks': weeks})
+
+
+@app.get('/api/analytics/levels')
+async def analytics_levels(nivel: Optional[str] = None, db: AsyncSession = Depends(get_db)):
+    """Compliance and perceived RPE trends per level and plan week."""
+    return FastJSONResponse({'levels': await db.run_sync(analytics.level_trends, nivel)})
 
 
 @app.get('/api/plan/{plan_id}')
-def get_plan(plan_id: int, db: Session = Depends(get_db)):
+async def get_plan(plan_id: int, db: AsyncSession = Depends(get_db)):
     """Return a persisted plan with its sessions and blocks.
 
-    The response structure matches what the frontend expects.
+    The response structure matches what the frontend expects. The sessions
+    are served from the JSON bytes stored with the plan (see
+    `persistence.plan_body`), without loading or re-serializing the rows.
     """
-    p = db.query(models.Plan).filter(models.Plan.id == plan_id).first()
-    if not p:
+    body = await db.run_sync(plan_body, plan_id)
+    if body is None:
         raise HTTPException(status_code=404, detail='Plan not found')
-    sessions = []
-    for s in p.sessions:
-        blocks = [{'tipo': b.tipo, 'min': b.min, 'descripcion': b.descripcion} for b in s.blocks]
-        sessions.append(
-            {
-                'week_idx': s.week_idx,
-                'dia': s.day_name,
-                'intensidad': s.intensidad,
-                'duracion_min': s.duracion_min,
-                'rpe': s.rpe,
-                'carga': s.carga,
-                'bloques': blocks,
-            }
-        )
-    return JSONResponse({'plan': {'id': p.id, 'semanas': p.semanas, 'nivel': p.nivel, 'sessions': sessions}})
+    return Response(body, media_type='application/json')
+
+
+@app.get('/api/users/{user_id}/plans')
+async def user_plans(
+    user_id: int,
+    limit: int = Query(history.PAGE_SIZE, ge=1, le=history.MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    cargas: bool = False,
+    db: AsyncSession = Depends(get_db),
+):
+    """A user's plans, newest first, one page at a time.
+
+    Pass the `next_cursor` of a page as `cursor` to get the next one
+    (`null` on the last page). Plans are summaries (no sessions); with
+    `cargas=true` each one also carries its total planned load and
+    feedback count. Unknown users have an empty history.
+    """
+    try:
+        page = await db.run_sync(history.user_plans, user_id, limit, cursor, cargas)
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+    return FastJSONResponse({'user_id': user_id, **page})
 
 
 @app.get('/export/csv')
-def export_csv(plan_id: int, db: Session = Depends(get_db)):
-    """Export the persisted plan as CSV. Returns a streaming CSV response."""
-    p = db.query(models.Plan).filter(models.Plan.id == plan_id).first()
-    if not p:
+async def export_csv(
+    plan_id: Optional[int] = None,
+    plan_ids: Optional[str] = None,
+    desde: Optional[datetime.date] = None,
+    hasta: Optional[datetime.date] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """Export persisted plans as CSV, streamed from the plan snapshots
+    partition by partition.
+
+    Modes:
+    - `plan_id=1`: a single plan (404 if it does not exist)
+    - `plan_ids=1,2,3`: several plans
+    - `desde=YYYY-MM-DD&hasta=YYYY-MM-DD`: every plan created in the range
+      (either bound may be omitted; can be combined with `plan_ids`)
+    """
+    if plan_id is not None:
+        if await db.get(models.Plan, plan_id) is None:
+            raise HTTPException(status_code=404, detail='Plan not found')
+        ids, filename = [plan_id], f'plan_{plan_id}.csv'
+    elif plan_ids is not None or desde is not None or hasta is not None:
+        ids = parse_plan_ids(plan_ids) if plan_ids is not None else None
+        filename = 'plans.csv'
+    else:
+        raise HTTPException(status_code=400, detail='Provide plan_id, plan_ids or a desde/hasta range')
+    stmt = plan_snapshots_query(plan_ids=ids, desde=desde, hasta=hasta)
+    return StreamingResponse(stream_snapshot_csv(stmt), media_type='text/csv', headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+
+async def plan_revision(plan_id: int, db: AsyncSession):
+    """Return the plan's current revision (404 if unknown)."""
+    revision = await db.scalar(select(models.Plan.revision).where(models.Plan.id == plan_id))
+    if revision is None:
         raise HTTPException(status_code=404, detail='Plan not found')
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['plan_id', 'week_idx', 'dia', 'intensidad', 'duracion_min', 'rpe', 'carga', 'bloque_tipo', 'bloque_min', 'bloque_desc'])
-    for s in p.sessions:
-        for b in s.blocks:
-            writer.writerow([p.id, s.week_idx, s.day_name, s.intensidad, s.duracion_min, s.rpe, s.carga, b.tipo, b.min, b.descripcion])
-    output.seek(0)
-    return StreamingResponse(io.BytesIO(output.getvalue().encode('utf-8')), media_type='text/csv', headers={'Content-Disposition': f'attachment; filename=plan_{plan_id}.csv'})
+    return revision
+
+
+async def pdf_job_for_plan(plan_id: int, revision: int, db: AsyncSession):
+    """Return the PDF job of a plan revision as (job id, future of the path).
+
+    The plan (from its snapshot, see `persistence.plan_export`) is only
+    read when the revision has no job yet and its PDF is not cached.
+    """
+    job = PDF_JOBS.existing(plan_id, revision)
+    if job is None:
+        doc = await db.run_sync(plan_export, plan_id)
+        job = PDF_JOBS.submit(plan_id, revision, doc)
+    return job
+
+
+def pdf_job_payload(job_id: str):
+    """Describe a PDF job for the polling API."""
+    job = PDF_JOBS.get(job_id)
+    status = PDF_JOBS.status(job_id)
+    payload = {'job_id': job_id, 'plan_id': job['plan_id'], 'revision': job['revision'], 'status': status}
+    if status == 'done':
+        payload['download_url'] = f'/export/pdf/jobs/{job_id}/download'
+    elif status == 'error':
+        payload['error'] = str(job['future'].exception())
+    return payload
 
 
 @app.get('/export/pdf')
-def export_pdf(plan_id: int, db: Session = Depends(get_db)):
-    """Export the persisted plan as a simple PDF using ReportLab.
+async def export_pdf(plan_id: int, db: AsyncSession = Depends(get_db)):
+    """Export the persisted plan as a PDF.
 
-    The PDF generation here is intentionally simple; for richer exports consider
-    using an HTML-to-PDF converter in the future.
+    Served straight from the on-disk cache when this plan revision was
+    rendered before; otherwise rendered in the PDF worker pool (sharing the
+    revision's job with any concurrent request) while this request waits
+    without blocking the event loop. A failed render answers 503.
     """
-    p = db.query(models.Plan).filter(models.Plan.id == plan_id).first()
-    if not p:
-        raise HTTPException(status_code=404, detail='Plan not found')
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer)
-    styles = getSampleStyleSheet()
-    elems = []
-    elems.append(Paragraph(f"Plan {p.id} - Nivel: {p.nivel}", styles['Heading2']))
-    for s in p.sessions:
-        elems.append(Paragraph(f"Semana {s.week_idx+1} - {s.day_name} ({s.intensidad}) - {s.duracion_min} min - RPE {s.rpe}", styles['Normal']))
-        for b in s.blocks:
-            elems.append(Paragraph(f" - {b.tipo}: {b.min} min - {b.descripcion}", styles['Bullet']))
-    doc.build(elems)
-    buffer.seek(0)
-    return StreamingResponse(buffer, media_type='application/pdf', headers={'Content-Disposition': f'attachment; filename=plan_{plan_id}.pdf'})
+    revision = await plan_revision(plan_id, db)
+    path = PDF_JOBS.cached(plan_id, revision)
+    if path is None:
+        _, future = await pdf_job_for_plan(plan_id, revision, db)
+        try:
+            path = await asyncio.wrap_future(future)
+        except Exception:
+            logger.exception('PDF render of plan %s revision %s failed', plan_id, revision)
+            raise HTTPException(status_code=503, detail='PDF rendering failed, try again later')
+    return FileResponse(path, media_type='application/pdf', filename=f'plan_{plan_id}.pdf')
+
+
+@app.post('/export/pdf/jobs', status_code=202)
+async def submit_pdf_job(plan_id: int, db: AsyncSession = Depends(get_db)):
+    """Start rendering a plan's PDF in the background and return the job to poll.
+
+    Every call for the same plan revision returns the same job.
+    """
+    job_id, _ = await pdf_job_for_plan(plan_id, await plan_revision(plan_id, db), db)
+    return FastJSONResponse(pdf_job_payload(job_id), status_code=202)
+
+
+@app.get('/export/pdf/jobs/{job_id}')
+async def pdf_job_status(job_id: str):
+    """Poll a PDF job: status is pending, done (with download_url) or error."""
+    if PDF_JOBS.get(job_id) is None:
+        raise HTTPException(status_code=404, detail='Job not found')
+    return FastJSONResponse(pdf_job_payload(job_id))
+
+
+@app.get('/export/pdf/jobs/{job_id}/download')
+async def download_pdf_job(job_id: str):
+    """Download the PDF of a finished job (409 while it is still rendering)."""
+    job = PDF_JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail='Job not found')
+    status = PDF_JOBS.status(job_id)
+    if status != 'done':
+        raise HTTPException(status_code=409 if status == 'pending' else 500, detail=f'Job {status}')
+    return FileResponse(job['future'].result(), media_type='application/pdf', filename=f"plan_{job['plan_id']}.pdf")
@@ -0,0 +1,199 @@
+"""Prometheus-style metrics for the API and the planning pipeline.
+
+Exposed as text at `/metrics` (Prometheus exposition format, no client
+library needed):
+
+- `http_request_duration_seconds{method,route}` histogram and
+  `http_requests_total{method,route,status}`, recorded by
+  `MetricsMiddleware` per route template (`/api/plan/{plan_id}`, not the
+  raw path); streamed responses are timed until their last chunk
+- `http_request_db_queries{method,route}` histogram: SQL statements per
+  request, counted by an engine event into a per-request context variable
+- `plan_stage_seconds{stage}` histogram: time per pipeline stage
+  (rules, allocation, drill_selection, progression, persistence,
+  serialization), recorded with `with stage('...'):` blocks; `rules` is
+  the objective parsing and `allocation` the compiled block-minutes lookup
+- plan cache, drill pool cache and drill library counters, read from those
+  objects when `/metrics` is scraped
+
+With METRICS_ENABLED=0 the middleware and the engine listener are not
+installed and `stage()` returns a shared no-op context manager, so the
+remaining overhead is one function call per stage.
+"""
+
+import bisect
+import contextlib
+import contextvars
+import os
+import threading
+import time
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') != '0'
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join('{}="{}"'.format(n, str(v).replace('\\', r'\\').replace('"', r'\"')) for n, v in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class Counter:
+    """Monotonic counter with labels."""
+
+    def __init__(self, name, doc, labels=()):
+        self.name, self.doc, self.labels = name, doc, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.doc}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for values, v in sorted(self._values.items()):
+                lines.append(f'{self.name}{_labels(self.labels, values)} {v}')
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels."""
+
+    def __init__(self, name, doc, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.doc, self.labels = name, doc, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            series[i] += 1
+            series[-1] += value
+
+    def count(self, *label_values):
+        """Number of observations for a label set (0 if none)."""
+        with self._lock:
+            series = self._series.get(label_values)
+            return sum(series[:-1]) if series else 0
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.doc}', f'# TYPE {self.name} histogram']
+        names = self.labels + ('le',)
+        with self._lock:
+            for values, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, n in zip(self.buckets + ('+Inf',), series):
+                    cumulative += n
+                    lines.append(f'{self.name}_bucket{_labels(names, values + (bound,))} {cumulative}')
+                lines.append(f'{self.name}_sum{_labels(self.labels, values)} {series[-1]}')
+                lines.append(f'{self.name}_count{_labels(self.labels, values)} {cumulative}')
+        return lines
+
+
+REQUEST_SECONDS = Histogram('http_request_duration_seconds', 'HTTP request latency by route.', ('method', 'route'))
+REQUESTS = Counter('http_requests_total', 'HTTP requests by route and status.', ('method', 'route', 'status'))
+REQUEST_QUERIES = Histogram('http_request_db_queries', 'SQL statements executed per HTTP request.', ('method', 'route'), QUERY_BUCKETS)
+STAGE_SECONDS = Histogram('plan_stage_seconds', 'Plan pipeline time by stage.', ('stage',))
+
+# Extra exposition lines computed at scrape time (see `register_collector`)
+_collectors = []
+
+
+def register_collector(fn):
+    """Register `fn() -> [(name, type, doc, value), ...]` for `/metrics`."""
+    _collectors.append(fn)
+    return fn
+
+
+def render():
+    """Return the full exposition text."""
+    lines = []
+    for metric in (REQUEST_SECONDS, REQUESTS, REQUEST_QUERIES, STAGE_SECONDS):
+        lines.extend(metric.render())
+    for fn in _collectors:
+        for name, kind, doc, value in fn():
+            lines += [f'# HELP {name} {doc}', f'# TYPE {name} {kind}', f'{name} {value}']
+    return '\n'.join(lines) + '\n'
+
+
+class _StageTimer:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        STAGE_SECONDS.observe(time.perf_counter() - self.start, self.name)
+        return False
+
+
+_NOOP = contextlib.nullcontext()
+
+
+def stage(name):
+    """Context manager timing one pipeline stage (no-op when disabled)."""
+    return _StageTimer(name) if METRICS_ENABLED else _NOOP
+
+
+# Per-request statement counter: a one-item list set by the middleware and
+# shared with the tasks/threads the request spawns (they copy the context).
+_query_count = contextvars.ContextVar('query_count', default=None)
+
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    counter = _query_count.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+def instrument_engine(engine):
+    """Count the statements of `engine` (a sync Engine) per request."""
+    from sqlalchemy import event
+
+    event.listen(engine, 'before_cursor_execute', _count_query)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording latency, status and query count per route."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        counter = [0]
+        token = _query_count.set(counter)
+        status = [500]
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                status[0] = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _query_count.reset(token)
+            route = scope.get('route')
+            path = getattr(route, 'path', None) or 'unmatched'
+            method = scope.get('method', '')
+            REQUEST_SECONDS.observe(elapsed, method, path)
+            REQUESTS.inc(method, path, status[0])
+            REQUEST_QUERIES.observe(counter[0], method, path)
@@ -5,14 +5,19 @@ backwards-compatible when possible; if you change a model, remember to
 provide a migration strategy (Alembic is recommended for production).
 """
 
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index, LargeBinary, Text, inspect, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .db import Base
 
 
 class User(Base):
-    """Optional user table for future extensions (not used by the planner yet)."""
+    """Athlete owning plans (`Plan.user_id`).
+
+    Rows only carry the id for now; they are created on the fly the first
+    time a plan is stored for an unknown `user_id` (see
+    `persistence.ensure_users`).
+    """
     __tablename__ = 'users'
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=True)
@@ -24,6 +29,15 @@ class Plan(Base):
 
     - objetivos_json and equipamiento_json store JSON-serialized lists.
     - sessions relationship contains the generated sessions (1..n).
+    - revision increases whenever the stored plan content changes; derived
+      artifacts (e.g. cached PDFs) are keyed by (id, revision).
+    - user_id / created_at / id are indexed together for the per-user plan
+      history (`app.history`, keyset pagination newest first).
+    - snapshot is the zlib-compressed JSON of the whole plan ({semanas,
+      nivel, sessions}) as of `snapshot_revision`, written in the same
+      transaction as the sessions/blocks rows. Reads use it only while
+      snapshot_revision == revision (see `persistence.snapshot_json`);
+      plans stored before the column existed have NULL.
     """
     __tablename__ = 'plans'
     id = Column(Integer, primary_key=True, index=True)
@@ -35,16 +49,21 @@ class Plan(Base):
     duracion_sesion_min = Column(Integer)
     objetivos_json = Column(Text)
     equipamiento_json = Column(Text)
+    revision = Column(Integer, nullable=False, default=1, server_default='1')
+    snapshot = Column(LargeBinary, nullable=True)
+    snapshot_revision = Column(Integer, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
-    sessions = relationship('Session', back_populates='plan', cascade='all, delete-orphan')
+    sessions = relationship('Session', back_populates='plan', cascade='all, delete-orphan', order_by='Session.id')
+
+    __table_args__ = (Index('ix_plans_user_created_id', 'user_id', 'created_at', 'id'),)
 
 
 class Session(Base):
     """A single training session (belongs to a Plan)."""
     __tablename__ = 'sessions'
     id = Column(Integer, primary_key=True, index=True)
-    plan_id = Column(Integer, ForeignKey('plans.id'))
+    plan_id = Column(Integer, ForeignKey('plans.id'), index=True)
     week_idx = Column(Integer)
     day_name = Column(String)
     intensidad = Column(String)
@@ -53,14 +72,14 @@ class Session(Base):
     carga = Column(Integer)
 
     plan = relationship('Plan', back_populates='sessions')
-    blocks = relationship('Block', back_populates='session', cascade='all, delete-orphan')
+    blocks = relationship('Block', back_populates='session', cascade='all, delete-orphan', order_by='Block.id')
 
 
 class Block(Base):
     """A block inside a Session representing a training focus and its minutes."""
     __tablename__ = 'blocks'
     id = Column(Integer, primary_key=True, index=True)
-    session_id = Column(Integer, ForeignKey('sessions.id'))
+    session_id = Column(Integer, ForeignKey('sessions.id'), index=True)
     tipo = Column(String)
     min = Column(Integer)
     descripcion = Column(Text)
@@ -78,3 +97,84 @@ class Feedback(Base):
     rpe_promedio = Column(Integer)
     notas = Column(Text)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (Index('ix_feedback_plan_week', 'plan_id', 'week_idx'),)
+
+
+class PlanWeekStat(Base):
+    """Per plan/week load and feedback totals, maintained incrementally.
+
+    Rows are written with the plan and updated on every feedback write (see
+    `app.analytics`); averages are computed from the sums at read time.
+    """
+    __tablename__ = 'plan_week_stats'
+    plan_id = Column(Integer, ForeignKey('plans.id'), primary_key=True)
+    week_idx = Column(Integer, primary_key=True)
+    sesiones = Column(Integer, nullable=False, default=0)
+    carga_planificada = Column(Integer, nullable=False, default=0)
+    rpe_planificado_sum = Column(Integer, nullable=False, default=0)
+    feedback_count = Column(Integer, nullable=False, default=0)
+    cumplimiento_sum = Column(Integer, nullable=False, default=0)
+    rpe_percibido_sum = Column(Integer, nullable=False, default=0)
+
+
+class LevelWeekStat(Base):
+    """Feedback totals per level and plan week (compliance trends)."""
+    __tablename__ = 'level_week_stats'
+    nivel = Column(String, primary_key=True)
+    week_idx = Column(Integer, primary_key=True)
+    feedback_count = Column(Integer, nullable=False, default=0)
+    cumplimiento_sum = Column(Integer, nullable=False, default=0)
+    rpe_percibido_sum = Column(Integer, nullable=False, default=0)
+
+
+
+class PlanAdaptation(Base):
+    """Feedback-driven adjustment of one plan week (see `app.planner.adaptation`).
+
+    `original_json` keeps the week as first generated, so re-adapting after
+    more feedback always starts from the original instead of compounding.
+    """
+    __tablename__ = 'plan_adaptations'
+    plan_id = Column(Integer, ForeignKey('plans.id'), primary_key=True)
+    week_idx = Column(Integer, primary_key=True)
+    decision = Column(String, nullable=False)
+    original_json = Column(Text, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class Task(Base):
+    """Persistent background task (see `app.jobs`)."""
+    __tablename__ = 'tasks'
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, nullable=False)
+    payload_json = Column(Text, nullable=False)
+    status = Column(String, nullable=False, default='pending')  # pending, running, done, error
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (Index('ix_tasks_status_id', 'status', 'id'),)
+
+def create_schema(bind):
+    """Create missing tables, columns and indexes (safe to call on every startup).
+
+    `create_all` only creates whole tables, so columns and indexes added to
+    existing tables later are created here explicitly. This is a
+    lightweight stand-in for real migrations that only handles additive
+    changes (new columns must be nullable or have a constant server
+    default); use Alembic for anything else.
+    """
+    Base.metadata.create_all(bind=bind)
+    insp = inspect(bind)
+    ddl = bind.dialect.ddl_compiler(bind.dialect, None)
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {c['name'] for c in insp.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {ddl.get_column_specification(column)}'))
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
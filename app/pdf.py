@@ -0,0 +1,240 @@
+"""Off-thread, cached PDF rendering for plan exports.
+
+ReportLab's `SimpleDocTemplate.build` is pure-Python and CPU-bound; a long
+multi-week plan takes long enough to stall a worker. Rendering therefore:
+
+- runs in a process pool (`PDF_WORKERS` processes), so it neither blocks the
+  event loop nor competes for the web process's GIL
+- writes the result to `PDF_CACHE_DIR` keyed by plan id + plan revision, so
+  downloading the same plan again is a file read. Bumping `Plan.revision`
+  invalidates the cached file. Files of older revisions are not removed on
+  write (a download may still be reading them); `sweep_cache` removes them
+  once they are `PDF_SWEEP_AGE` seconds old, run in the pool at most every
+  `PDF_SWEEP_INTERVAL` seconds
+- builds ReportLab's sample stylesheet once per worker process instead of
+  once per document
+
+`PdfJobs` exposes the pool as submit/poll/download jobs for clients that
+export whole teams, with one job per plan revision: asking again for the
+same revision returns the same job id. `/export/pdf` serves a cached file
+directly and otherwise waits for that job.
+"""
+
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+PDF_CACHE_DIR = Path(os.getenv('PDF_CACHE_DIR') or Path(tempfile.gettempdir()) / 'baloncestia-pdf')
+PDF_WORKERS = int(os.getenv('PDF_WORKERS', '2'))
+PDF_SWEEP_AGE = float(os.getenv('PDF_SWEEP_AGE', '600'))
+PDF_SWEEP_INTERVAL = float(os.getenv('PDF_SWEEP_INTERVAL', '3600'))
+
+# Workers come from a forkserver (spawn where unavailable) rather than a
+# fork of the web process, which could inherit held locks and deadlock.
+MP_CONTEXT = multiprocessing.get_context('forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn')
+
+_styles = None
+
+
+def _get_styles():
+    """Return ReportLab's sample stylesheet, built once per process."""
+    global _styles
+    if _styles is None:
+        from reportlab.lib.styles import getSampleStyleSheet
+
+        _styles = getSampleStyleSheet()
+    return _styles
+
+
+def render_pdf(doc):
+    """Render a plan document (see `persistence.plan_export`) and return the PDF bytes.
+
+    The PDF generation here is intentionally simple; for richer exports
+    consider using an HTML-to-PDF converter in the future.
+    """
+    import io
+
+    from reportlab.platypus import SimpleDocTemplate, Paragraph
+
+    styles = _get_styles()
+    buffer = io.BytesIO()
+    elems = [Paragraph(f"Plan {doc['id']} - Nivel: {doc['nivel']}", styles['Heading2'])]
+    for s in doc['sessions']:
+        elems.append(Paragraph(f"Semana {s['week_idx']+1} - {s['dia']} ({s['intensidad']}) - {s['duracion_min']} min - RPE {s['rpe']}", styles['Normal']))
+        for b in s['bloques']:
+            elems.append(Paragraph(f" - {b['tipo']}: {b['min']} min - {b['descripcion']}", styles['Bullet']))
+    SimpleDocTemplate(buffer).build(elems)
+    return buffer.getvalue()
+
+
+def cache_path(plan_id, revision, cache_dir=None):
+    """Return the cache file path for a plan revision."""
+    return Path(cache_dir or PDF_CACHE_DIR) / f'plan_{plan_id}_r{revision}.pdf'
+
+
+def render_to_file(doc, path):
+    """Worker entry point: render `doc` and atomically write it to `path`."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+    tmp.write_bytes(render_pdf(doc))
+    os.replace(tmp, path)
+    return str(path)
+
+
+_CACHE_NAME = re.compile(r'plan_(\d+)_r(\d+)\.pdf')
+
+
+def sweep_cache(cache_dir=None, max_age=PDF_SWEEP_AGE):
+    """Remove cached PDFs superseded by a newer revision of the same plan.
+
+    Only files older than `max_age` seconds are removed, so a download
+    that started just before the plan changed can still read its file.
+    Returns the number of files removed.
+    """
+    newest = {}
+    files = []
+    for path in Path(cache_dir or PDF_CACHE_DIR).glob('plan_*_r*.pdf'):
+        m = _CACHE_NAME.fullmatch(path.name)
+        if m is None:
+            continue
+        plan_id, revision = int(m[1]), int(m[2])
+        newest[plan_id] = max(newest.get(plan_id, revision), revision)
+        files.append((path, plan_id, revision))
+    cutoff = time.time() - max_age
+    removed = 0
+    for path, plan_id, revision in files:
+        if revision < newest[plan_id]:
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    removed += 1
+            except FileNotFoundError:
+                pass
+    return removed
+
+
+class PdfJobs:
+    """In-memory registry of PDF render jobs backed by a process pool.
+
+    Only the most recent `max_jobs` jobs are remembered; the rendered files
+    themselves stay in the disk cache.
+    """
+
+    def __init__(self, workers=PDF_WORKERS, cache_dir=None, max_jobs=1000, sweep_interval=PDF_SWEEP_INTERVAL):
+        self.workers = workers
+        self.cache_dir = cache_dir
+        self.max_jobs = max_jobs
+        self.sweep_interval = sweep_interval
+        self._pool = None
+        self._jobs = OrderedDict()  # job_id -> job dict
+        self._by_revision = {}  # (plan_id, revision) -> job_id
+        self._next_sweep = 0.0
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        """Return the process pool, creating it on first use."""
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers or 1, mp_context=MP_CONTEXT)
+        return self._pool
+
+    def cached(self, plan_id, revision):
+        """Return the cached PDF path for a plan revision, or None."""
+        path = cache_path(plan_id, revision, self.cache_dir)
+        return path if path.exists() else None
+
+    def existing(self, plan_id, revision):
+        """Return (job id, future) of a job that needs no rendering, or None.
+
+        That is the job of this revision (rendering or done), or a new
+        completed job when the PDF is cached but has no job yet. The
+        future resolves to the PDF path.
+        """
+        with self._lock:
+            return self._existing(plan_id, revision)
+
+    def submit(self, plan_id, revision, doc):
+        """Render `doc` (see `persistence.plan_export`) in the pool.
+
+        Returns (job id, future resolving to the PDF path); the revision's
+        existing job instead when there is one.
+        """
+        with self._lock:
+            job = self._existing(plan_id, revision)
+            if job is not None:
+                return job
+            path = str(cache_path(plan_id, revision, self.cache_dir))
+            try:
+                future = self._get_pool().submit(render_to_file, doc, path)
+            except BrokenProcessPool:
+                # a worker died (OOM, kill): the executor refuses all work
+                # from now on, so replace it and retry once
+                self._reset_pool()
+                future = self._get_pool().submit(render_to_file, doc, path)
+            job_id = self._register(plan_id, revision, future)
+            now = time.monotonic()
+            if now >= self._next_sweep:
+                self._next_sweep = now + self.sweep_interval
+                self._pool.submit(sweep_cache, self.cache_dir)
+        return job_id, future
+
+    def _reset_pool(self):
+        """Drop a broken pool; the next `_get_pool` starts a new one."""
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = None
+
+    def _existing(self, plan_id, revision):
+        """`existing` body; the caller holds the lock."""
+        job_id = self._by_revision.get((plan_id, revision))
+        if job_id is not None:
+            future = self._jobs[job_id]['future']
+            # a failed render, or a file swept since, is rendered again
+            if not future.done() or (future.exception() is None and Path(future.result()).exists()):
+                return job_id, future
+            del self._by_revision[(plan_id, revision)]
+        path = self.cached(plan_id, revision)
+        if path is None:
+            return None
+        future = Future()
+        future.set_result(str(path))
+        return self._register(plan_id, revision, future), future
+
+    def _register(self, plan_id, revision, future):
+        """Record the revision's job and return its id; the caller holds the lock."""
+        job_id = uuid.uuid4().hex
+        self._jobs[job_id] = {'plan_id': plan_id, 'revision': revision, 'future': future}
+        self._by_revision[(plan_id, revision)] = job_id
+        while len(self._jobs) > self.max_jobs:
+            old_id, old = self._jobs.popitem(last=False)
+            key = (old['plan_id'], old['revision'])
+            if self._by_revision.get(key) == old_id:
+                del self._by_revision[key]
+        return job_id
+
+    def get(self, job_id):
+        """Return the job dict or None."""
+        return self._jobs.get(job_id)
+
+    def status(self, job_id):
+        """Return 'pending', 'done' or 'error' for a known job."""
+        future = self._jobs[job_id]['future']
+        if not future.done():
+            return 'pending'
+        return 'error' if future.exception() is not None else 'done'
+
+    def shutdown(self):
+        """Stop the pool without waiting for pending renders."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+PDF_JOBS = PdfJobs()
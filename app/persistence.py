@@ -0,0 +1,371 @@
+"""Persistence helpers that write generated plans to the database.
+
+A generated plan is a small tree (Plan -> Sessions -> Blocks). Writing it
+row by row with a commit/refresh per session costs one fsync on SQLite (and
+one network round-trip on Postgres) per session and keeps the database write
+lock held for the whole sequence. This module writes the whole tree in a
+single transaction using bulk INSERT ... RETURNING statements:
+
+- one INSERT for the Plan rows, returning their generated ids; each row
+  carries a compressed JSON snapshot of the whole plan (`encode_snapshot`)
+  that plan reads and exports serve without touching sessions/blocks
+- one executemany INSERT for all Sessions, returning their ids in parameter
+  order so blocks can be linked without a refresh
+- one executemany INSERT for all Blocks
+- one executemany INSERT for the per-week analytics rows
+  (`analytics.week_stat_rows`, computed from the plan in memory)
+
+Plans filed under a `user_id` first get their `User` rows
+(`ensure_users`, one INSERT ... ON CONFLICT DO NOTHING). The same
+statements serve a single plan (`save_plan`) or a whole batch
+(`save_plans`). Plans are `planner.types.Plan` objects (the dict
+shape of `build_plan` is accepted too). The caller owns the SQLAlchemy
+session; both helpers commit exactly once.
+"""
+
+import datetime
+import json
+import zlib
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.orm import selectinload
+
+from . import models
+from .analytics import week_stat_rows
+from .db import dialect_insert
+from .planner.adaptation import adapt_week
+from .planner.types import as_plan
+from .responses import dumps, loads
+
+# zlib level for plan snapshots: drill descriptions repeat a lot, so the
+# default level already shrinks them several times at little CPU cost.
+SNAPSHOT_LEVEL = 6
+
+
+def plan_row(plan_req):
+    """Map a validated `PlanRequest` to the column values of a Plan row."""
+    return {
+        'user_id': plan_req.user_id,
+        'fecha_inicio': 'hoje',  # placeholder; could be converted to proper date
+        'semanas': plan_req.semanas,
+        'nivel': plan_req.nivel,
+        'dias_por_semana': len(plan_req.disponibilidad),
+        'duracion_sesion_min': plan_req.duracion_sesion_min,
+        'objetivos_json': json.dumps(plan_req.objetivos, ensure_ascii=False),
+        'equipamiento_json': json.dumps(plan_req.equipamiento, ensure_ascii=False),
+    }
+
+
+def session_rows(plan_id, plan):
+    """Flatten the generated weeks into Session rows (in plan order)."""
+    rows = []
+    for week_idx, week in enumerate(plan.weeks):
+        for s in week:
+            rows.append(
+                {
+                    'plan_id': plan_id,
+                    'week_idx': week_idx,
+                    'day_name': s.dia,
+                    'intensidad': s.intensidad,
+                    'duracion_min': s.duracion_min,
+                    'rpe': s.rpe,
+                    'carga': s.carga_sesion,
+                }
+            )
+    return rows
+
+
+def stored_sessions(plan):
+    """Return the GET /api/plan/{id} session dicts of a generated plan."""
+    return [
+        {
+            'week_idx': week_idx,
+            'dia': s.dia,
+            'intensidad': s.intensidad,
+            'duracion_min': s.duracion_min,
+            'rpe': s.rpe,
+            'carga': s.carga_sesion,
+            'bloques': [{'tipo': b.tipo, 'min': b.min, 'descripcion': b.descripcion} for b in s.bloques],
+        }
+        for week_idx, week in enumerate(plan.weeks)
+        for s in week
+    ]
+
+
+def tree_sessions(sessions):
+    """Return the GET /api/plan/{id} session dicts of Session rows (with blocks)."""
+    return [
+        {
+            'week_idx': s.week_idx,
+            'dia': s.day_name,
+            'intensidad': s.intensidad,
+            'duracion_min': s.duracion_min,
+            'rpe': s.rpe,
+            'carga': s.carga,
+            'bloques': [{'tipo': b.tipo, 'min': b.min, 'descripcion': b.descripcion} for b in s.blocks],
+        }
+        for s in sessions
+    ]
+
+
+def encode_snapshot(semanas, nivel, sessions):
+    """Return the compressed snapshot of a plan (see `models.Plan.snapshot`)."""
+    return zlib.compress(dumps({'semanas': semanas, 'nivel': nivel, 'sessions': sessions}), SNAPSHOT_LEVEL)
+
+
+def snapshot_json(row):
+    """Return the snapshot JSON bytes of a Plan row, or None when missing or stale.
+
+    `row` needs `revision`, `snapshot_revision` and `snapshot` (an ORM
+    object or a selected row).
+    """
+    if row.snapshot is None or row.snapshot_revision != row.revision:
+        return None
+    return zlib.decompress(row.snapshot)
+
+
+def block_rows(session_ids, plan):
+    """Build Block rows linking each generated block to its session id.
+
+    `session_ids` must be in the same order as `session_rows` produced them.
+    """
+    rows = []
+    sessions = (s for week in plan.weeks for s in week)
+    for session_id, s in zip(session_ids, sessions):
+        for b in s.bloques:
+            rows.append({'session_id': session_id, 'tipo': b.tipo, 'min': b.min, 'descripcion': b.descripcion})
+    return rows
+
+
+def ensure_users(db, user_ids):
+    """Create the `User` rows missing for `user_ids` (no commit).
+
+    One executemany INSERT ... ON CONFLICT DO NOTHING, so two requests
+    filing plans for the same new user cannot both try to create it.
+    """
+    U = models.User
+    stmt = dialect_insert(db)(U).on_conflict_do_nothing(index_elements=[U.id])
+    db.execute(stmt, [{'id': i} for i in sorted(user_ids)])
+
+
+def insert_plans(db, items):
+    """Insert several plan trees without committing and return their ids.
+
+    `items` is a sequence of (plan_req, plan) pairs. However many plans are
+    given, this issues four bulk statements (plans, sessions, blocks and
+    the per-week analytics rows).
+    """
+    if not items:
+        return []
+    items = [(plan_req, as_plan(plan)) for plan_req, plan in items]
+    user_ids = {plan_req.user_id for plan_req, _ in items if plan_req.user_id is not None}
+    if user_ids:
+        ensure_users(db, user_ids)
+    # One explicit timestamp per batch (not the server default): SQLite's
+    # CURRENT_TIMESTAMP has second resolution and a different text format
+    # than bound datetimes, which the history cursors compare against.
+    created_at = datetime.datetime.now(datetime.timezone.utc)
+    # sort_by_parameter_order guarantees ids come back aligned with the
+    # parameter lists even when the driver batches the executemany.
+    plan_ids = db.execute(
+        insert(models.Plan).returning(models.Plan.id, sort_by_parameter_order=True),
+        [
+            dict(
+                plan_row(plan_req),
+                created_at=created_at,
+                revision=1,
+                snapshot=encode_snapshot(plan_req.semanas, plan_req.nivel, stored_sessions(plan)),
+                snapshot_revision=1,
+            )
+            for plan_req, plan in items
+        ],
+    ).scalars().all()
+
+    sessions = []
+    stats = []
+    for plan_id, (_, plan) in zip(plan_ids, items):
+        sessions.extend(session_rows(plan_id, plan))
+        stats.extend(week_stat_rows(plan_id, plan))
+    if stats:
+        db.execute(insert(models.PlanWeekStat), stats)
+    if not sessions:
+        return plan_ids
+    session_ids = db.execute(
+        insert(models.Session).returning(models.Session.id, sort_by_parameter_order=True),
+        sessions,
+    ).scalars().all()
+
+    blocks = []
+    offset = 0
+    for _, plan in items:
+        n = sum(len(week) for week in plan.weeks)
+        blocks.extend(block_rows(session_ids[offset:offset + n], plan))
+        offset += n
+    if blocks:
+        db.execute(insert(models.Block), blocks)
+    return plan_ids
+
+
+def save_plans(db, items):
+    """Persist several generated plans in one transaction.
+
+    Returns the new plan ids in the order of `items`. On error the
+    transaction is rolled back so no partial batch is left behind.
+    """
+    try:
+        plan_ids = insert_plans(db, items)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return plan_ids
+
+
+def save_plan(db, plan_req, plan):
+    """Persist a generated plan (Plan + Sessions + Blocks) in one transaction.
+
+    Returns the id of the new Plan row. On error the transaction is rolled
+    back so no partial plan is left behind.
+    """
+    return save_plans(db, [(plan_req, plan)])[0]
+
+
+def load_plan_tree(db, plan_id):
+    """Return the Plan with its sessions and blocks loaded, or None.
+
+    Uses `selectinload` so the whole tree costs a constant three queries
+    (plan, sessions, blocks) regardless of the plan's length, and the
+    result can be used outside the session (e.g. after
+    `AsyncSession.run_sync`).
+    """
+    stmt = (
+        select(models.Plan)
+        .where(models.Plan.id == plan_id)
+        .options(selectinload(models.Plan.sessions).selectinload(models.Session.blocks))
+    )
+    return db.execute(stmt).scalar_one_or_none()
+
+
+def _plan_json(db, plan_id):
+    """Return (revision, snapshot-shaped JSON bytes) of a plan, or None.
+
+    A primary-key lookup of the Plan row; the sessions/blocks rows are only
+    read when the snapshot is missing or stale.
+    """
+    P = models.Plan
+    row = db.execute(select(P.revision, P.snapshot_revision, P.snapshot).where(P.id == plan_id)).one_or_none()
+    if row is None:
+        return None
+    raw = snapshot_json(row)
+    if raw is None:
+        p = load_plan_tree(db, plan_id)
+        raw = dumps({'semanas': p.semanas, 'nivel': p.nivel, 'sessions': tree_sessions(p.sessions)})
+    return row.revision, raw
+
+
+def plan_body(db, plan_id):
+    """Return the GET /api/plan/{id} JSON body as bytes, or None if unknown.
+
+    The snapshot bytes are spliced in after the id without decoding them.
+    """
+    found = _plan_json(db, plan_id)
+    if found is None:
+        return None
+    raw = found[1]
+    return b'{"plan":{"id":' + str(plan_id).encode() + b',' + raw[1:] + b'}'
+
+
+def plan_export(db, plan_id):
+    """Return the plan as a dict (id, revision, semanas, nivel, sessions), or None.
+
+    The document rendered by the PDF export (see `pdf.render_pdf`).
+    """
+    found = _plan_json(db, plan_id)
+    if found is None:
+        return None
+    revision, raw = found
+    return {'id': plan_id, 'revision': revision, **loads(raw)}
+
+
+def _week_dicts(sessions):
+    """Serialize Session rows (with blocks) for `planner.adaptation`."""
+    return [
+        {
+            'id': s.id,
+            'intensidad': s.intensidad,
+            'rpe': s.rpe,
+            'duracion_min': s.duracion_min,
+            'bloques': [{'id': b.id, 'tipo': b.tipo, 'min': b.min} for b in s.blocks],
+        }
+        for s in sessions
+    ]
+
+
+def apply_adaptation(db, plan_id, week_idx):
+    """Adapt week `week_idx + 1` of a plan to the feedback on `week_idx`.
+
+    Background-task handler (see `app.jobs`). Uses the aggregated feedback
+    of `PlanWeekStat` and always adapts from the week as originally
+    generated (kept in `PlanAdaptation`), so repeated feedback refines the
+    adaptation instead of compounding it. Bumps `Plan.revision` and
+    rewrites the plan snapshot when the week changes. Commits once;
+    returns the decision or None when there is nothing to adapt.
+    """
+    stat = db.get(models.PlanWeekStat, (plan_id, week_idx))
+    if stat is None or not stat.feedback_count:
+        return None
+    target = week_idx + 1
+    sessions = db.execute(
+        select(models.Session)
+        .where(models.Session.plan_id == plan_id, models.Session.week_idx.in_([week_idx, target]))
+        .order_by(models.Session.id)
+        .options(selectinload(models.Session.blocks))
+    ).scalars().all()
+    reported = [s for s in sessions if s.week_idx == week_idx]
+    upcoming = [s for s in sessions if s.week_idx == target]
+    if not upcoming:
+        return None
+
+    adaptation = db.get(models.PlanAdaptation, (plan_id, target))
+    original = json.loads(adaptation.original_json) if adaptation else _week_dicts(upcoming)
+    decision, adapted = adapt_week(
+        original,
+        _week_dicts(reported),
+        stat.cumplimiento_sum / stat.feedback_count,
+        stat.rpe_percibido_sum / stat.feedback_count,
+    )
+    if adaptation is None:
+        adaptation = models.PlanAdaptation(plan_id=plan_id, week_idx=target, original_json=json.dumps(original))
+        db.add(adaptation)
+    adaptation.decision = decision
+
+    changed = False
+    by_id = {s.id: s for s in upcoming}
+    for new in adapted:
+        s = by_id[new['id']]
+        if (s.rpe, s.intensidad) != (new['rpe'], new['intensidad']):
+            s.rpe, s.intensidad, s.carga = new['rpe'], new['intensidad'], new['rpe'] * s.duracion_min
+            changed = True
+        for b, new_b in zip(s.blocks, new['bloques']):
+            if b.min != new_b['min']:
+                b.min = new_b['min']
+                changed = True
+    if changed:
+        db.execute(
+            update(models.PlanWeekStat)
+            .where(models.PlanWeekStat.plan_id == plan_id, models.PlanWeekStat.week_idx == target)
+            .values(carga_planificada=sum(s.carga for s in upcoming), rpe_planificado_sum=sum(s.rpe for s in upcoming))
+        )
+        db.flush()
+        p = load_plan_tree(db, plan_id)
+        db.execute(
+            update(models.Plan)
+            .where(models.Plan.id == plan_id)
+            .values(
+                revision=models.Plan.revision + 1,
+                snapshot=encode_snapshot(p.semanas, p.nivel, tree_sessions(p.sessions)),
+                snapshot_revision=models.Plan.revision + 1,
+            )
+        )
+    db.commit()
+    return decision
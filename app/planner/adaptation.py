@@ -0,0 +1,88 @@
+"""Feedback-driven adaptation of the next plan week.
+
+After an athlete reports a week (average compliance and perceived RPE),
+the following week is adjusted with the same progression rules the
+planner uses (`engine` constants, `progression.allocate_rpe`):
+
+- 'descarga' (deload): compliance below LOW_COMPLIANCE or the week felt
+  at least RPE_OVERSHOOT points harder than planned -> next week's load is
+  cut to ADAPT_DELOAD_FACTOR and BLOCK_SHIFT_MIN minutes per session move
+  from conditioning to mobility
+- 'progresar': compliance of at least HIGH_COMPLIANCE and the week felt
+  easier than planned -> next week's load rises by PROGRESSION_STEP,
+  without exceeding the reported week by more than MAX_WEEKLY_INCREASE
+- 'mantener' otherwise (the week is left as planned)
+
+Session intensity labels follow the new RPEs (`intensity_for_rpe`).
+Sessions are plain dicts: intensidad, rpe, duracion_min and bloques (dicts
+with tipo, min, descripcion); the functions return new dicts.
+"""
+
+from typing import List
+
+from .engine import MAX_WEEKLY_INCREASE, PROGRESSION_STEP, RPE_CEIL, RPE_FLOOR
+from .progression import allocate_rpe, week_load
+
+LOW_COMPLIANCE = 70
+HIGH_COMPLIANCE = 90
+# perceived minus planned average RPE that triggers a deload
+RPE_OVERSHOOT = 2
+ADAPT_DELOAD_FACTOR = 0.9
+BLOCK_SHIFT_MIN = 5
+
+
+def intensity_for_rpe(rpe: int):
+    """Map an RPE to the session intensity label (inverse of INTENSITY_TO_RPE)."""
+    if rpe >= 7:
+        return 'Alta'
+    if rpe >= 5:
+        return 'Media'
+    return 'Baja'
+
+
+def decide(cumplimiento_pct: float, rpe_percibido: float, rpe_planificado: float):
+    """Return 'descarga', 'progresar' or 'mantener' for a reported week."""
+    if cumplimiento_pct < LOW_COMPLIANCE or rpe_percibido - rpe_planificado >= RPE_OVERSHOOT:
+        return 'descarga'
+    if cumplimiento_pct >= HIGH_COMPLIANCE and rpe_percibido < rpe_planificado:
+        return 'progresar'
+    return 'mantener'
+
+
+def _shift_minutes(bloques: List[dict], source: str, dest: str, minutes: int):
+    """Move `minutes` from block `source` to block `dest` when both exist."""
+    tipos = [b['tipo'] for b in bloques]
+    if source not in tipos or dest not in tipos:
+        return bloques
+    i, j = tipos.index(source), tipos.index(dest)
+    if bloques[i]['min'] - minutes < BLOCK_SHIFT_MIN:
+        return bloques
+    bloques = [dict(b) for b in bloques]
+    bloques[i]['min'] -= minutes
+    bloques[j]['min'] += minutes
+    return bloques
+
+
+def adapt_week(week: List[dict], reported_week: List[dict], cumplimiento_pct: float, rpe_percibido: float):
+    """Return (decision, adapted copy of `week`) given feedback on `reported_week`."""
+    durations = [s['duracion_min'] for s in week]
+    rpes = [s['rpe'] for s in week]
+    rpe_planificado = sum(s['rpe'] for s in reported_week) / len(reported_week) if reported_week else 0
+    decision = decide(cumplimiento_pct, rpe_percibido, rpe_planificado)
+    load = week_load(rpes, durations)
+    if decision == 'descarga':
+        new_rpes = allocate_rpe(rpes, durations, cap=load * ADAPT_DELOAD_FACTOR, floor=RPE_FLOOR)
+    elif decision == 'progresar':
+        reported = week_load([s['rpe'] for s in reported_week], [s['duracion_min'] for s in reported_week])
+        new_rpes = allocate_rpe(rpes, durations, target=load * (1 + PROGRESSION_STEP),
+                                cap=max(load, reported * (1 + MAX_WEEKLY_INCREASE)), ceil=RPE_CEIL)
+    else:
+        return decision, [dict(s) for s in week]
+
+    adapted = []
+    for s, rpe in zip(week, new_rpes):
+        bloques = s['bloques']
+        if decision == 'descarga':
+            bloques = _shift_minutes(bloques, 'condicionamiento', 'movilidad', BLOCK_SHIFT_MIN)
+        adapted.append(dict(s, rpe=rpe, intensidad=intensity_for_rpe(rpe) if rpe != s['rpe'] else s['intensidad'], bloques=bloques))
+    return decision, adapted
@@ -0,0 +1,127 @@
+"""Batch plan generation for whole teams and clubs.
+
+`generate_plans` takes the keyword arguments of several `build_plan` calls
+(one per player) and returns the generated plans (compact `types.Plan`
+objects) in the same order:
+
+- requests are deduplicated with the plan cache's content-addressed key
+  (see `planner.cache`), so inputs that only differ in objective order or
+  case are generated once; plans already in the cache are not generated
+  at all (treat returned plans as read-only)
+- small batches run in-process; batches with at least
+  `PROCESS_POOL_THRESHOLD` distinct requests are spread over a process pool
+  so CPU-bound generation uses every core instead of one; workers send
+  plans back in `Plan.pack` form (drills by id), which the parent rebuilds
+  against its own drill library, so the library's `Drill` objects are not
+  pickled once per block
+- week templates come from the compiled rule tables in each worker: the
+  NumPy kernel (`planner.kernel`) is not used here, since computing the
+  templates in bulk measured slower than those lookups
+  (`benchmarks/bench_kernel.py`)
+"""
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from .cache import PLAN_CACHE, prepare_request
+from .engine import generate_plan
+from .library import DRILL_LIBRARY
+from .types import Plan
+
+# Below this many distinct requests the pool's pickling/IPC overhead costs
+# more than it saves (a plan is generated in well under a millisecond).
+PROCESS_POOL_THRESHOLD = int(os.getenv('BATCH_PROCESS_THRESHOLD', '64'))
+BATCH_WORKERS = int(os.getenv('BATCH_WORKERS', '0')) or None
+
+# Workers are started by a forkserver (spawn where unavailable), never by
+# forking the web process: a forked child inherits locks held by the
+# parent's other threads (task worker, feedback flush) and can deadlock.
+MP_CONTEXT = multiprocessing.get_context('forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn')
+
+_pool = None
+
+
+def _get_pool():
+    """Return the shared process pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=BATCH_WORKERS, mp_context=MP_CONTEXT)
+    return _pool
+
+
+def _reset_pool():
+    """Drop the shared pool (e.g. broken by a dead worker); the next
+    `_get_pool` starts a new one."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _map_in_pool(jobs, chunksize):
+    """Generate every job in the pool, in order, as `Plan` objects.
+
+    A worker that dies (OOM, kill) breaks the executor for good, so the
+    pool is replaced and the batch retried once on the new one.
+    """
+    try:
+        results = list(_get_pool().map(_build_packed, jobs, chunksize=chunksize))
+    except BrokenProcessPool:
+        _reset_pool()
+        try:
+            results = list(_get_pool().map(_build_packed, jobs, chunksize=chunksize))
+        except BrokenProcessPool:
+            _reset_pool()
+            raise
+    snap = DRILL_LIBRARY.current()
+    blocks = {}
+    # A plan packed against another version of the library (reloaded
+    # mid-batch) may name drills this process no longer has: rebuild it here.
+    return [
+        Plan.unpack(packed, snap.index.drill, blocks) if signature == snap.signature else _build(kwargs)
+        for (signature, packed), kwargs in zip(results, jobs)
+    ]
+
+
+def _build(kwargs: dict):
+    """Generate one plan in this process."""
+    return generate_plan(**kwargs)
+
+
+def _build_packed(kwargs: dict):
+    """Top-level (picklable) worker entry point: the library signature the
+    plan was built against and the plan in `Plan.pack` form."""
+    snap = DRILL_LIBRARY.current()
+    return snap.signature, generate_plan(**kwargs, drill_index=snap.index).pack()
+
+
+def generate_plans(requests, cache=PLAN_CACHE):
+    """Generate one plan per `build_plan` kwargs dict, preserving order."""
+    by_key = {}
+    missing = {}
+    keys = []
+    for kwargs in requests:
+        key, plan_kwargs = prepare_request(**kwargs)
+        keys.append(key)
+        if key in by_key or key in missing:
+            continue
+        plan = cache.get(key)
+        if plan is None:
+            missing[key] = plan_kwargs
+        else:
+            by_key[key] = plan
+
+    if len(missing) >= PROCESS_POOL_THRESHOLD:
+        jobs = list(missing.values())
+        workers = BATCH_WORKERS or os.cpu_count() or 1
+        chunksize = max(1, len(jobs) // (4 * workers))
+        results = _map_in_pool(jobs, chunksize)
+    else:
+        results = [_build(kwargs) for kwargs in missing.values()]
+
+    for key, plan in zip(missing, results):
+        cache.put(key, plan)
+        by_key[key] = plan
+    return [by_key[key] for key in keys]
@@ -0,0 +1,193 @@
+"""Content-addressed cache in front of `generate_plan`.
+
+Most plan requests are near-identical (same level, same 3-4 days, same
+equipment, objectives in a different order or case). This module maps each
+request to a canonical key and caches the generated plan under a hash of
+it:
+
+- `normalize_request` only folds differences the planner ignores:
+  objectives are lower-cased and sorted (they only matter through their
+  keyword bitset), equipment is deduplicated and sorted (it is matched as
+  a set, but case-sensitively, so the strings are kept as given), days are
+  kept verbatim and in order (they name the sessions and drive the
+  intensity pattern) and `historial_carga` is reduced to the values the
+  planner uses: the last week's load, or the last `CHRONIC_WEEKS` loads
+  when ACWR bounds are requested (`progression.recent_loads`, the same
+  selection as the engine)
+- the key also includes the drill library's ETag, so editing
+  `data/drills.yml` naturally invalidates cached plans
+- the plan is generated from the request as given, with a seed derived
+  from the key, so a cached plan is exactly what an uncached call with the
+  same key would produce
+- `PlanCache` evicts by LRU, TTL and a total size budget (bytes of the
+  plan's JSON), and counts hits/misses
+
+Cached plans are compact `types.Plan` objects shared between callers and
+must be treated as read-only.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from .engine import generate_plan, iter_plan_weeks
+from .library import DRILL_LIBRARY
+from .progression import CHRONIC_WEEKS, recent_loads
+from .types import Plan
+
+
+def _clean(values):
+    """Lower-case, strip and drop empty strings."""
+    return [v.strip().lower() for v in values or [] if v and v.strip()]
+
+
+def normalize_request(disponibilidad, duracion_sesion_min, nivel, objetivos, equipamiento, historial_carga=None, semanas=1, acwr_min=None, acwr_max=None):
+    """Return the canonical form of a request, used only for its cache key.
+
+    Two requests with the same canonical form produce the same plan; the
+    plan itself is always generated from the request as given.
+    """
+    use_acwr = acwr_min is not None or acwr_max is not None
+    cargas = recent_loads(historial_carga, CHRONIC_WEEKS if use_acwr else 1)
+    if not use_acwr and cargas and not cargas[-1]:
+        cargas = []
+    normalized = {
+        'disponibilidad': list(disponibilidad),
+        'duracion_sesion_min': int(duracion_sesion_min),
+        'nivel': nivel,
+        'objetivos': sorted(_clean(objetivos)),
+        'equipamiento': sorted(set(equipamiento or [])),
+        'historial_carga': cargas,
+        'semanas': max(1, semanas or 1),
+    }
+    if use_acwr:
+        normalized['acwr_min'] = acwr_min
+        normalized['acwr_max'] = acwr_max
+    return normalized
+
+
+def request_key(normalized, library_etag=''):
+    """Return the hex SHA-256 of a normalized request (and library version)."""
+    canonical = json.dumps([normalized, library_etag], sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def seed_for_key(key):
+    """Derive the deterministic drill-selection seed for a cache key."""
+    return int(key[:16], 16)
+
+
+class PlanCache:
+    """Thread-safe LRU cache with TTL expiry and a size budget in bytes."""
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024, ttl=3600.0, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.clock = clock
+        self._data = OrderedDict()  # key -> (expires_at, size, plan)
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        """Return the cached plan for `key` or None (counts hit/miss)."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] <= self.clock():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, key, plan, size=None):
+        """Store `plan`; `size` defaults to the length of its JSON encoding."""
+        if size is None:
+            payload = plan.to_dict() if hasattr(plan, 'to_dict') else plan
+            size = len(json.dumps(payload, ensure_ascii=False).encode('utf-8'))
+        if self.max_entries <= 0 or size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (self.clock() + self.ttl, size, plan)
+            self.bytes += size
+            while len(self._data) > self.max_entries or self.bytes > self.max_bytes:
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def stats(self):
+        """Return counters for monitoring."""
+        return {
+            'entries': len(self._data),
+            'bytes': self.bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+    def _remove(self, key):
+        _, size, _ = self._data.pop(key)
+        self.bytes -= size
+
+
+PLAN_CACHE = PlanCache(
+    max_entries=int(os.getenv('PLAN_CACHE_MAX_ENTRIES', '1024')),
+    max_bytes=int(os.getenv('PLAN_CACHE_MAX_BYTES', str(64 * 1024 * 1024))),
+    ttl=float(os.getenv('PLAN_CACHE_TTL', '3600')),
+)
+
+
+def prepare_request(**kwargs):
+    """Return (cache key, `generate_plan` kwargs) for `build_plan` kwargs.
+
+    The kwargs are the request's own, plus the seed derived from the key.
+    """
+    key = request_key(normalize_request(**kwargs), DRILL_LIBRARY.current().etag)
+    return key, dict(kwargs, seed=seed_for_key(key))
+
+
+def cached_generate_plan(cache=PLAN_CACHE, **kwargs):
+    """`generate_plan` through the content-addressed cache."""
+    key, plan_kwargs = prepare_request(**kwargs)
+    plan = cache.get(key)
+    if plan is None:
+        plan = generate_plan(**plan_kwargs)
+        cache.put(key, plan)
+    return plan
+
+
+def cached_plan_weeks(cache=PLAN_CACHE, **kwargs):
+    """`cached_generate_plan` one week at a time.
+
+    Yields the cached plan's weeks on a hit; on a miss yields each week as
+    `iter_plan_weeks` builds it and caches the plan once the last week is
+    done (a caller that stops early caches nothing).
+    """
+    key, plan_kwargs = prepare_request(**kwargs)
+    plan = cache.get(key)
+    if plan is not None:
+        yield from plan.weeks
+        return
+    weeks = []
+    for week in iter_plan_weeks(**plan_kwargs):
+        weeks.append(week)
+        yield week
+    cache.put(key, Plan(len(weeks), weeks))
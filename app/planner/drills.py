@@ -8,22 +8,42 @@ Design notes:
 - `load_drills` returns a list of dicts with an `id` field for traceability.
 - `filter_drills` performs exact matching by category/intensity and checks
   equipment subset requirements.
-- `pick_drills_for_block` tries to fill the requested minutes by adding
-  suggested durations; randomness is only used to vary selection order.
+- `DrillIndex` is built once per library: drills are bucketed by
+  (categoria, intensidad) and equipment requirements are encoded as
+  bitmasks, so filtering is a dict lookup plus one integer AND per drill.
+  The planner works on compact `types.Drill` objects, built once per
+  library dict (`DrillIndex.compact`) and shared by every generated plan.
+- `pick_drills_for_block` fills the requested minutes as a bounded
+  subset-sum over `min_sugeridos`: drills are grouped by duration and a
+  memoized table (`fill_table`) gives, for each reachable total, how many
+  drills of each duration reach it. The total closest to the target wins
+  (exact fills first, ties go to the shorter total). Randomness only
+  chooses which drills of each duration are used and comes from an
+  optional `rng` so seeded plans are reproducible.
+- variety: drills in `exclude` (already used this week) are skipped unless
+  that makes the fill clearly worse, and drills in `avoid` (used in the
+  previous week) are only chosen when no other drill of that duration is
+  left, so categories rotate across weeks.
 """
 
-import yaml
+from functools import lru_cache
 from pathlib import Path
 import random
 
+from .types import Drill
+
 DRILLS_PATH = Path(__file__).resolve().parents[2] / 'data' / 'drills.yml'
 
+# Minutes a non-repeating fill may miss the target by before drills used
+# earlier in the week are allowed again.
+FILL_TOLERANCE = 5
 
-def load_drills(path=None):
-    """Load drills from YAML and return as a list of dicts.
+
+def resolve_drills_path(path=None):
+    """Return the drills YAML path to use, or None if it cannot be found.
 
     If no path is provided the default `data/drills.yml` next to the repo
-    root is used. Returns an empty list if the file cannot be found.
+    root is used, falling back to a `data/` folder inside the app package.
     """
     p = Path(path) if path else DRILLS_PATH
     if not p.exists():
@@ -32,9 +52,28 @@ def load_drills(path=None):
         if alt.exists():
             p = alt
         else:
-            return []
+            return None
+    return p
+
+
+def load_drills(path=None):
+    """Load drills from YAML and return as a list of dicts.
+
+    If no path is provided the default `data/drills.yml` next to the repo
+    root is used. Returns an empty list if the file cannot be found.
+    """
+    p = resolve_drills_path(path)
+    if p is None:
+        return []
+    # Imported here: processes that start from the pickled library snapshot
+    # (see `planner.library`) never need PyYAML.
+    import yaml
+
+    # Use libyaml's C loader when PyYAML was built with it; the pure-Python
+    # loader is an order of magnitude slower on large libraries.
+    loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
     with open(p, 'r', encoding='utf-8') as f:
-        data = yaml.safe_load(f) or {}
+        data = yaml.load(f, Loader=loader) or {}
 
     drills = []
     for k, v in data.items():
@@ -64,20 +103,250 @@ def filter_drills(drills, categoria=None, intensidad=None, equipamiento=None):
     return out
 
 
-def pick_drills_for_block(drills, categoria, intensidad, equipamiento, minutes_needed):
-    """Pick drills to approximately fill `minutes_needed`.
+class DrillIndex:
+    """Precomputed lookup structure over a drill library.
+
+    Built once when the library is loaded and then shared by every plan:
+
+    - each equipment item gets one bit; a drill's `equipo_requerido` becomes
+      an integer mask, so "required is a subset of available" is the single
+      check `required & ~available == 0`
+    - drills are bucketed by (categoria, intensidad)
+    - filtered pools are memoized per (categoria, intensidad, available
+      mask), so repeated blocks of the same kind cost one dict lookup
+      (`pool_hits` / `pool_misses` count memo lookups for monitoring)
+
+    `filter` mirrors `filter_drills` (same arguments, same results and
+    order) and returns a fresh list the caller may shuffle.
+    """
+
+    def __init__(self, drills):
+        self.drills = list(drills)
+        self.equipment_bits = {}
+        self.entries = []
+        self.buckets = {}
+        self._pools = {}
+        self._classes = {}
+        self._compact = {}
+        self._by_id = {}
+        self.pool_hits = 0
+        self.pool_misses = 0
+        for d in self.drills:
+            mask = 0
+            for item in d.get('equipo_requerido', []):
+                bit = self.equipment_bits.setdefault(item, 1 << len(self.equipment_bits))
+                mask |= bit
+            self.entries.append((mask, d))
+            self._by_id.setdefault(d.get('id'), d)
+            self.buckets.setdefault((d.get('categoria'), d.get('intensidad')), []).append((mask, d))
+
+    def __len__(self):
+        return len(self.drills)
+
+    def equipment_mask(self, equipamiento):
+        """Encode available equipment as a bitmask.
+
+        Items no drill requires have no bit; they cannot make a drill
+        eligible, so ignoring them is safe.
+        """
+        mask = 0
+        bits = self.equipment_bits
+        for item in equipamiento:
+            mask |= bits.get(item, 0)
+        return mask
+
+    def _entries(self, categoria, intensidad):
+        """Return the (mask, drill) entries matching the metadata filters."""
+        if categoria and intensidad:
+            return self.buckets.get((categoria, intensidad), [])
+        # Partial filters are rare (only direct callers use them): scan the
+        # entries in library order, like `filter_drills`.
+        return [
+            (mask, d)
+            for mask, d in self.entries
+            if (not categoria or d.get('categoria') == categoria) and (not intensidad or d.get('intensidad') == intensidad)
+        ]
+
+    def pool(self, categoria=None, intensidad=None, equipamiento=None):
+        """Return the memoized (drills, shortest duration) pool for the filters.
+
+        The tuple is shared between callers and must not be mutated.
+        """
+        available = None if equipamiento is None else self.equipment_mask(equipamiento)
+        key = (categoria, intensidad, available)
+        pool = self._pools.get(key)
+        if pool is not None:
+            self.pool_hits += 1
+        else:
+            self.pool_misses += 1
+            entries = self._entries(categoria, intensidad)
+            if available is None:
+                drills = tuple(d for _, d in entries)
+            else:
+                missing = ~available
+                drills = tuple(d for mask, d in entries if not mask & missing)
+            shortest = min((d.get('min_sugeridos', 5) for d in drills), default=5)
+            pool = self._pools[key] = (drills, max(1, shortest))
+        return pool
+
+    def filter(self, categoria=None, intensidad=None, equipamiento=None):
+        """Return drills matching the filters (same semantics as `filter_drills`)."""
+        return list(self.pool(categoria, intensidad, equipamiento)[0])
+
+    def compact(self, d):
+        """Return the shared `Drill` for a library dict (built once per drill)."""
+        drill = self._compact.get(id(d))
+        if drill is None:
+            drill = self._compact[id(d)] = Drill.from_dict(d)
+        return drill
+
+    def drill(self, drill_id):
+        """Return the shared `Drill` with id `drill_id` (KeyError if unknown)."""
+        return self.compact(self._by_id[drill_id])
+
+    def classes(self, categoria=None, intensidad=None, equipamiento=None):
+        """Return the memoized `duration_classes` of the filtered pool."""
+        available = None if equipamiento is None else self.equipment_mask(equipamiento)
+        key = (categoria, intensidad, available)
+        classes = self._classes.get(key)
+        if classes is None:
+            pool = self.pool(categoria, intensidad, equipamiento)[0]
+            classes = self._classes[key] = duration_classes([self.compact(d) for d in pool])
+        return classes
+
+
+def drill_key(d):
+    """Identity of a `Drill` for the variety constraints (the library id)."""
+    return d.id or id(d)
+
+
+def duration_classes(drills):
+    """Group `Drill`s by suggested minutes: ((minutes, drills, keys, keyset), ...).
+
+    `keys` holds the `drill_key` of each drill (same order) and `keyset` the
+    same keys as a frozenset, so counting the excluded drills of a class
+    only touches the (small) exclusion sets.
+    """
+    groups = {}
+    for d in drills:
+        groups.setdefault(max(1, d.min_sugeridos), []).append(d)
+    out = []
+    for m in sorted(groups):
+        keys = tuple(drill_key(d) for d in groups[m])
+        out.append((m, tuple(groups[m]), keys, frozenset(keys)))
+    return tuple(out)
+
+
+@lru_cache(maxsize=4096)
+def fill_table(counts, limit):
+    """Bounded subset-sum over duration classes.
+
+    `counts` is a sorted tuple of (minutes, available drills) pairs. Returns
+    {total: ((minutes, how many), ...)} for every total up to `limit` that
+    can be reached using each class at most `available` times, keeping the
+    composition with the fewest drills. Callers clip counts to what fits
+    the target, so large libraries with the same duration profile share
+    one table.
+    """
+    table = {0: (0, ())}
+    for minutes, available in counts:
+        for total, (size, comp) in list(table.items()):
+            for n in range(1, available + 1):
+                reached = total + n * minutes
+                if reached > limit:
+                    break
+                current = table.get(reached)
+                if current is None or current[0] > size + n:
+                    table[reached] = (size + n, comp + ((minutes, n),))
+    return {total: comp for total, (_, comp) in table.items()}
+
+
+@lru_cache(maxsize=16384)
+def closest_fill(counts, minutes_needed):
+    """Return (miss, composition) of the non-empty total closest to `minutes_needed`."""
+    longest = counts[-1][0]
+    # Round the limit up so nearby targets share a table.
+    limit = -(-(minutes_needed + longest) // 30) * 30
+    table = fill_table(counts, limit)
+    best = min((t for t in table if t), key=lambda t: (abs(t - minutes_needed), t))
+    return abs(best - minutes_needed), table[best]
+
+
+def _best_fill(classes, minutes_needed, skip):
+    """`closest_fill` over `classes` without the drills in `skip`."""
+    counts = []
+    for minutes, group, _, keyset in classes:
+        available = len(group)
+        if skip:
+            available -= len(keyset & skip)
+        if available > 0:
+            counts.append((minutes, min(available, minutes_needed // minutes + 1)))
+    if not counts:
+        return None, ()
+    return closest_fill(tuple(counts), minutes_needed)
+
+
+def _choose(group, keys, keyset, n, rng, exclude, avoid):
+    """Pick `n` drills of one duration class, preferring unused ones."""
+    skip = len(keyset & exclude) + len(keyset & avoid)
+    if not skip:
+        return rng.sample(group, n)
+    size = len(group)
+    if skip * 4 <= size and size - skip >= 2 * n:
+        # Large class with few used drills: draw until `n` fresh ones turn
+        # up (about n * 4/3 draws at worst) instead of ranking the class.
+        picked, seen = [], set()
+        while len(picked) < n:
+            i = rng.randrange(size)
+            if i in seen:
+                continue
+            seen.add(i)
+            key = keys[i]
+            if key not in exclude and key not in avoid:
+                picked.append(group[i])
+        return picked
+    fresh, recent, used = [], [], []
+    for i in rng.sample(range(size), size):
+        key = keys[i]
+        (used if key in exclude else recent if key in avoid else fresh).append(group[i])
+    return (fresh + recent + used)[:n]
+
+
+def pick_drills_for_block(drills, categoria, intensidad, equipamiento, minutes_needed, rng=None, exclude=None, avoid=None):
+    """Pick drills whose suggested minutes add up as close as possible to `minutes_needed`.
+
+    `drills` may be a plain list of drill dicts or a `DrillIndex`; the index
+    memoizes the duration classes per (categoria, intensidad, equipment
+    mask), so a block costs a table lookup plus a few random draws. `rng`
+    is a `random.Random` used to choose among drills of equal duration
+    (defaults to the global `random` module).
 
-    The function attempts to select drills from the filtered pool until the
-    accumulated suggested minutes meet or exceed the minutes_needed. It
-    returns a list of drill dicts (possibly empty).
+    `exclude` and `avoid` are sets of `drill_key`s: drills already used this
+    week and drills used last week (see the module notes). Returns a list
+    of `Drill`s, empty only when no drill matches or nothing is needed.
     """
-    pool = filter_drills(drills, categoria=categoria, intensidad=intensidad, equipamiento=equipamiento)
-    random.shuffle(pool)
+    rng = rng or random
+    if minutes_needed <= 0:
+        return []
+    if isinstance(drills, DrillIndex):
+        classes = drills.classes(categoria=categoria, intensidad=intensidad, equipamiento=equipamiento)
+    else:
+        pool = filter_drills(drills, categoria=categoria, intensidad=intensidad, equipamiento=equipamiento)
+        classes = duration_classes([Drill.from_dict(d) for d in pool])
+    exclude = exclude or set()
+    avoid = avoid or set()
+    miss, comp = _best_fill(classes, minutes_needed, exclude)
+    if exclude and (miss is None or miss > FILL_TOLERANCE):
+        # Soft constraint: repeat drills from earlier in the week when that
+        # fills the block clearly better.
+        repeat_miss, repeat_comp = _best_fill(classes, minutes_needed, None)
+        if repeat_miss is not None and (miss is None or repeat_miss < miss):
+            miss, comp = repeat_miss, repeat_comp
+            avoid = avoid | exclude
+            exclude = set()
+    groups = {c[0]: c for c in classes}
     selected = []
-    total = 0
-    for d in pool:
-        if total >= minutes_needed:
-            break
-        selected.append(d)
-        total += d.get('min_sugeridos', 5)
+    for minutes, n in comp:
+        _, group, keys, keyset = groups[minutes]
+        selected.extend(_choose(group, keys, keyset, n, rng, exclude, avoid))
     return selected
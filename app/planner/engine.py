@@ -6,157 +6,270 @@ microcycle (week) composed of sessions and blocks.
 
 Design notes / rules for contributors:
 - Keep the builder deterministic where possible (randomness only in drill
-  selection ordering; seed in tests if needed).
+  selection ordering; pass `seed` to `build_plan` for reproducible plans).
 - Document any heuristics and magic numbers (e.g. RPE floor, progression limit).
+- Plans are built as the compact types of `planner.types` (`generate_plan`);
+  `build_plan` serializes them to the API's dict shape.
 """
 
-from .rules import get_pattern, BLOCK_BASE, adjust_blocks_for_objectives, adjust_for_level, INTENSITY_TO_RPE
-from .drills import load_drills, pick_drills_for_block
+from .rules import INTENSITY_TO_RPE, RULE_TABLES, allocate_minutes, objectives_mask, round5  # noqa: F401
+from .drills import drill_key, pick_drills_for_block
+from .library import DRILL_LIBRARY
+from .progression import LoadHistory, allocate_rpe
+from .types import Block, Plan, Session, WeekPlan
+from ..metrics import stage
+from functools import lru_cache
 from typing import List
-
-# Load drills once per process to avoid repeated file IO
-DRILLS = load_drills()
+import random
 
 # Standard ordering used in some heuristics
 DAY_ORDER = ['lun', 'mar', 'mie', 'jue', 'vie', 'sab', 'dom']
 
 
-def round5(x):
-    """Round an integer to the nearest multiple of 5.
+# Mesocycle progression heuristics (see `week_load_factor`):
+# - loading weeks raise the planned RPE by PROGRESSION_STEP per week
+# - every DELOAD_EVERY-th week is a deload week at DELOAD_FACTOR of the
+#   block's starting load
+# - a week's total load never exceeds the previous loading week (or the last
+#   `historial_carga` entry) by more than MAX_WEEKLY_INCREASE
+PROGRESSION_STEP = 0.05
+DELOAD_EVERY = 4
+DELOAD_FACTOR = 0.7
+MAX_WEEKLY_INCREASE = 0.15
+
+# RPE bounds used when scaling sessions: never below 3 (recovery work) and
+# never above 9 (maximal efforts are not planned).
+RPE_FLOOR = 3
+RPE_CEIL = 9
+
+
+def is_deload_week(week_idx: int):
+    """Return True when `week_idx` (0-based) is a deload week."""
+    return (week_idx + 1) % DELOAD_EVERY == 0
+
+
+def week_load_factor(week_idx: int):
+    """Return the RPE multiplier applied to the template in week `week_idx`.
 
-    Used to keep block durations aligned to 5-minute increments.
+    Weeks are grouped in blocks of DELOAD_EVERY weeks. Each block starts one
+    PROGRESSION_STEP above the previous one and grows by one step per loading
+    week; the last week of the block is a deload week.
     """
-    return int(5 * round(float(x) / 5))
+    block, pos = divmod(week_idx, DELOAD_EVERY)
+    if is_deload_week(week_idx):
+        return (1 + PROGRESSION_STEP * block) * DELOAD_FACTOR
+    return 1 + PROGRESSION_STEP * (block + pos)
 
 
-def allocate_minutes(total_min: int, blocks_pct: dict):
-    """Allocate minutes to each block category based on percentages.
+def block_percentages(nivel: str, objetivos: List[str]):
+    """Return the block percentages for a level and list of objectives
+    (a copy of the compiled `rules.RULE_TABLES` entry)."""
+    return dict(RULE_TABLES.block_percentages(nivel, objectives_mask(objetivos)))
 
-    - Rounds each allocation to nearest 5 minutes
-    - Adjusts the allocations so the sum equals total_min by nudging buckets
-      by ±5 minutes until the total matches.
+
+def build_week_template(disponibilidad: List[str], duracion_sesion_min: int, nivel: str, objetivos: List[str]):
+    """Compute the per-session skeleton shared by every week of a plan.
+
+    Looks up the intensity sequence and the block minutes for the session
+    length, level and objective bitset in `rules.RULE_TABLES`. Returns a
+    list of session templates with the day, intensity, base RPE and the
+    (block type, minutes, drill category, drill intensity) tuples needed to
+    pick drills.
+    """
+    with stage('rules'):
+        mask = objectives_mask(objetivos)
+    with stage('allocation'):
+        alloc = RULE_TABLES.block_minutes(duracion_sesion_min, nivel, mask)
+    return session_templates(disponibilidad, duracion_sesion_min, alloc)
+
+
+def session_templates(disponibilidad: List[str], duracion_sesion_min: int, alloc: dict):
+    """Build the session templates of `build_week_template` from the block
+    minutes `alloc` (see `allocate_minutes` or `kernel.batch_templates`)."""
+    alloc = tuple(alloc.items())
+    template = []
+    for dia, intensidad in zip(disponibilidad, RULE_TABLES.intensity_sequence(len(disponibilidad))):
+        template.append(
+            {
+                'dia': dia,
+                'intensidad': intensidad,
+                'duracion_min': duracion_sesion_min,
+                'rpe': INTENSITY_TO_RPE.get(intensidad, 5),
+                'bloques': session_blocks(intensidad, alloc),
+            }
+        )
+    return template
+
+
+@lru_cache(maxsize=1024)
+def session_blocks(intensidad: str, alloc: tuple):
+    """Return the (block type, minutes, drill category, drill intensity)
+    tuples of a session from its intensity and (block, minutes) pairs."""
+    bloques = []
+    for tipo, mins in alloc:
+        if mins <= 0:
+            continue
+
+        # Map internal block names to drill categories where needed
+        cat = 'enfriamiento' if tipo == 'movilidad' else tipo
+
+        # Map session intensity to drill intensity labels
+        intensidad_drill = (
+            'baja' if intensidad == 'Baja' else ('alta' if intensidad == 'Alta' and tipo in ['condicionamiento'] else 'media')
+        )
+
+        bloques.append((tipo, mins, cat if cat != 'tiro' else 'tiro_movimiento', intensidad_drill))
+    return tuple(bloques)
+
+
+def build_session(tpl: dict, equipamiento: List[str], rpe: int, drill_index=None, rng=None, used=None, recent=None):
+    """Materialize a `Session` from its template: pick drills and set load.
+
+    `drill_index` defaults to the current shared drill library and `rng`
+    (a `random.Random`) to the global random module. `used` is the set of
+    drill keys already picked this week (updated in place) and `recent` the
+    set picked last week; see `pick_drills_for_block` for how they steer
+    variety.
     """
-    alloc = {}
-    for k, v in blocks_pct.items():
-        alloc[k] = round5(total_min * v)
-    # fix total to match exactly
-    s = sum(alloc.values())
-    diff = total_min - s
-    keys = list(alloc.keys())
-    i = 0
-    while diff != 0:
-        alloc[keys[i % len(keys)]] += 5 if diff > 0 else -5
-        diff = total_min - sum(alloc.values())
-        i += 1
-    return alloc
+    if drill_index is None:
+        drill_index = DRILL_LIBRARY.current().index
+    bloques = []
+    for tipo, mins, categoria, intensidad_drill in tpl['bloques']:
+        selected = pick_drills_for_block(
+            drill_index,
+            categoria=categoria,
+            intensidad=intensidad_drill,
+            equipamiento=equipamiento,
+            minutes_needed=mins,
+            rng=rng,
+            exclude=used,
+            avoid=recent,
+        )
+        if used is not None:
+            used.update(drill_key(d) for d in selected)
+        # Blocks without drills get the neutral fallback description
+        bloques.append(Block(tipo, mins, tuple(selected)))
+
+    return Session(tpl['dia'], tpl['intensidad'], tpl['duracion_min'], rpe, tuple(bloques))
+
+
+def apply_week_rpe(week: List[Session], cap: float = None, target: float = None):
+    """Set session RPEs in place so the week's total load fits `target..cap`.
+
+    Thin wrapper around `progression.allocate_rpe` (a one-pass exact integer
+    allocation; RPE stays within RPE_FLOOR..RPE_CEIL, so a very low cap may
+    be unreachable). Returns the week's total load.
+    """
+    rpes = allocate_rpe(
+        [s.rpe for s in week],
+        [s.duracion_min for s in week],
+        cap=cap,
+        target=target,
+        floor=RPE_FLOOR,
+        ceil=RPE_CEIL,
+    )
+    for s, rpe in zip(week, rpes):
+        s.rpe = rpe
+    return sum(s.rpe * s.duracion_min for s in week)
+
+
+def generate_plan(disponibilidad: List[str], duracion_sesion_min: int, nivel: str, objetivos: List[str], equipamiento: List[str], historial_carga: List[dict] = None, semanas: int = 1, seed: int = None, acwr_min: float = None, acwr_max: float = None, template: List[dict] = None, drill_index=None):
+    """Build a mesocycle of `semanas` weeks based on inputs.
+
+    The week template (intensities, block percentages and minutes) is
+    computed once; each week then only scales the template RPEs by
+    `week_load_factor`, picks drills and applies the load cap, so the cost
+    grows linearly with `semanas`. With a `seed` the drill selection (the
+    only random step) is reproducible. Within a week no drill is repeated
+    while the library allows it, and drills of the previous week are only
+    reused when a category has nothing else left.
+
+    `acwr_min` / `acwr_max` additionally keep each loading week's
+    acute:chronic workload ratio (against the chronic mean of the preceding
+    weeks, `historial_carga` included) inside those bounds; the maximum is
+    combined with the MAX_WEEKLY_INCREASE cap. Deload weeks are only capped.
+
+    `template` is a precomputed `build_week_template` result for these
+    inputs (e.g. one template shared by several requests).
+    `drill_index` defaults to the current shared drill library.
+
+    Returns a `types.Plan` (one `WeekPlan` of `Session`s per week); see
+    `build_plan` for the dict shape and `iter_plan_weeks` for the weeks one
+    at a time.
+    """
+    weeks = list(iter_plan_weeks(disponibilidad, duracion_sesion_min, nivel, objetivos, equipamiento, historial_carga, semanas, seed, acwr_min, acwr_max, template, drill_index))
+    return Plan(len(weeks), weeks)
 
 
-def build_week_plan(disponibilidad: List[str], duracion_sesion_min: int, nivel: str, objetivos: List[str], equipamiento: List[str], historial_carga: List[dict] = None):
-    """Build a single-week microcycle based on inputs.
+def iter_plan_weeks(disponibilidad: List[str], duracion_sesion_min: int, nivel: str, objetivos: List[str], equipamiento: List[str], historial_carga: List[dict] = None, semanas: int = 1, seed: int = None, acwr_min: float = None, acwr_max: float = None, template: List[dict] = None, drill_index=None):
+    """Yield the `WeekPlan`s of `generate_plan` one by one, as each is built.
+
+    Each week only depends on the ones before it, so a caller can forward
+    week 0 before the later weeks exist (see POST /api/plan/stream).
+    """
+    semanas = max(1, semanas or 1)
+    # Resolve the drill library once so every week uses the same version even
+    # if the YAML file is reloaded mid-plan.
+    if drill_index is None:
+        drill_index = DRILL_LIBRARY.current().index
+    rng = random.Random(seed) if seed is not None else None
+    if template is None:
+        template = build_week_template(disponibilidad, duracion_sesion_min, nivel, objetivos)
+
+    # Progression logic: if there is historical load data, ensure the first
+    # week's total load does not exceed +15% of the last recorded week.
+    history = LoadHistory.from_historial(historial_carga)
+    reference = history.last or None
+    use_acwr = acwr_min is not None or acwr_max is not None
+
+    recent = set()
+    for week_idx in range(semanas):
+        factor = week_load_factor(week_idx)
+        deload = is_deload_week(week_idx)
+        week = []
+        used = set()
+        with stage('drill_selection'):
+            for tpl in template:
+                rpe = min(RPE_CEIL, max(RPE_FLOOR, round(tpl['rpe'] * factor))) if week_idx else tpl['rpe']
+                week.append(build_session(tpl, equipamiento, rpe, drill_index, rng, used, recent))
+        recent = used
+
+        cap = reference * (1 + MAX_WEEKLY_INCREASE) if reference else None
+        target = None
+        if use_acwr:
+            low, high = history.bounds(acwr_min, acwr_max)
+            if high is not None:
+                cap = high if cap is None else min(cap, high)
+            if not deload:
+                target = low
+        if cap is not None or target is not None:
+            with stage('progression'):
+                carga = apply_week_rpe(week, cap=cap, target=target)
+        else:
+            carga = sum(s.rpe * s.duracion_min for s in week)
+
+        # Deload weeks do not reset the reference: the week after a deload
+        # is capped against the last loading week, not the lighter one.
+        if not deload:
+            reference = carga
+        history.push(carga)
+        yield WeekPlan(week)
+
+
+def build_plan(*args, **kwargs):
+    """`generate_plan` serialized to the API's dict shape.
 
     Returns a dict with 'semanas' and 'weeks' where each week is a list of
     session dicts. Each session contains blocks with type, minutes and
     description.
     """
-    dias_por_semana = len(disponibilidad)
-    pattern = get_pattern(dias_por_semana)
-
-    # Start with the baseline block percentages and adjust for objectives/level
-    blocks_base = BLOCK_BASE.copy()
-    blocks_adj = adjust_blocks_for_objectives(blocks_base, objetivos)
-    blocks_adj = adjust_for_level(blocks_adj, nivel)
-
-    weeks = []
-
-    # Build a single microcycle (week 0)
-    week = []
-    for idx, dia in enumerate(disponibilidad):
-        intensidad = pattern[idx % len(pattern)]
-
-        # Heuristic: avoid two consecutive 'Alta' intensity days
-        if idx > 0 and intensidad == 'Alta' and pattern[(idx - 1) % len(pattern)] == 'Alta':
-            intensidad = 'Media'
-
-        # For beginners, cap intense conditioning blocks
-        b_pct = blocks_adj.copy()
-        if nivel == 'principiante':
-            b_pct['condicionamiento'] = min(b_pct.get('condicionamiento', 0), 0.15)
-
-        alloc = allocate_minutes(duracion_sesion_min, b_pct)
-
-        bloques = []
-        for tipo, mins in alloc.items():
-            if mins <= 0:
-                continue
-
-            # Map internal block names to drill categories where needed
-            cat = 'enfriamiento' if tipo == 'movilidad' else tipo
-
-            # Map session intensity to drill intensity labels
-            intensidad_drill = (
-                'baja' if intensidad == 'Baja' else ('alta' if intensidad == 'Alta' and tipo in ['condicionamiento'] else 'media')
-            )
-
-            selected = pick_drills_for_block(
-                DRILLS,
-                categoria=(cat if cat != 'tiro' else 'tiro_movimiento'),
-                intensidad=intensidad_drill,
-                equipamiento=equipamiento,
-                minutes_needed=mins,
-            )
-
-            if selected:
-                desc = '; '.join([d.get('descripcion', '') for d in selected])
-            else:
-                # Neutral fallback text avoids mentioning equipment
-                desc = f'Bloque genérico ({mins} min) - sin drills disponibles según el equipamiento.'
-
-            bloques.append({'tipo': tipo, 'min': mins, 'descripcion': desc})
-
-        rpe = INTENSITY_TO_RPE.get(intensidad, 5)
-        carga = rpe * duracion_sesion_min
-
-        session = {
-            'dia': dia,
-            'intensidad': intensidad,
-            'duracion_min': duracion_sesion_min,
-            'bloques': bloques,
-            'indicadores': {'RPE': rpe, 'carga_sesion': carga},
-        }
-        week.append(session)
-
-    weeks.append(week)
-
-    # Progression logic: if there is historical load data, ensure the new
-    # week's total load does not exceed +15% of the last recorded week.
-    if historial_carga:
-        last = sorted(historial_carga, key=lambda x: x.get('semana'))[-1]
-        ultima = last.get('carga_total', None)
-        if ultima:
-            target = ultima * 1.15
-            current_week_carga = sum(s['indicadores']['carga_sesion'] for s in week)
-            iterations = 0
-            while current_week_carga > target and iterations < 5:
-                reduction_factor = target / current_week_carga
-                for s in week:
-                    old_rpe = s['indicadores']['RPE']
-                    new_rpe = max(3, int((old_rpe * reduction_factor) // 1))
-                    if new_rpe < old_rpe:
-                        s['indicadores']['RPE'] = new_rpe
-                        s['indicadores']['carga_sesion'] = new_rpe * s['duracion_min']
-                current_week_carga = sum(s['indicadores']['carga_sesion'] for s in week)
-                iterations += 1
-
-            # If rounding keeps us slightly above target, reduce RPE of the
-            # highest-load session by 1 until we meet the target.
-            if current_week_carga > target:
-                week_sorted = sorted(week, key=lambda s: s['indicadores']['carga_sesion'], reverse=True)
-                for s in week_sorted:
-                    if s['indicadores']['RPE'] > 3:
-                        s['indicadores']['RPE'] -= 1
-                        s['indicadores']['carga_sesion'] = s['indicadores']['RPE'] * s['duracion_min']
-                        current_week_carga = sum(ss['indicadores']['carga_sesion'] for ss in week)
-                        if current_week_carga <= target:
-                            break
-
-    return {'semanas': 1, 'weeks': weeks}
+    return generate_plan(*args, **kwargs).to_dict()
+
+
+def build_week_plan(disponibilidad: List[str], duracion_sesion_min: int, nivel: str, objetivos: List[str], equipamiento: List[str], historial_carga: List[dict] = None):
+    """Build a single-week microcycle based on inputs.
+
+    Thin wrapper around `build_plan` kept for callers that only need one
+    week. Returns a dict with 'semanas' and 'weeks'.
+    """
+    return build_plan(disponibilidad, duracion_sesion_min, nivel, objetivos, equipamiento, historial_carga, semanas=1)
@@ -0,0 +1,116 @@
+"""Array-backed block minutes for many requests at once (optional NumPy).
+
+`batch_block_minutes` computes, for N requests at once, what the scalar
+path computes one request at a time with small dicts:
+
+- `rules.adjust_blocks_for_mask` / `rules.adjust_for_level` and the
+  beginner conditioning cap (`rules.compute_block_percentages`) -> (N, K) block
+  percentages, K = len(BLOCK_BASE)
+- `rules.allocate_minutes` -> (N, K) integer minutes, with the ±5 nudges
+  in closed form instead of a loop
+
+Results are identical to the scalar path: the floating-point operations are
+the same ones in the same order (objective rules are applied in
+OBJECTIVE_RULES order, sums are accumulated left to right, `np.rint`
+rounds half to even like `round`). NumPy is optional; `available()` tells
+callers whether the kernel can be used.
+
+`batch.generate_plans` does not use it: since the rules are compiled into
+lookup tables (`rules.RULE_TABLES`), the scalar path builds templates
+faster than `batch_templates` (`benchmarks/bench_kernel.py` compares both).
+"""
+
+from typing import List, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency
+    np = None
+
+from .engine import session_templates
+from .rules import BEGINNER_CONDITIONING_CAP, BLOCK_BASE, LEVEL_RULES, OBJECTIVE_RULES, objectives_mask
+
+BLOCK_KEYS = tuple(BLOCK_BASE)
+_COL = {k: i for i, k in enumerate(BLOCK_KEYS)}
+
+
+def available():
+    """Return True when NumPy is installed."""
+    return np is not None
+
+
+def _apply(b, mask, changes):
+    """Vectorized `rules._apply` on the rows of `b` selected by `mask`."""
+    for k, delta, bound in changes:
+        c = _COL[k]
+        col = b[:, c] + delta
+        col = np.minimum(bound, col) if delta > 0 else np.maximum(bound, col)
+        b[:, c] = np.where(mask, col, b[:, c])
+
+
+def _normalize(b):
+    # accumulate left to right like `sum(dict.values())`
+    s = b[:, 0].copy()
+    for c in range(1, b.shape[1]):
+        s += b[:, c]
+    return b / s[:, None]
+
+
+def objective_flag_array(objetivos_batch: Sequence[List[str]]):
+    """Return a (N, R) bool array: request n triggers objective rule r
+    (the bits of `rules.objectives_mask`)."""
+    masks = np.array([objectives_mask(o) for o in objetivos_batch], dtype=np.int64)
+    return ((masks[:, None] >> np.arange(len(OBJECTIVE_RULES))) & 1).astype(bool)
+
+
+def batch_percentages(niveles: Sequence[str], objetivos_batch: Sequence[List[str]]):
+    """Return the (N, K) block percentages of `engine.block_percentages`."""
+    niveles = np.asarray(niveles, dtype=object)
+    flags = objective_flag_array(objetivos_batch)
+    b = np.tile(np.array([BLOCK_BASE[k] for k in BLOCK_KEYS], dtype=np.float64), (len(niveles), 1))
+    for r, (_, changes) in enumerate(OBJECTIVE_RULES):
+        _apply(b, flags[:, r], changes)
+    b = _normalize(b)
+    for nivel, changes in LEVEL_RULES.items():
+        _apply(b, niveles == nivel, changes)
+    b = _normalize(b)
+    c = _COL['condicionamiento']
+    b[:, c] = np.where(niveles == 'principiante', np.minimum(b[:, c], BEGINNER_CONDITIONING_CAP), b[:, c])
+    return b
+
+
+def batch_allocate_minutes(totals, pct):
+    """Vectorized `rules.allocate_minutes`: (N,) totals x (N, K) -> (N, K) ints."""
+    totals = np.asarray(totals, dtype=np.int64)
+    alloc = (5 * np.rint(totals[:, None] * pct / 5)).astype(np.int64)
+    nudges, rest = np.divmod(totals - alloc.sum(axis=1), 5)
+    rounds, extra = np.divmod(np.abs(nudges), pct.shape[1])
+    step = np.where(nudges > 0, 5, -5)
+    alloc += step[:, None] * (rounds[:, None] + (np.arange(pct.shape[1]) < extra[:, None]))
+    alloc[np.arange(len(alloc)), alloc.argmax(axis=1)] += rest
+    return alloc
+
+
+def batch_block_minutes(requests: Sequence[dict]):
+    """Return the (N, K) block minutes for `build_plan` kwargs dicts."""
+    pct = batch_percentages([r['nivel'] for r in requests], [r.get('objetivos') or [] for r in requests])
+    return batch_allocate_minutes([r['duracion_sesion_min'] for r in requests], pct)
+
+
+def batch_templates(requests: Sequence[dict]):
+    """Return `engine.build_week_template` output for each request.
+
+    Requests with the same days, session length and block minutes share one
+    template object (treat them as read-only).
+    """
+    minutes = batch_block_minutes(requests)
+    seen = {}
+    templates = []
+    for r, row in zip(requests, minutes.tolist()):
+        key = (tuple(r['disponibilidad']), r['duracion_sesion_min'], tuple(row))
+        tpl = seen.get(key)
+        if tpl is None:
+            tpl = seen[key] = session_templates(r['disponibilidad'], r['duracion_sesion_min'], dict(zip(BLOCK_KEYS, row)))
+        templates.append(tpl)
+    return templates
+
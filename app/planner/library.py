@@ -0,0 +1,147 @@
+"""Shared, hot-reloadable cache of the drill library.
+
+Every consumer of the drills (the planner, the HTML index and
+`/api/templates`) reads them through `DRILL_LIBRARY.current()`, which returns
+an immutable `LibrarySnapshot`:
+
+- the snapshot is keyed on the YAML file's (mtime_ns, size); `current()`
+  only stats the file and reparses it when that signature changes
+- reloads are serialized by a lock and published by swapping a single
+  attribute, so readers always see either the old or the new snapshot,
+  never a half-built one
+- the `/api/templates` JSON body and its ETag are computed once per
+  snapshot instead of once per request
+- when `DRILLS_SNAPSHOT` points to a file, the parsed library is also kept
+  there as a pickle so cold starts skip the YAML parse. The pickle records
+  the YAML signature it was built from and is ignored when stale.
+
+Build the binary snapshot ahead of time (e.g. in the Docker image) with:
+
+    DRILLS_SNAPSHOT=data/drills.pickle python -m app.planner.library
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import threading
+from pathlib import Path
+
+from .drills import DrillIndex, load_drills, resolve_drills_path
+
+SNAPSHOT_FORMAT = 1
+
+
+class LibrarySnapshot:
+    """Immutable view of one version of the drill library."""
+
+    __slots__ = ('signature', 'drills', 'index', 'templates_body', 'etag')
+
+    def __init__(self, signature, drills, templates_body=None):
+        self.signature = signature
+        self.drills = drills
+        self.index = DrillIndex(drills)
+        if templates_body is None:
+            templates_body = json.dumps({'drills': drills}, ensure_ascii=False).encode('utf-8')
+        self.templates_body = templates_body
+        self.etag = '"%s"' % hashlib.sha1(templates_body).hexdigest()
+
+
+def file_signature(path):
+    """Return the (mtime_ns, size) pair used to detect library changes."""
+    if path is None:
+        return None
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+class DrillLibrary:
+    """Drill library cache with mtime-based invalidation and atomic swap."""
+
+    def __init__(self, path=None, snapshot_path=None):
+        self.path = path
+        self.snapshot_path = Path(snapshot_path) if snapshot_path else None
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self.reloads = 0
+
+    def current(self):
+        """Return the snapshot for the library file as it is on disk now."""
+        path = resolve_drills_path(self.path)
+        signature = file_signature(path)
+        snap = self._snapshot
+        if snap is not None and snap.signature == signature:
+            return snap
+        with self._lock:
+            # Another thread may have reloaded while we waited for the lock.
+            snap = self._snapshot
+            if snap is None or snap.signature != signature:
+                snap = self._load(path, signature)
+                self._snapshot = snap
+                self.reloads += 1
+        return snap
+
+    def _load(self, path, signature):
+        """Build a snapshot from the binary snapshot if fresh, else from YAML."""
+        cached = self._read_binary(signature)
+        if cached is not None:
+            return LibrarySnapshot(signature, cached['drills'], cached['templates_body'])
+        snap = LibrarySnapshot(signature, load_drills(path) if path else [])
+        self._write_binary(snap)
+        return snap
+
+    def _read_binary(self, signature):
+        """Return the pickled payload if it matches `signature`, else None."""
+        if self.snapshot_path is None or signature is None:
+            return None
+        try:
+            with open(self.snapshot_path, 'rb') as f:
+                payload = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            return None
+        if payload.get('format') != SNAPSHOT_FORMAT or tuple(payload.get('signature') or ()) != signature:
+            return None
+        return payload
+
+    def _write_binary(self, snap):
+        """Persist `snap` as the binary snapshot (best effort, atomic rename)."""
+        if self.snapshot_path is None or snap.signature is None:
+            return
+        payload = {
+            'format': SNAPSHOT_FORMAT,
+            'signature': snap.signature,
+            'drills': snap.drills,
+            'templates_body': snap.templates_body,
+        }
+        tmp = self.snapshot_path.with_name(self.snapshot_path.name + '.tmp')
+        try:
+            with open(tmp, 'wb') as f:
+                pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self.snapshot_path)
+        except OSError:
+            # A read-only filesystem only costs us the faster cold start.
+            pass
+
+
+def etag_matches(if_none_match, etag):
+    """Return True if an If-None-Match header value matches `etag`."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*' or candidate.removeprefix('W/') == etag:
+            return True
+    return False
+
+
+# Process-wide library shared by the planner and the HTTP endpoints.
+DRILL_LIBRARY = DrillLibrary(snapshot_path=os.getenv('DRILLS_SNAPSHOT') or None)
+
+
+if __name__ == '__main__':
+    snap = DRILL_LIBRARY.current()
+    target = DRILL_LIBRARY.snapshot_path or 'no DRILLS_SNAPSHOT set; nothing written'
+    print(f'{len(snap.drills)} drills loaded -> {target}')
@@ -0,0 +1,209 @@
+"""Load progression: per-session RPE allocation and load history.
+
+`allocate_rpe` replaces the old iterative capping loop (5 proportional
+passes followed by a greedy one-point-at-a-time pass that re-summed the
+week after every decrement). It solves the allocation directly:
+
+1. find the continuous scale factor `f` for which the week's load equals
+   the budget, pinning sessions that would cross the RPE floor/ceiling
+   (one scan over the sessions sorted by RPE)
+2. round every scaled RPE towards the safe side (down when capping, up when
+   raising to a target)
+3. hand the leftover budget out one point per session by largest remainder
+
+Every session moves by at most one point in step 3, so the whole solve is a
+sort plus two linear passes. When all sessions share a duration (always the
+case for plans built here) the result is the largest load that fits the
+cap, which is never lower than what the old loop produced.
+
+`LoadHistory` keeps the weekly loads needed for the acute:chronic workload
+ratio (ACWR) in fixed-size windows with rolling sums, so an arbitrarily long
+`historial_carga` is reduced once and every generated week is an O(1)
+update instead of a re-sort.
+"""
+
+import heapq
+import math
+from collections import deque
+from typing import List, Optional
+
+# Same bounds as the planner (see engine.RPE_FLOOR / RPE_CEIL)
+RPE_FLOOR = 3
+RPE_CEIL = 9
+
+# ACWR windows in weeks: acute = the last week, chronic = the last 4 weeks.
+# The ratio is "uncoupled": the week being planned is compared against the
+# chronic mean of the weeks before it.
+ACUTE_WEEKS = 1
+CHRONIC_WEEKS = 4
+
+
+def week_load(rpes, durations):
+    """Return the session-RPE load of a week (sum of RPE x minutes)."""
+    return sum(r * d for r, d in zip(rpes, durations))
+
+
+def _scale_factor(rpes, durations, bounds, budget):
+    """Return `f` such that sum(clamp(r * f, bound)) * d == budget.
+
+    `bounds[i]` is the RPE at which session i stops moving (its floor when
+    scaling down, its ceiling when scaling up). Sessions are visited in the
+    order in which they hit their bound; those are pinned and the factor is
+    recomputed over the rest. Returns None when every session is pinned.
+    """
+    down = budget < week_load(rpes, durations)
+    # scaling down, low-RPE sessions hit the floor first; scaling up,
+    # high-RPE sessions hit the ceiling first
+    order = sorted(range(len(rpes)), key=lambda i: rpes[i] / bounds[i] if bounds[i] else math.inf, reverse=not down)
+    pinned = 0
+    free = week_load(rpes, durations)
+    for i in order:
+        if free <= 0:
+            break
+        f = (budget - pinned) / free
+        scaled = rpes[i] * f
+        if (scaled >= bounds[i]) if down else (scaled <= bounds[i]):
+            return f
+        pinned += bounds[i] * durations[i]
+        free -= rpes[i] * durations[i]
+    return None
+
+
+def allocate_rpe(rpes: List[int], durations: List[int], cap: Optional[float] = None, target: Optional[float] = None, floor: int = RPE_FLOOR, ceil: int = RPE_CEIL):
+    """Return new per-session RPEs whose week load fits `target..cap`.
+
+    - with `cap`, RPEs are only lowered (never below `floor`, and never
+      raised to `floor` if already below it) until the load is <= cap; if
+      the cap is unreachable every session ends at its lowest allowed RPE
+    - with `target`, RPEs are only raised (never above `ceil`) until the
+      load is >= target, without breaking `cap`
+    - a week already inside the bounds is returned unchanged
+    """
+    rpes = list(rpes)
+    load = week_load(rpes, durations)
+    if cap is not None and load > cap:
+        lows = [min(r, floor) for r in rpes]
+        f = _scale_factor(rpes, durations, lows, cap)
+        if f is None:
+            return lows
+        exact = [max(lo, r * f) for r, lo in zip(rpes, lows)]
+        new = [max(lo, min(r, math.floor(x))) for r, lo, x in zip(rpes, lows, exact)]
+        slack = cap - week_load(new, durations)
+        for i in sorted(range(len(new)), key=lambda i: exact[i] - new[i], reverse=True):
+            if new[i] < rpes[i] and durations[i] <= slack:
+                new[i] += 1
+                slack -= durations[i]
+        return new
+    if target is not None and load < target:
+        highs = [max(r, ceil) for r in rpes]
+        f = _scale_factor(rpes, durations, highs, target)
+        if f is None:
+            new = highs
+        else:
+            exact = [min(hi, r * f) for r, hi in zip(rpes, highs)]
+            new = [min(hi, max(r, math.ceil(x))) for r, hi, x in zip(rpes, highs, exact)]
+            # drop the points that rounding up added beyond the target (or
+            # beyond the cap), then refill the smallest sessions that still fit
+            limit = math.inf if cap is None else cap
+            load = week_load(new, durations)
+            order = sorted(range(len(new)), key=lambda i: new[i] - exact[i], reverse=True)
+            for i in order:
+                if new[i] > rpes[i] and (load - durations[i] >= target or load > limit):
+                    new[i] -= 1
+                    load -= durations[i]
+            for i in sorted(order, key=lambda i: durations[i]):
+                if load < target and new[i] < highs[i] and load + durations[i] <= limit:
+                    new[i] += 1
+                    load += durations[i]
+        if cap is not None and week_load(new, durations) > cap:
+            return allocate_rpe(rpes, durations, cap=cap, floor=floor)
+        return new
+    return rpes
+
+
+def recent_loads(historial_carga, n: int):
+    """Return the `carga_total` of the last `n` `historial_carga` entries by
+    'semana', oldest first.
+
+    Same result as `sorted(historial_carga, key=semana)[-n:]` (entries with
+    the same 'semana' keep their input order, so the later one counts as
+    more recent) but selected with a bounded heap.
+    """
+    recent = heapq.nlargest(n, enumerate(historial_carga or []), key=lambda p: (p[1].get('semana') or 0, p[0]))
+    return [e.get('carga_total') or 0 for _, e in reversed(recent)]
+
+
+class LoadHistory:
+    """Weekly loads in rolling acute/chronic windows.
+
+    Only the last `chronic_weeks` loads are kept, with their running sums,
+    so `push` and the ratio/bound queries are O(1) whatever the length of
+    the history the instance was built from.
+    """
+
+    __slots__ = ('acute_weeks', 'chronic_weeks', '_acute', '_chronic', '_acute_sum', '_chronic_sum')
+
+    def __init__(self, loads=(), acute_weeks: int = ACUTE_WEEKS, chronic_weeks: int = CHRONIC_WEEKS):
+        self.acute_weeks = acute_weeks
+        self.chronic_weeks = chronic_weeks
+        self._acute = deque()
+        self._chronic = deque()
+        self._acute_sum = 0.0
+        self._chronic_sum = 0.0
+        for load in loads:
+            self.push(load)
+
+    @classmethod
+    def from_historial(cls, historial_carga, **kwargs):
+        """Build from `historial_carga` entries ({'semana', 'carga_total'}).
+
+        Only the most recent `chronic_weeks` entries (by 'semana') matter;
+        they are selected with a bounded heap instead of sorting the whole
+        history.
+        """
+        return cls(recent_loads(historial_carga, kwargs.get('chronic_weeks', CHRONIC_WEEKS)), **kwargs)
+
+    def __len__(self):
+        return len(self._chronic)
+
+    def push(self, load: float):
+        """Record the load of the next week."""
+        self._acute.append(load)
+        self._acute_sum += load
+        if len(self._acute) > self.acute_weeks:
+            self._acute_sum -= self._acute.popleft()
+        self._chronic.append(load)
+        self._chronic_sum += load
+        if len(self._chronic) > self.chronic_weeks:
+            self._chronic_sum -= self._chronic.popleft()
+
+    @property
+    def last(self):
+        """The most recent weekly load, or None."""
+        return self._chronic[-1] if self._chronic else None
+
+    def acute(self):
+        """Mean weekly load over the acute window (0 when empty)."""
+        return self._acute_sum / len(self._acute) if self._acute else 0.0
+
+    def chronic(self):
+        """Mean weekly load over the chronic window (0 when empty)."""
+        return self._chronic_sum / len(self._chronic) if self._chronic else 0.0
+
+    def acwr(self):
+        """Acute:chronic workload ratio of the recorded weeks, or None."""
+        chronic = self.chronic()
+        return self.acute() / chronic if chronic else None
+
+    def bounds(self, acwr_min: Optional[float] = None, acwr_max: Optional[float] = None):
+        """Return the (min, max) load of the next week that keeps its ACWR
+        against the current chronic mean within `acwr_min..acwr_max`.
+
+        Either bound is None when not requested or when there is no history.
+        """
+        chronic = self.chronic()
+        if not chronic:
+            return None, None
+        low = acwr_min * chronic if acwr_min is not None else None
+        high = acwr_max * chronic if acwr_max is not None else None
+        return low, high
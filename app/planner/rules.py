@@ -1,10 +1,33 @@
+"""Planning rules and their compiled lookup tables.
+
+The rules (intensity patterns, base block percentages, objective and level
+adjustments, minute allocation) are plain data plus small reference
+functions. `compile_rules()` evaluates them once, at import, into a
+`RuleTables` so the planner only does table lookups per request:
+
+- `intensities[n]`: the intensity of each of `n` training days, with the
+  last pattern day Baja and the no-consecutive-Alta rule applied
+- `percentages[(nivel, mask)]`: normalized block percentages per level and
+  objective-flag bitset (see `objectives_mask`)
+- `allocations[(duracion, nivel, mask)]`: `allocate_minutes` output for
+  the common session lengths (DURATIONS); other lengths are computed on
+  first use and memoized
+
+Objectives are reduced to a bitset: bit `r` is set when any objective
+mentions a keyword of OBJECTIVE_RULES[r], and every set rule is applied
+once, in OBJECTIVE_RULES order. The block split therefore depends neither
+on the order of the objectives nor on how many of them mention the same
+rule.
+"""
+
+from functools import lru_cache
 from typing import List
 
 INTENSITY_PATTERNS = {
-    3: ['Alta','Media','Baja'],
-    4: ['Alta','Media','Alta','Baja'],
-    5: ['Alta','Media','Alta','Media','Baja'],
-    6: ['Alta','Media','Alta','Media','Baja','Baja']
+    3: ('Alta','Media','Baja'),
+    4: ('Alta','Media','Alta','Baja'),
+    5: ('Alta','Media','Alta','Media','Baja'),
+    6: ('Alta','Media','Alta','Media','Baja','Baja')
 }
 
 BLOCK_BASE = {
@@ -17,32 +40,83 @@ BLOCK_BASE = {
 }
 
 def get_pattern(dias_por_semana:int):
-    if dias_por_semana < 3:
-        dias_por_semana = 3
-    if dias_por_semana >6:
-        dias_por_semana = 6
-    pattern = INTENSITY_PATTERNS.get(dias_por_semana)
+    """Return (a copy of) the intensity pattern for a number of days."""
+    dias_por_semana = min(6, max(3, dias_por_semana))
+    pattern = list(INTENSITY_PATTERNS[dias_por_semana])
     # ensure last day is Baja
-    if pattern and pattern[-1] != 'Baja':
-        pattern[-1] = 'Baja'
+    pattern[-1] = 'Baja'
     return pattern
 
-def adjust_blocks_for_objectives(blocks_pct:dict, objetivos:List[str]):
+
+def intensity_sequence(n:int):
+    """Return the intensity of each of `n` consecutive training days.
+
+    The pattern repeats when `n` is longer than it, and an Alta day right
+    after an Alta pattern day is lowered to Media.
+    """
+    pattern = get_pattern(n)
+    seq = []
+    for idx in range(n):
+        intensidad = pattern[idx % len(pattern)]
+        # Heuristic: avoid two consecutive 'Alta' intensity days
+        if idx > 0 and intensidad == 'Alta' and pattern[(idx - 1) % len(pattern)] == 'Alta':
+            intensidad = 'Media'
+        seq.append(intensidad)
+    return tuple(seq)
+
+# Objective rules, applied in this order when an objective contains one of
+# the keywords: each (block, delta, bound) raises the block up to `bound`
+# (delta > 0) or lowers it down to `bound` (delta < 0).
+OBJECTIVE_RULES = (
+    (('tiro',), (('tiro', 0.10, 0.6), ('condicionamiento', -0.05, 0.05))),
+    (('manejo', 'balon'), (('manejo_balon', 0.10, 0.6), ('tiro', -0.05, 0.05))),
+    (('resistencia', 'aceler'), (('condicionamiento', 0.10, 0.6), ('manejo_balon', -0.05, 0.05))),
+    (('defensa',), (('defensa', 0.10, 0.5), ('tiro', -0.05, 0.05))),
+)
+
+# Level adjustments, same (block, delta, bound) format
+LEVEL_RULES = {
+    'principiante': (('manejo_balon', 0.05, 0.6), ('tiro', -0.03, 0.1), ('condicionamiento', -0.02, 0.05)),
+    'avanzado': (('condicionamiento', 0.03, 0.6), ('tiro', 0.03, 0.6)),
+}
+
+# Highest share of a session a beginner spends on conditioning
+BEGINNER_CONDITIONING_CAP = 0.15
+
+
+@lru_cache(maxsize=4096)
+def objective_mask(objetivo:str):
+    """Return the OBJECTIVE_RULES bitset of one free-text objective."""
+    lo = objetivo.lower()
+    mask = 0
+    for r, (words, _) in enumerate(OBJECTIVE_RULES):
+        if any(w in lo for w in words):
+            mask |= 1 << r
+    return mask
+
+
+def objectives_mask(objetivos:List[str]):
+    """Return the OBJECTIVE_RULES bitset of a list of objectives."""
+    mask = 0
+    for o in objetivos or ():
+        mask |= objective_mask(o)
+    return mask
+
+
+def _apply(b:dict, changes):
+    for k, delta, bound in changes:
+        if delta > 0:
+            b[k] = min(bound, b.get(k,0)+delta)
+        else:
+            b[k] = max(bound, b.get(k,0)+delta)
+
+
+def adjust_blocks_for_mask(blocks_pct:dict, mask:int):
+    """Apply the objective rules set in `mask` and normalize to sum 1.0."""
     b = blocks_pct.copy()
-    for o in objetivos:
-        lo = o.lower()
-        if 'tiro' in lo:
-            b['tiro'] = min(0.6, b.get('tiro',0)+0.10)
-            b['condicionamiento'] = max(0.05, b.get('condicionamiento',0)-0.05)
-        if 'manejo' in lo or 'balon' in lo:
-            b['manejo_balon'] = min(0.6, b.get('manejo_balon',0)+0.10)
-            b['tiro'] = max(0.05, b.get('tiro',0)-0.05)
-        if 'resistencia' in lo or 'aceler' in lo:
-            b['condicionamiento'] = min(0.6, b.get('condicionamiento',0)+0.10)
-            b['manejo_balon'] = max(0.05, b.get('manejo_balon',0)-0.05)
-        if 'defensa' in lo:
-            b['defensa'] = min(0.5, b.get('defensa',0)+0.10)
-            b['tiro'] = max(0.05, b.get('tiro',0)-0.05)
+    for r, (_, changes) in enumerate(OBJECTIVE_RULES):
+        if mask >> r & 1:
+            _apply(b, changes)
     # normalize to sum 1.0
     s = sum(b.values())
     if s == 0:
@@ -51,19 +125,115 @@ def adjust_blocks_for_objectives(blocks_pct:dict, objetivos:List[str]):
         b[k] = b[k] / s
     return b
 
+
+def adjust_blocks_for_objectives(blocks_pct:dict, objetivos:List[str]):
+    return adjust_blocks_for_mask(blocks_pct, objectives_mask(objetivos))
+
 def adjust_for_level(blocks_pct:dict, nivel:str):
     b = blocks_pct.copy()
-    if nivel == 'principiante':
-        b['manejo_balon'] = min(0.6, b.get('manejo_balon',0)+0.05)
-        b['tiro'] = max(0.1, b.get('tiro',0)-0.03)
-        b['condicionamiento'] = max(0.05, b.get('condicionamiento',0)-0.02)
-    if nivel == 'avanzado':
-        b['condicionamiento'] = min(0.6, b.get('condicionamiento',0)+0.03)
-        b['tiro'] = min(0.6, b.get('tiro',0)+0.03)
+    _apply(b, LEVEL_RULES.get(nivel, ()))
     # re-normalize
     s = sum(b.values())
     for k in b:
         b[k] = b[k] / s
     return b
 
+
+def compute_block_percentages(nivel:str, mask:int):
+    """Block percentages for a level and objective bitset (uncompiled)."""
+    b_pct = adjust_for_level(adjust_blocks_for_mask(BLOCK_BASE, mask), nivel)
+    # For beginners, cap intense conditioning blocks
+    if nivel == 'principiante':
+        b_pct['condicionamiento'] = min(b_pct.get('condicionamiento', 0), BEGINNER_CONDITIONING_CAP)
+    return b_pct
+
+
+def round5(x):
+    """Round an integer to the nearest multiple of 5.
+
+    Used to keep block durations aligned to 5-minute increments.
+    """
+    return int(5 * round(float(x) / 5))
+
+
+def allocate_minutes(total_min: int, blocks_pct: dict):
+    """Allocate minutes to each block category based on percentages.
+
+    - Rounds each allocation to nearest 5 minutes
+    - Adjusts the allocations so the sum equals total_min: the difference
+      is spread as ±5-minute nudges over the buckets in order (round-robin)
+      and any remainder below 5 minutes (`total_min` not a multiple of 5)
+      goes to the largest bucket.
+    """
+    alloc = {}
+    for k, v in blocks_pct.items():
+        alloc[k] = round5(total_min * v)
+    # fix total to match exactly
+    nudges, rest = divmod(total_min - sum(alloc.values()), 5)
+    rounds, extra = divmod(abs(nudges), len(alloc))
+    step = 5 if nudges > 0 else -5
+    for j, k in enumerate(alloc):
+        alloc[k] += step * (rounds + (j < extra))
+    if rest:
+        alloc[max(alloc, key=alloc.get)] += rest
+    return alloc
+
 INTENSITY_TO_RPE = {'Baja':3,'Media':5,'Alta':7}
+
+# Precompiled table ranges: every day count a week can have, the levels
+# accepted by the API and the usual session lengths.
+DAY_COUNTS = range(1, 8)
+LEVELS = ('principiante', 'intermedio', 'avanzado')
+DURATIONS = range(15, 181, 5)
+
+
+class RuleTables:
+    """Lookup tables compiled from the rules above (read-only)."""
+
+    __slots__ = ('intensities', 'percentages', 'allocations')
+
+    def __init__(self, intensities, percentages, allocations):
+        self.intensities = intensities
+        self.percentages = percentages
+        self.allocations = allocations
+
+    def intensity_sequence(self, n:int):
+        seq = self.intensities.get(n)
+        return seq if seq is not None else intensity_sequence(n)
+
+    def block_percentages(self, nivel:str, mask:int):
+        """Return the (shared) block percentages; do not mutate."""
+        pct = self.percentages.get((nivel, mask))
+        return pct if pct is not None else _uncompiled_percentages(nivel, mask)
+
+    def block_minutes(self, duracion:int, nivel:str, mask:int):
+        """Return the (shared) minutes per block; do not mutate."""
+        alloc = self.allocations.get((duracion, nivel, mask))
+        return alloc if alloc is not None else _uncompiled_minutes(duracion, nivel, mask)
+
+
+@lru_cache(maxsize=256)
+def _uncompiled_percentages(nivel, mask):
+    return compute_block_percentages(nivel, mask)
+
+
+@lru_cache(maxsize=4096)
+def _uncompiled_minutes(duracion, nivel, mask):
+    return allocate_minutes(duracion, _uncompiled_percentages(nivel, mask))
+
+
+def compile_rules():
+    """Evaluate the rules for every precompiled combination."""
+    intensities = {n: intensity_sequence(n) for n in DAY_COUNTS}
+    percentages = {
+        (nivel, mask): compute_block_percentages(nivel, mask)
+        for nivel in LEVELS for mask in range(1 << len(OBJECTIVE_RULES))
+    }
+    allocations = {
+        (duracion, nivel, mask): allocate_minutes(duracion, pct)
+        for (nivel, mask), pct in percentages.items() for duracion in DURATIONS
+    }
+    return RuleTables(intensities, percentages, allocations)
+
+
+RULE_TABLES = compile_rules()
@@ -0,0 +1,206 @@
+"""Compact in-memory types for drills and generated plans.
+
+The planner keeps thousands of generated plans alive (plan cache, batch
+results), so plans are not built as nested dicts:
+
+- every type is a slotted dataclass (no per-instance `__dict__`)
+- a `Block` references the library's `Drill` objects instead of holding a
+  joined description string; the text is built on serialization
+- per-session load (`carga_sesion`) and per-week load are derived from RPE
+  and duration instead of being stored
+
+`Plan.to_dict()` is the single serialization step to the JSON shape the
+API has always returned ({'semanas', 'weeks': [[session, ...], ...]}, each
+session with dia, intensidad, duracion_min, bloques and indicadores).
+`Plan.from_dict()` is the inverse for callers that still hold that shape.
+`Plan.pack()` / `Plan.unpack()` are a second, cheaper-to-pickle form (plain
+tuples, drills by id) for moving plans between processes.
+"""
+
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+
+@dataclass(slots=True, eq=False)
+class Drill:
+    """One library drill (see `data/drills.yml`)."""
+
+    id: str
+    categoria: Optional[str]
+    intensidad: Optional[str]
+    min_sugeridos: int
+    equipo_requerido: Tuple[str, ...]
+    descripcion: str
+
+    @classmethod
+    def from_dict(cls, d: dict):
+        """Build from a library dict (see `drills.load_drills`), with defaults for missing keys."""
+        return cls(
+            id=d.get('id'),
+            categoria=d.get('categoria'),
+            intensidad=d.get('intensidad'),
+            min_sugeridos=d.get('min_sugeridos', 5),
+            equipo_requerido=tuple(d.get('equipo_requerido', ())),
+            descripcion=d.get('descripcion', ''),
+        )
+
+
+@lru_cache(maxsize=256)
+def fallback_text(mins: int):
+    """Description of a block no drill could fill."""
+    # Neutral fallback text avoids mentioning equipment
+    return f'Bloque genérico ({mins} min) - sin drills disponibles según el equipamiento.'
+
+
+@dataclass(slots=True)
+class Block:
+    """A session block: type, minutes and the drills that fill it.
+
+    `texto` overrides the description derived from `drills` (blocks read
+    back from the JSON shape only have the text).
+    """
+
+    tipo: str
+    min: int
+    drills: Tuple[Drill, ...] = ()
+    texto: Optional[str] = None
+
+    @property
+    def descripcion(self):
+        """The block's text: `texto`, else the drills' descriptions joined, else the fallback."""
+        if self.texto is not None:
+            return self.texto
+        if self.drills:
+            return '; '.join([d.descripcion for d in self.drills])
+        return fallback_text(self.min)
+
+    def to_dict(self):
+        """Serialize to the API's block shape (tipo, min, descripcion)."""
+        return {'tipo': self.tipo, 'min': self.min, 'descripcion': self.descripcion}
+
+
+@dataclass(slots=True)
+class Session:
+    """One training session of a plan week."""
+
+    dia: str
+    intensidad: str
+    duracion_min: int
+    rpe: int
+    bloques: Tuple[Block, ...]
+
+    @property
+    def carga_sesion(self):
+        """Session load: RPE x duration in minutes."""
+        return self.rpe * self.duracion_min
+
+    def to_dict(self):
+        """Serialize to the API's session shape (with the RPE and load indicators)."""
+        return {
+            'dia': self.dia,
+            'intensidad': self.intensidad,
+            'duracion_min': self.duracion_min,
+            'bloques': [b.to_dict() for b in self.bloques],
+            'indicadores': {'RPE': self.rpe, 'carga_sesion': self.rpe * self.duracion_min},
+        }
+
+    @classmethod
+    def from_dict(cls, s: dict):
+        """Inverse of `to_dict`; blocks keep only their description text."""
+        return cls(
+            dia=s['dia'],
+            intensidad=s['intensidad'],
+            duracion_min=s['duracion_min'],
+            rpe=s['indicadores']['RPE'],
+            bloques=tuple(Block(b['tipo'], b['min'], texto=b['descripcion']) for b in s['bloques']),
+        )
+
+
+@dataclass(slots=True)
+class WeekPlan:
+    """The sessions of one plan week."""
+
+    sessions: List[Session] = field(default_factory=list)
+
+    def __iter__(self):
+        """Iterate over the week's sessions."""
+        return iter(self.sessions)
+
+    def __len__(self):
+        """Number of sessions in the week."""
+        return len(self.sessions)
+
+    @property
+    def carga(self):
+        """Week load: the sum of the sessions' `carga_sesion`."""
+        return sum(s.rpe * s.duracion_min for s in self.sessions)
+
+
+@dataclass(slots=True)
+class Plan:
+    """A generated mesocycle."""
+
+    semanas: int
+    weeks: List[WeekPlan]
+
+    def to_dict(self):
+        """Serialize to the API's JSON shape."""
+        return {'semanas': self.semanas, 'weeks': [[s.to_dict() for s in week.sessions] for week in self.weeks]}
+
+    @classmethod
+    def from_dict(cls, plan: dict):
+        """Inverse of `to_dict` (see `Session.from_dict`)."""
+        return cls(plan['semanas'], [WeekPlan([Session.from_dict(s) for s in week]) for week in plan['weeks']])
+
+    def pack(self):
+        """Return the plan as nested tuples with each drill reduced to its id.
+
+        Pickling this is several times cheaper than pickling the dataclasses
+        (each `Drill` would be copied in full, and pickle's memo does not
+        merge equal blocks); `unpack` rebuilds the plan.
+        """
+        # A plan repeats a handful of distinct blocks over and over: emit
+        # each one once so pickle writes the repeats as memo references
+        seen = {}
+
+        def block(b):
+            key = (b.tipo, b.min, tuple([d.id for d in b.drills]), b.texto)
+            return seen.setdefault(key, key)
+
+        weeks = tuple(
+            tuple((s.dia, s.intensidad, s.duracion_min, s.rpe, tuple(map(block, s.bloques))) for s in week.sessions)
+            for week in self.weeks
+        )
+        return self.semanas, weeks
+
+    @classmethod
+    def unpack(cls, packed, drill, blocks=None):
+        """Inverse of `pack`; `drill` maps a drill id to the shared `Drill`
+        (e.g. `DrillIndex.drill`).
+
+        Equal blocks become one shared (read-only) `Block`; pass the same
+        `blocks` dict to share them across several plans.
+        """
+        if blocks is None:
+            blocks = {}
+        plan_weeks = []
+        semanas, weeks = packed
+        for week in weeks:
+            out = []
+            for dia, intensidad, duracion_min, rpe, bloques in week:
+                row = []
+                for k in bloques:
+                    block = blocks.get(k)
+                    if block is None:
+                        tipo, mins, ids, texto = k
+                        block = blocks[k] = Block(tipo, mins, tuple(map(drill, ids)), texto)
+                    row.append(block)
+                out.append(Session(dia, intensidad, duracion_min, rpe, tuple(row)))
+            plan_weeks.append(WeekPlan(out))
+        return cls(semanas, plan_weeks)
+
+
+def as_plan(plan):
+    """Return `plan` as a `Plan` (accepts the dict shape too)."""
+    return plan if isinstance(plan, Plan) else Plan.from_dict(plan)
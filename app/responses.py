@@ -0,0 +1,41 @@
+"""JSON serialization for API responses.
+
+`dumps` encodes with orjson when it is installed (several times faster on
+large nested plans) and falls back to the standard library otherwise; both
+produce compact UTF-8 JSON. `FastJSONResponse` is the app's default
+response class and is used by every JSON endpoint.
+
+Pre-serialized bodies (e.g. the session list stored with each plan, see
+`persistence.plan_body`) are returned with `Response(body,
+media_type='application/json')` so they are not decoded and re-encoded.
+"""
+
+import json
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+
+def loads(data):
+    """Parse JSON bytes or text."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj) -> bytes:
+    """Serialize `obj` to compact UTF-8 JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, allow_nan=False, separators=(',', ':')).encode('utf-8')
+
+
+class FastJSONResponse(JSONResponse):
+    """`JSONResponse` rendered with `dumps`."""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
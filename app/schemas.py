@@ -13,15 +13,37 @@ class PlanRequest(BaseModel):
 
     - `nivel` must be one of: principiante, intermedio, avanzado
     - `disponibilidad` is a list of day codes accepted by the planner
+    - `semanas` is the mesocycle length in weeks (1..52)
+    - `acwr_min` / `acwr_max` optionally bound each week's acute:chronic
+      workload ratio (typical range 0.8..1.3)
+    - `user_id` optionally files the plan under an athlete's history
+      (GET /api/users/{id}/plans); it does not affect the generated plan
     """
     nivel: str = Field(..., regex='^(principiante|intermedio|avanzado)$')
-    semanas: Optional[int] = 4
+    semanas: int = Field(4, ge=1, le=52)
     disponibilidad: List[str]
     duracion_sesion_min: int
     objetivos: List[str]
     equipamiento: List[str]
     preferencias: Optional[dict] = None
     historial_carga: Optional[List[dict]] = None
+    acwr_min: Optional[float] = Field(None, gt=0)
+    acwr_max: Optional[float] = Field(None, gt=0)
+    user_id: Optional[int] = Field(None, ge=1)
+
+    def planner_kwargs(self):
+        """Return the keyword arguments for `planner.engine.build_plan`."""
+        return {
+            'disponibilidad': self.disponibilidad,
+            'duracion_sesion_min': self.duracion_sesion_min,
+            'nivel': self.nivel,
+            'objetivos': self.objetivos,
+            'equipamiento': self.equipamiento,
+            'historial_carga': self.historial_carga,
+            'semanas': self.semanas,
+            'acwr_min': self.acwr_min,
+            'acwr_max': self.acwr_max,
+        }
 
 
 class PlanResponse(BaseModel):
@@ -29,9 +51,22 @@ class PlanResponse(BaseModel):
     resumen: Any
 
 
+# Valid ranges of a week's feedback: compliance in percent, perceived
+# effort on the 1-10 RPE scale
+CUMPLIMIENTO_MIN, CUMPLIMIENTO_MAX = 0, 100
+RPE_MIN, RPE_MAX = 1, 10
+
+
 class FeedbackIn(BaseModel):
+    """Feedback about one week of a plan.
+
+    Feedback adapts the following week of the stored plan and feeds the
+    analytics averages, so values outside the scales are rejected (422).
+    Whether `plan_id` exists and `week_idx` is within the plan is checked
+    by the endpoints.
+    """
     plan_id: int
-    week_idx: int
-    cumplimiento_pct: int
-    rpe_promedio: int
+    week_idx: int = Field(..., ge=0)
+    cumplimiento_pct: int = Field(..., ge=CUMPLIMIENTO_MIN, le=CUMPLIMIENTO_MAX)
+    rpe_promedio: int = Field(..., ge=RPE_MIN, le=RPE_MAX)
     notas: Optional[str] = None
@@ -0,0 +1,92 @@
+"""Application startup: database preparation and the FastAPI lifespan.
+
+Importing `app.main` touches neither the database nor the optional heavy
+dependencies (ReportLab is imported by the PDF workers on the first export,
+NumPy only for large batches, PyYAML only when there is no precompiled
+drill library snapshot). What used to run at import time runs here:
+
+- `prepare_database()` creates missing tables, columns and indexes
+  (`models.create_schema`) and backfills the analytics summary tables; it
+  runs at most once per process and database
+- `lifespan(app)` prepares the database on startup unless
+  DB_AUTO_MIGRATE=0, loads the drill library (from DRILLS_SNAPSHOT when
+  set, see `planner.library`) so the first request does not pay for it and
+  starts the task worker (and the feedback write-behind flusher when
+  FEEDBACK_WRITE_BEHIND=1); on shutdown it flushes buffered feedback, stops
+  the worker, closes pooled async connections (aiosqlite keeps one thread
+  per connection) and the PDF worker pool
+
+With DB_AUTO_MIGRATE=0 run the schema step once per deploy instead:
+
+    python -m app.startup migrate
+"""
+
+import contextlib
+import logging
+import os
+import sys
+import time
+
+from . import analytics, feedback, jobs, models
+from .db import async_engine, engine
+from .pdf import PDF_JOBS
+from .planner.library import DRILL_LIBRARY
+
+logger = logging.getLogger(__name__)
+
+DB_AUTO_MIGRATE = os.getenv('DB_AUTO_MIGRATE', '1') != '0'
+
+_prepared = set()
+
+
+def prepare_database(bind=engine):
+    """Create missing schema objects and backfill analytics (once per database)."""
+    key = str(bind.url)
+    if key in _prepared:
+        return
+    models.create_schema(bind)
+    analytics.backfill(bind)
+    _prepared.add(key)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    """FastAPI lifespan: prepare the app on startup, release it on shutdown.
+
+    See the module docstring for the steps; DB_AUTO_MIGRATE=0 skips the
+    schema step.
+    """
+    start = time.perf_counter()
+    if DB_AUTO_MIGRATE:
+        prepare_database()
+    DRILL_LIBRARY.current()
+    if jobs.JOBS_WORKER:
+        jobs.TASK_WORKER.start()
+    if feedback.FEEDBACK_WRITE_BEHIND:
+        feedback.FEEDBACK_BUFFER.start()
+    logger.info('startup finished in %.0f ms', (time.perf_counter() - start) * 1000)
+    try:
+        yield
+    finally:
+        # flush buffered feedback first: its tasks are committed with it
+        feedback.FEEDBACK_BUFFER.stop()
+        jobs.TASK_WORKER.stop()
+        await async_engine.dispose()
+        PDF_JOBS.shutdown()
+
+
+def main(argv=None):
+    """Command-line entry point; `migrate` prepares the database and exits.
+
+    Returns the process exit status (2 for a usage error).
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    if argv != ['migrate']:
+        print('usage: python -m app.startup migrate', file=sys.stderr)
+        return 2
+    prepare_database()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
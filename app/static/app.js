@@ -1,6 +1,26 @@
-async function postPlan(payload){
-  const res = await fetch('/api/plan', {method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify(payload)});
-  return res.json();
+// POST /api/plan/stream answers NDJSON: one line per week as soon as it is
+// built, then {plan_id} (or {error}). onLine is called for every line.
+async function streamPlan(payload, onLine){
+  const res = await fetch('/api/plan/stream', {method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify(payload)});
+  if(!res.ok) throw new Error(`HTTP ${res.status}`);
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let pending = '';
+  while(true){
+    const {done, value} = await reader.read();
+    pending += decoder.decode(value || new Uint8Array(), {stream: !done});
+    const lines = pending.split('\n');
+    pending = lines.pop();
+    lines.filter(Boolean).forEach(l=> onLine(JSON.parse(l)));
+    if(done) break;
+  }
+  if(pending.trim()) onLine(JSON.parse(pending));
+}
+
+function createWeekTitle(week){
+  const title = document.createElement('h4'); title.className='week-title';
+  title.innerText = `Semana ${week.week_idx + 1} de ${week.semanas}`;
+  return title;
 }
 
 function createSessionCard(s){
@@ -37,11 +57,22 @@ document.addEventListener('DOMContentLoaded', ()=>{
       objetivos: data.get('objetivos').split(',').map(s=>s.trim()).filter(Boolean),
       equipamiento: data.get('equipamiento').split(',').map(s=>s.trim()).filter(Boolean)
     };
-    const json = await postPlan(payload);
-    lastPlanId = json.plan_id;
+    lastPlanId = null;
     grid.innerHTML = '';
-    if(json.plan && json.plan.weeks){
-      json.plan.weeks[0].forEach(s=> grid.appendChild(createSessionCard(s)));
+    // render each week's session cards as soon as its line arrives
+    try{
+      await streamPlan(payload, line=>{
+        if(line.sessions){
+          grid.appendChild(createWeekTitle(line));
+          line.sessions.forEach(s=> grid.appendChild(createSessionCard(s)));
+        } else if(line.plan_id){
+          lastPlanId = line.plan_id;
+        } else if(line.error){
+          alert(`No se pudo guardar el plan: ${line.error}`);
+        }
+      });
+    } catch(err){
+      alert(`No se pudo generar el plan: ${err.message}`);
     }
     // expose lastPlanId on export buttons
     document.getElementById('exportCsv').onclick = ()=>{ if(!lastPlanId) return alert('Genera un plan primero'); window.open(`/export/csv?plan_id=${lastPlanId}`,'_blank') };
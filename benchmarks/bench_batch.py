@@ -0,0 +1,68 @@
+"""Benchmark: N single POST /api/plan calls vs one POST /api/plans/batch.
+
+Autor: equipo BaloncestIA — 2026-10-17
+Runs the FastAPI app in-process through TestClient against a throwaway
+SQLite file and reports plans/second for team-sized (15, 40) and
+club-sized (200, 1000) batches. Each request varies the availability so
+the batch path cannot simply deduplicate everything.
+
+Usage (from the repo root):
+
+    python -m benchmarks.bench_batch
+"""
+
+import itertools
+import os
+import tempfile
+import time
+
+DAYS = ['lun', 'mar', 'mie', 'jue', 'vie', 'sab']
+
+
+def make_payloads(n):
+    """Return `n` plan requests cycling through levels and day sets."""
+    combos = itertools.cycle(
+        itertools.product(['principiante', 'intermedio', 'avanzado'], [3, 4, 5, 6], [60, 90])
+    )
+    payloads = []
+    for i, (nivel, dias, duracion) in zip(range(n), combos):
+        payloads.append(
+            {
+                'nivel': nivel,
+                'semanas': 4,
+                'disponibilidad': DAYS[:dias],
+                'duracion_sesion_min': duracion,
+                'objetivos': ['mejorar tiro'] if i % 2 else ['defensa'],
+                'equipamiento': ['balon', 'conos'],
+            }
+        )
+    return payloads
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        from fastapi.testclient import TestClient
+        from app.main import app
+        from app.startup import prepare_database
+
+        prepare_database()
+        client = TestClient(app)
+        print(f"{'plans':>6} {'single p/s':>11} {'batch p/s':>10} {'speedup':>8}")
+        for n in (15, 40, 200, 1000):
+            payloads = make_payloads(n)
+
+            start = time.perf_counter()
+            for p in payloads:
+                client.post('/api/plan', json=p).raise_for_status()
+            single = n / (time.perf_counter() - start)
+
+            start = time.perf_counter()
+            client.post('/api/plans/batch', json=payloads).raise_for_status()
+            batch = n / (time.perf_counter() - start)
+
+            print(f'{n:>6} {single:>11.1f} {batch:>10.1f} {batch / single:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
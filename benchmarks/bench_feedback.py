@@ -0,0 +1,64 @@
+"""Benchmark: feedback writes per second, one commit per row vs bulk.
+
+Autor: equipo BaloncestIA — 2026-10-17
+Runs the FastAPI app in-process through TestClient against a throwaway
+SQLite file and stores bursts of N feedback rows spread over 20 plans:
+
+- single: N POST /api/feedback calls, one transaction each
+- write-behind: the same calls with the write-behind buffer on
+  (FEEDBACK_WRITE_BEHIND), timed until the final flush has committed
+- batch: one POST /api/feedback/batch
+
+Usage (from the repo root):
+
+    python -m benchmarks.bench_feedback
+"""
+
+import os
+import tempfile
+import time
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        os.environ['JOBS_WORKER'] = '0'
+        from fastapi.testclient import TestClient
+        from app import feedback
+        from app.main import app
+        from app.startup import prepare_database
+
+        prepare_database()
+        client = TestClient(app)
+        plan = {'nivel': 'intermedio', 'semanas': 4, 'disponibilidad': ['lun', 'mie', 'vie'],
+                'duracion_sesion_min': 60, 'objetivos': [], 'equipamiento': ['balon']}
+        plan_ids = client.post('/api/plans/batch', json=[plan] * 20).json()['plan_ids']
+
+        print(f"{'rows':>6} {'single r/s':>11} {'buffered r/s':>13} {'batch r/s':>10}")
+        for n in (100, 1000, 5000):
+            rows = [{'plan_id': plan_ids[i % 20], 'week_idx': i % 4, 'cumplimiento_pct': 80, 'rpe_promedio': 6}
+                    for i in range(n)]
+
+            start = time.perf_counter()
+            for r in rows:
+                client.post('/api/feedback', json=r).raise_for_status()
+            single = n / (time.perf_counter() - start)
+
+            feedback.FEEDBACK_WRITE_BEHIND = True
+            feedback.FEEDBACK_BUFFER.start()
+            start = time.perf_counter()
+            for r in rows:
+                client.post('/api/feedback', json=r).raise_for_status()
+            feedback.FEEDBACK_BUFFER.stop()
+            buffered = n / (time.perf_counter() - start)
+            feedback.FEEDBACK_WRITE_BEHIND = False
+
+            start = time.perf_counter()
+            client.post('/api/feedback/batch', json=rows).raise_for_status()
+            batch = n / (time.perf_counter() - start)
+
+            print(f'{n:>6} {single:>11.1f} {buffered:>13.1f} {batch:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
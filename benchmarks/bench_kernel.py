@@ -0,0 +1,68 @@
+"""Benchmark: season-start generation for a whole league.
+
+Autor: equipo BaloncestIA — 2026-10-17
+Compares the scalar week-template path (`engine.build_week_template`, one
+request at a time) with the NumPy kernel (`kernel.batch_templates`) for
+thousands of players, then times `batch.generate_plans` end to end for the
+same league with a fresh cache. NumPy is no longer in requirements.txt;
+without it only the scalar side of the comparison runs.
+
+Usage (from the repo root):
+
+    python -m benchmarks.bench_kernel [players]
+"""
+
+import random
+import sys
+import time
+
+from app.planner import batch, kernel
+from app.planner.cache import PlanCache
+from app.planner.engine import build_week_template
+
+DIAS = ['lun', 'mar', 'mie', 'jue', 'vie', 'sab']
+OBJETIVOS = ['mejorar tiro', 'manejo de balon', 'resistencia', 'defensa', 'aceleracion']
+EQUIPOS = [['balon'], ['balon', 'conos'], ['balon', 'conos', 'bandas'], []]
+
+
+def league(n, seed=1):
+    rng = random.Random(seed)
+    return [
+        {
+            'disponibilidad': rng.sample(DIAS, rng.randint(3, 6)),
+            'duracion_sesion_min': rng.choice([45, 60, 75, 90, 120]),
+            'nivel': rng.choice(['principiante', 'intermedio', 'avanzado']),
+            'objetivos': rng.sample(OBJETIVOS, rng.randint(0, 3)),
+            'equipamiento': rng.choice(EQUIPOS),
+            'semanas': 4,
+        }
+        for _ in range(n)
+    ]
+
+
+def main():
+    players = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    requests = league(players)
+    start = time.perf_counter()
+    for r in requests:
+        build_week_template(r['disponibilidad'], r['duracion_sesion_min'], r['nivel'], r['objetivos'])
+    scalar = time.perf_counter() - start
+    if kernel.available():
+        start = time.perf_counter()
+        kernel.batch_templates(requests)
+        bulk = time.perf_counter() - start
+        start = time.perf_counter()
+        kernel.batch_block_minutes(requests)
+        minutes = time.perf_counter() - start
+        print(f'{players} players: templates scalar {scalar * 1000:.0f} ms, kernel {bulk * 1000:.0f} ms (block minutes only {minutes * 1000:.1f} ms)')
+    else:
+        print(f'{players} players: templates scalar {scalar * 1000:.0f} ms (NumPy not installed, kernel skipped)')
+
+    start = time.perf_counter()
+    plans = batch.generate_plans(requests, cache=PlanCache(max_entries=0))
+    elapsed = time.perf_counter() - start
+    print(f'generate_plans: {len(plans)} plans x 4 weeks in {elapsed:.2f}s ({len(plans) / elapsed:.0f} plans/s)')
+
+
+if __name__ == '__main__':
+    main()
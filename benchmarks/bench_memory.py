@@ -0,0 +1,97 @@
+"""Benchmark: memory footprint of generated plans kept alive.
+
+Autor: equipo BaloncestIA — 2026-10-17
+Generates the same requests as compact `types.Plan` objects
+(`generate_plan`, what the plan cache and batch results hold) and as the
+API's nested dicts (`build_plan`), keeps them all alive and reports the
+bytes allocated per plan, measured with `tracemalloc`. The drill library
+is loaded before measuring, so only the plans themselves are counted.
+
+Batch workers ship their plans to the parent process, so the compact form
+also has an IPC cost: the benchmark times the pickle round trip of the
+same plans as dataclasses and in the `Plan.pack` form `batch` sends
+(including `Plan.unpack` against the library).
+
+Usage (from the repo root):
+
+    python -m benchmarks.bench_memory [--plans 2000]
+"""
+
+import argparse
+import gc
+import itertools
+import pickle
+import time
+import tracemalloc
+
+from app.planner.engine import generate_plan
+from app.planner.library import DRILL_LIBRARY
+from app.planner.types import Plan
+
+DAYS = ['lun', 'mar', 'mie', 'jue', 'vie', 'sab']
+LEVELS = ['principiante', 'intermedio', 'avanzado']
+
+
+def requests(n):
+    """Return `n` varied `generate_plan` kwargs (3-6 days, 4-12 weeks)."""
+    grid = itertools.cycle(itertools.product(range(3, 7), (60, 90), LEVELS, (4, 8, 12)))
+    return [
+        {'disponibilidad': DAYS[:dias], 'duracion_sesion_min': dur, 'nivel': nivel, 'objetivos': ['mejorar tiro'],
+         'equipamiento': ['balon', 'conos'], 'semanas': semanas, 'seed': i}
+        for i, (dias, dur, nivel, semanas) in zip(range(n), grid)
+    ]
+
+
+def footprint(build, reqs):
+    """Return the bytes still allocated after building every request."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    plans = [build(r) for r in reqs]
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del plans
+    return after - before
+
+
+def round_trip(dump, load, plans):
+    """Return (pickle seconds, unpickle seconds, bytes) for `plans`."""
+    start = time.perf_counter()
+    data = [pickle.dumps(dump(p), pickle.HIGHEST_PROTOCOL) for p in plans]
+    dumped = time.perf_counter()
+    for blob in data:
+        load(pickle.loads(blob))
+    return dumped - start, time.perf_counter() - dumped, sum(map(len, data))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--plans', type=int, default=2000)
+    args = parser.parse_args()
+
+    DRILL_LIBRARY.current()
+    reqs = requests(args.plans)
+    generate_plan(**reqs[0])  # warm the drill pools and fill tables
+    compact = footprint(lambda r: generate_plan(**r), reqs)
+    nested = footprint(lambda r: generate_plan(**r).to_dict(), reqs)
+    print(f'{args.plans} plans kept alive')
+    print(f'dicts (build_plan):      {nested / args.plans / 1024:8.1f} KiB per plan')
+    print(f'compact (generate_plan): {compact / args.plans / 1024:8.1f} KiB per plan ({1 - compact / nested:.0%} less)')
+
+    # One pickle per plan, like the process pool's result queue
+    plans = [generate_plan(**r) for r in reqs]
+    index = DRILL_LIBRARY.current().index
+    blocks = {}  # shared across the batch, as in `batch._map_in_pool`
+    print('pickle round trip (batch worker -> parent):')
+    for label, dump, load in (
+        ('dicts', Plan.to_dict, lambda d: d),
+        ('dataclasses', lambda p: p, lambda p: p),
+        ('packed', Plan.pack, lambda t: Plan.unpack(t, index.drill, blocks)),
+    ):
+        dumps, loads, size = round_trip(dump, load, plans)
+        print(f'{label:>12}: pickle {dumps:.2f}s, unpickle {loads:.2f}s, {size / args.plans / 1024:.1f} KiB per plan')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""Benchmark: PDF export cost for multi-week plans.
+
+Autor: equipo BaloncestIA — 2026-10-17
+For 1-52 week, 6-day plans reports the time to render a PDF, to serve it
+from the on-disk cache, and the time to render a whole team (20 plans)
+sequentially vs through the `PdfJobs` process pool.
+
+Usage (from the repo root):
+
+    python -m benchmarks.bench_pdf
+"""
+
+import tempfile
+import time
+from pathlib import Path
+
+from app.pdf import PdfJobs, render_pdf, render_to_file
+from app.planner.engine import build_plan
+
+DAYS = ['lun', 'mar', 'mie', 'jue', 'vie', 'sab']
+
+
+def make_doc(plan_id, semanas):
+    """Build a plan document shaped like `app.persistence.plan_export` output."""
+    plan = build_plan(DAYS, 90, 'intermedio', ['mejorar tiro'], ['balon', 'conos', 'bandas'], semanas=semanas)
+    sessions = []
+    for week_idx, week in enumerate(plan['weeks']):
+        for s in week:
+            sessions.append(
+                {
+                    'week_idx': week_idx,
+                    'dia': s['dia'],
+                    'intensidad': s['intensidad'],
+                    'duracion_min': s['duracion_min'],
+                    'rpe': s['indicadores']['RPE'],
+                    'bloques': s['bloques'],
+                }
+            )
+    return {'id': plan_id, 'revision': 1, 'nivel': 'intermedio', 'sessions': sessions}
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'semanas':>7} {'render ms':>10} {'cached ms':>10}")
+        for semanas in (1, 4, 12, 52):
+            doc = make_doc(semanas, semanas)
+            start = time.perf_counter()
+            path = render_to_file(doc, Path(tmp) / f'plan_{semanas}_r1.pdf')
+            render_ms = (time.perf_counter() - start) * 1000
+            start = time.perf_counter()
+            Path(path).read_bytes()
+            cached_ms = (time.perf_counter() - start) * 1000
+            print(f'{semanas:>7} {render_ms:>10.1f} {cached_ms:>10.2f}')
+
+        team = [make_doc(100 + i, 12) for i in range(20)]
+        start = time.perf_counter()
+        for doc in team:
+            render_pdf(doc)
+        sequential = time.perf_counter() - start
+
+        jobs = PdfJobs(cache_dir=tmp)
+        start = time.perf_counter()
+        futures = [jobs.submit(doc['id'], 1, doc)[1] for doc in team]
+        for future in futures:
+            future.result()
+        pooled = time.perf_counter() - start
+        jobs.shutdown()
+        print(f'team of 20 x 12 weeks: sequential {sequential:.2f}s, pool ({jobs.workers} workers) {pooled:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
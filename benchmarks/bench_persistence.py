@@ -0,0 +1,104 @@
+"""Benchmark: plans/second persisted by POST /api/plan's storage layer.
+
+Autor: equipo BaloncestIA — 2026-10-17
+Compares the legacy writer (commit + refresh per Session) with
+`app.persistence.save_plan` (one transaction, bulk INSERT ... RETURNING)
+for 3-6 day, 1-12 week plans on a throwaway SQLite file.
+
+Usage (from the repo root):
+
+    python -m benchmarks.bench_persistence [--seconds 1.0]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import models
+from app.persistence import plan_row, save_plan
+from app.planner.engine import build_plan
+from app.schemas import PlanRequest
+
+DAYS = ['lun', 'mar', 'mie', 'jue', 'vie', 'sab']
+
+
+def legacy_save_plan(db, plan_req, plan):
+    """Reference copy of the original per-session commit/refresh writer."""
+    p = models.Plan(**plan_row(plan_req))
+    db.add(p)
+    db.commit()
+    db.refresh(p)
+    for week_idx, week in enumerate(plan['weeks']):
+        for s in week:
+            sess = models.Session(
+                plan_id=p.id,
+                week_idx=week_idx,
+                day_name=s['dia'],
+                intensidad=s['intensidad'],
+                duracion_min=s['duracion_min'],
+                rpe=s['indicadores']['RPE'],
+                carga=s['indicadores']['carga_sesion'],
+            )
+            db.add(sess)
+            db.commit()
+            db.refresh(sess)
+            for b in s['bloques']:
+                db.add(models.Block(session_id=sess.id, tipo=b['tipo'], min=b['min'], descripcion=b['descripcion']))
+            db.commit()
+    return p.id
+
+
+def make_case(dias, semanas):
+    """Build a request and its generated `semanas`-week plan."""
+    req = PlanRequest(
+        nivel='intermedio',
+        semanas=semanas,
+        disponibilidad=DAYS[:dias],
+        duracion_sesion_min=90,
+        objetivos=['mejorar tiro'],
+        equipamiento=['balon', 'conos', 'bandas'],
+    )
+    plan = build_plan(req.disponibilidad, req.duracion_sesion_min, req.nivel, req.objetivos, req.equipamiento, semanas=semanas)
+    return req, plan
+
+
+def plans_per_second(writer, factory, req, plan, seconds):
+    """Run `writer` repeatedly for roughly `seconds` and return plans/second."""
+    db = factory()
+    try:
+        n = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < seconds:
+            writer(db, req, plan)
+            n += 1
+        return n / (time.perf_counter() - start)
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=1.0, help='time budget per case and writer')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        models.Base.metadata.create_all(bind=engine)
+        factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+        print(f"{'dias':>4} {'semanas':>7} {'legacy p/s':>11} {'bulk p/s':>9} {'speedup':>8}")
+        for dias in (3, 4, 5, 6):
+            for semanas in (1, 4, 12):
+                req, plan = make_case(dias, semanas)
+                legacy = plans_per_second(legacy_save_plan, factory, req, plan, args.seconds)
+                bulk = plans_per_second(save_plan, factory, req, plan, args.seconds)
+                print(f'{dias:>4} {semanas:>7} {legacy:>11.1f} {bulk:>9.1f} {bulk / legacy:>7.1f}x')
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
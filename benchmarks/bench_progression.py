@@ -0,0 +1,40 @@
+"""Benchmark: load capping for long mesocycles.
+
+Autor: equipo BaloncestIA — 2026-10-17
+Times `progression.allocate_rpe` on random capped weeks and `build_plan`
+for 52-week plans with a long `historial_carga`, with and without ACWR
+bounds.
+
+Usage (from the repo root):
+
+    python -m benchmarks.bench_progression
+"""
+
+import random
+import timeit
+
+from app.planner.engine import build_plan
+from app.planner.progression import allocate_rpe, week_load
+
+DAYS = ['lun', 'mar', 'mie', 'jue', 'vie', 'sab']
+
+
+def main():
+    rng = random.Random(1)
+    weeks = []
+    for _ in range(10_000):
+        rpes = [rng.randint(3, 9) for _ in range(rng.randint(3, 7))]
+        durations = [90] * len(rpes)
+        weeks.append((rpes, durations, week_load(rpes, durations) * rng.uniform(0.4, 0.95)))
+    best = min(timeit.repeat(lambda: [allocate_rpe(r, d, cap=c) for r, d, c in weeks], number=1, repeat=3))
+    print(f'allocate_rpe: {best / len(weeks) * 1e6:.1f} us per capped week')
+
+    hist = [{'semana': s, 'carga_total': 2400 + 10 * (s % 7)} for s in range(520)]
+    args = (DAYS, 90, 'avanzado', ['mejorar tiro'], ['balon', 'conos'])
+    for label, extra in (('cap only', {}), ('acwr 0.8-1.3', {'acwr_min': 0.8, 'acwr_max': 1.3})):
+        best = min(timeit.repeat(lambda: build_plan(*args, historial_carga=hist, semanas=52, **extra), number=1, repeat=5))
+        print(f'build_plan 52 weeks, 520-week history, {label}: {best * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
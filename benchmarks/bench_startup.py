@@ -0,0 +1,85 @@
+"""Benchmark: import time and cold start of the API process.
+
+Autor: equipo BaloncestIA — 2026-10-17
+Each measurement runs in a fresh interpreter, as a Cloud Run instance or a
+test process would:
+
+- `import`: `import app.main` (no database access, no ReportLab/NumPy/YAML)
+- `cold_start[fresh_db]`: import, lifespan startup (schema creation,
+  analytics backfill, drill library) and a first `POST /api/plan` against
+  an empty SQLite file
+- `cold_start[existing_db]`: the same against a database that already has
+  the schema
+
+The median of `--runs` runs is compared with a budget per measurement; the
+script exits with status 1 when any median is over budget, so it can run
+in CI next to the suite.
+
+Usage (from the repo root):
+
+    python -m benchmarks.bench_startup [--runs 5] [--import-budget-ms 750] [--cold-budget-ms 1200]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+IMPORT_SNIPPET = """
+import time
+start = time.perf_counter()
+import app.main
+print((time.perf_counter() - start) * 1000)
+"""
+
+COLD_START_SNIPPET = """
+import time
+start = time.perf_counter()
+from fastapi.testclient import TestClient
+from app.main import app
+payload = {'nivel': 'intermedio', 'semanas': 4, 'disponibilidad': ['lun', 'mar', 'jue'],
+           'duracion_sesion_min': 60, 'objetivos': ['mejorar tiro'], 'equipamiento': ['balon']}
+with TestClient(app) as client:
+    client.post('/api/plan', json=payload).raise_for_status()
+    print((time.perf_counter() - start) * 1000)
+"""
+
+
+def measure(snippet, env):
+    """Run `snippet` in a new interpreter and return the milliseconds it prints."""
+    out = subprocess.run([sys.executable, '-c', snippet], env=env, capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--import-budget-ms', type=float, default=750)
+    parser.add_argument('--cold-budget-ms', type=float, default=1200)
+    args = parser.parse_args()
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    over = []
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, PYTHONPATH=root, JOBS_WORKER='0', PDF_CACHE_DIR=os.path.join(tmp, 'pdf'))
+        existing = os.path.join(tmp, 'existing.db')
+        subprocess.run([sys.executable, '-m', 'app.startup', 'migrate'], cwd=root, check=True,
+                       env=dict(env, DATABASE_URL=f'sqlite:///{existing}'))
+
+        cases = [('import', IMPORT_SNIPPET, lambda i: f'sqlite:///{os.path.join(tmp, f"import{i}.db")}', args.import_budget_ms),
+                 ('cold_start[fresh_db]', COLD_START_SNIPPET, lambda i: f'sqlite:///{os.path.join(tmp, f"fresh{i}.db")}', args.cold_budget_ms),
+                 ('cold_start[existing_db]', COLD_START_SNIPPET, lambda i: f'sqlite:///{existing}', args.cold_budget_ms)]
+        for name, snippet, url, budget in cases:
+            times = [measure(snippet, dict(env, DATABASE_URL=url(i))) for i in range(args.runs)]
+            median = statistics.median(times)
+            status = 'ok' if median <= budget else 'OVER BUDGET'
+            if median > budget:
+                over.append(name)
+            print(f'{name:<25} median {median:8.1f} ms  min {min(times):8.1f} ms  budget {budget:8.0f} ms  {status}')
+    return 1 if over else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,37 @@
+"""Synthetic drill libraries for the benchmarks and the tests.
+
+Autor: equipo BaloncestIA — 2026-10-17
+`synthetic_drills(n)` builds libraries of any size in the `load_drills`
+format (the repo's `data/drills.yml` only has a few dozen drills), e.g. to
+time `DrillIndex` and `pick_drills_for_block` on 10k-50k drills.
+"""
+
+import random
+
+
+# Vocabulary of the synthetic libraries built by `synthetic_drills`
+SYNTHETIC_CATEGORIES = ('calentamiento', 'manejo_balon', 'tiro_movimiento', 'tiro_estatico', 'defensa',
+                        'condicionamiento', 'enfriamiento', 'movilidad', 'fuerza')
+SYNTHETIC_INTENSITIES = ('baja', 'media', 'alta')
+SYNTHETIC_EQUIPMENT = ('balon', 'conos', 'bandas', 'aro', 'escalera', 'vallas', 'chaleco', 'pesas')
+
+
+def synthetic_drills(n, seed=0):
+    """Return `n` synthetic drills in the `load_drills` format.
+
+    Used by the tests and the benchmarks to build large libraries: every
+    category/intensity pair gets the same share of drills, while durations
+    and required equipment (0-3 items) are drawn from `random.Random(seed)`.
+    """
+    rng = random.Random(seed)
+    return [
+        {
+            'id': f'sint_{i}',
+            'categoria': SYNTHETIC_CATEGORIES[i % len(SYNTHETIC_CATEGORIES)],
+            'intensidad': SYNTHETIC_INTENSITIES[(i // len(SYNTHETIC_CATEGORIES)) % len(SYNTHETIC_INTENSITIES)],
+            'min_sugeridos': rng.choice([5, 10, 10, 15, 20]),
+            'equipo_requerido': rng.sample(SYNTHETIC_EQUIPMENT, rng.randint(0, 3)),
+            'descripcion': f'Ejercicio sintético {i}',
+        }
+        for i in range(n)
+    ]
@@ -0,0 +1,116 @@
+"""Load test: request latency under concurrent clients.
+
+Autor: equipo BaloncestIA — 2026-10-17
+Starts the app with uvicorn (single worker, throwaway SQLite file) unless
+`--url` points to a running server, then runs 1..64 concurrent clients
+issuing a mix of POST /api/plan, GET /api/plan/{id} and GET /api/templates.
+Reports throughput and p50/p95/p99 latency per concurrency level. With the
+async database path, p95 should grow roughly with the amount of queued work
+instead of collapsing once the threadpool or event loop is saturated.
+
+Usage (from the repo root):
+
+    python -m benchmarks.load_test [--seconds 5] [--url http://127.0.0.1:8000]
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+DAYS = ['lun', 'mar', 'mie', 'jue', 'vie', 'sab']
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(tmp):
+    """Launch uvicorn in a subprocess and wait until it answers."""
+    port = free_port()
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'load.db')}")
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'app.main:app', '--port', str(port), '--log-level', 'warning'],
+        env=env,
+    )
+    url = f'http://127.0.0.1:{port}'
+    for _ in range(100):
+        try:
+            httpx.get(url + '/api/templates', timeout=0.5)
+            return proc, url
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError('server did not start')
+
+
+async def client_loop(client, worker, deadline, latencies):
+    """One simulated client: create a plan, read it, fetch templates."""
+    i = 0
+    while time.perf_counter() < deadline:
+        payload = {
+            'nivel': 'intermedio',
+            'semanas': 4,
+            'disponibilidad': DAYS[: 3 + (worker + i) % 4],
+            'duracion_sesion_min': 60 + 15 * (i % 3),
+            'objetivos': ['mejorar tiro'],
+            'equipamiento': ['balon', 'conos'],
+        }
+        for method, path, body in (('POST', '/api/plan', payload), ('GET', None, None), ('GET', '/api/templates', None)):
+            start = time.perf_counter()
+            if path is None:
+                r = await client.get(f'/api/plan/{plan_id}')
+            else:
+                r = await client.request(method, path, json=body)
+            r.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+            if method == 'POST':
+                plan_id = r.json()['plan_id']
+        i += 1
+
+
+async def run_level(url, concurrency, seconds):
+    latencies = []
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        deadline = time.perf_counter() + seconds
+        await asyncio.gather(*(client_loop(client, w, deadline, latencies) for w in range(concurrency)))
+    latencies.sort()
+    q = statistics.quantiles(latencies, n=100)
+    return len(latencies) / seconds, q[49] * 1000, q[94] * 1000, q[98] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=5.0, help='duration per concurrency level')
+    parser.add_argument('--url', help='target an already running server instead of starting one')
+    parser.add_argument('--levels', default='1,8,32,64', help='comma-separated client counts')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        proc = None
+        url = args.url
+        if url is None:
+            proc, url = start_server(tmp)
+        try:
+            print(f"{'clients':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+            for level in (int(x) for x in args.levels.split(',')):
+                rps, p50, p95, p99 = asyncio.run(run_level(url, level, args.seconds))
+                print(f'{level:>7} {rps:>8.1f} {p50:>8.1f} {p95:>8.1f} {p99:>8.1f}')
+        finally:
+            if proc is not None:
+                proc.terminate()
+                proc.wait()
+
+
+if __name__ == '__main__':
+    main()
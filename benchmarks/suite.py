@@ -0,0 +1,262 @@
+"""Reproducible benchmark suite for the planner and API hot paths.
+
+Autor: equipo BaloncestIA — 2026-10-17
+Runs a fixed set of cases and writes the timings as JSON so two commits
+can be compared with a regression threshold:
+
+- `allocate_minutes` for every level
+- `pick_drills_for_block` against the bundled library and synthetic
+  libraries of 10k and 50k drills, with and without a week's used drills
+- `build_week_plan` / `build_plan` across day counts, session lengths,
+  levels and library sizes
+- end-to-end `POST /api/plan` (uncached: the request rotates over seeded
+  inputs and the plan cache is cleared before each call; plus a cache-hit
+  variant), `GET /api/plan/{id}`, `GET /export/csv`,
+  the cached `GET /export/pdf` and the first and a deep page of
+  `GET /api/users/{id}/plans` (1000 plans) through `TestClient` against a throwaway
+  SQLite file
+
+Every case is warmed up once, then timed in `--rounds` rounds of enough
+calls to last at least `--min-time` seconds; the per-call min, median,
+mean and standard deviation are reported. Random inputs use fixed seeds.
+
+Usage (from the repo root):
+
+    python -m benchmarks.suite run --output bench.json [--filter plan] [--quick]
+    python -m benchmarks.suite compare base.json bench.json [--threshold 0.10]
+
+`compare` prints the median change per case and exits with status 1 when
+any case shared by both files is slower than the threshold allows.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+DAYS = ['lun', 'mar', 'mie', 'jue', 'vie', 'sab']
+LEVELS = ['principiante', 'intermedio', 'avanzado']
+
+
+def time_case(fn, rounds, min_time):
+    """Return per-call timing stats (seconds) for `fn`."""
+    fn()  # warm-up (imports, memoized pools, first DB connection)
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or number >= 1_000_000:
+            break
+        number *= 2 if elapsed <= 0 else max(2, int(min_time / elapsed * 1.2))
+    samples = [elapsed / number]
+    for _ in range(rounds - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - start) / number)
+    return {
+        'min': min(samples),
+        'median': statistics.median(samples),
+        'mean': statistics.fmean(samples),
+        'stdev': statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        'rounds': rounds,
+        'calls_per_round': number,
+    }
+
+
+def planner_cases(quick):
+    """Return {case name: callable} for the planner cases.
+
+    `quick` shrinks the day/duration grid and skips the 50k library.
+    """
+    from app.planner.drills import DrillIndex, pick_drills_for_block
+    from benchmarks.fixtures import synthetic_drills
+    from app.planner.engine import allocate_minutes, block_percentages, build_plan, build_week_plan
+    from app.planner.library import DRILL_LIBRARY
+
+    libraries = {'repo': DRILL_LIBRARY.current().index, '10k': DrillIndex(synthetic_drills(10_000))}
+    if not quick:
+        libraries['50k'] = DrillIndex(synthetic_drills(50_000))
+
+    cases = {}
+    for nivel in LEVELS:
+        pct = block_percentages(nivel, ['mejorar tiro', 'defensa'])
+        cases[f'allocate_minutes[{nivel}]'] = lambda pct=pct: allocate_minutes(90, pct)
+
+    for name, index in libraries.items():
+        rng = random.Random(1)
+        cases[f'pick_drills_for_block[{name}]'] = lambda index=index, rng=rng: pick_drills_for_block(
+            index, 'tiro_movimiento', 'media', ['balon', 'conos'], 30, rng=rng
+        )
+        # mid-week: the block must avoid the drills already used
+        used = {d['id'] for d in index.filter('tiro_movimiento', 'media', ['balon', 'conos'])[::3]}
+        cases[f'pick_drills_for_block_week[{name}]'] = lambda index=index, rng=rng, used=used: pick_drills_for_block(
+            index, 'tiro_movimiento', 'media', ['balon', 'conos'], 30, rng=rng, exclude=used
+        )
+        # a first lookup for an unseen equipment mask builds the pool
+        cases[f'pick_drills_for_block_cold[{name}]'] = lambda index=index: _cold_pick(index)
+
+    days = (3, 6) if quick else (3, 4, 5, 6)
+    durations = (60,) if quick else (45, 60, 90, 120)
+    for d in days:
+        for dur in durations:
+            for nivel in LEVELS:
+                args = (DAYS[:d], dur, nivel, ['mejorar tiro'], ['balon', 'conos'])
+                cases[f'build_week_plan[{d}d-{dur}m-{nivel}]'] = lambda args=args: build_week_plan(*args)
+    for name, index in libraries.items():
+        args = (DAYS, 90, 'avanzado', ['mejorar tiro', 'defensa'], ['balon', 'conos', 'bandas'])
+        cases[f'build_plan_12w[{name}]'] = lambda args=args, index=index: build_plan(*args, semanas=12, seed=7, drill_index=index)
+    cases['build_plan_52w[repo]'] = lambda: build_plan(DAYS, 90, 'avanzado', ['defensa'], ['balon'], semanas=52, seed=7)
+    return cases
+
+
+def _cold_pick(index):
+    """Time building a drill pool: copy the index without its memo."""
+    from app.planner.drills import pick_drills_for_block
+
+    cold = object.__new__(type(index))
+    cold.__dict__.update(index.__dict__)
+    cold._pools = {}
+    cold._classes = {}
+    return pick_drills_for_block(cold, 'defensa', 'media', ['balon'], 20)
+
+
+def api_cases(tmp):
+    """Return {case name: callable} for the end-to-end API cases.
+
+    Points the app at a SQLite file inside `tmp` (so it must run before
+    anything imports `app.db`) and seeds one plan plus a 1000-plan user
+    history.
+    """
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    os.environ.setdefault('PDF_CACHE_DIR', os.path.join(tmp, 'pdf'))
+    os.environ.setdefault('JOBS_WORKER', '0')
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.planner.cache import PLAN_CACHE
+    from app.startup import prepare_database
+
+    prepare_database()  # the app's lifespan does this; TestClient without `with` skips it
+    client = TestClient(app)
+    payload = {'nivel': 'intermedio', 'semanas': 4, 'disponibilidad': ['lun', 'mar', 'jue', 'sab'],
+               'duracion_sesion_min': 90, 'objetivos': ['mejorar tiro'], 'equipamiento': ['balon', 'conos']}
+    plan_id = client.post('/api/plan', json=payload).json()['plan_id']
+    # a long history: the page after 500 plans must cost the same as the first
+    client.post('/api/plans/batch', json=[dict(payload, semanas=1, user_id=1)] * 1000).raise_for_status()
+    deep = None
+    for _ in range(5):
+        deep = client.get('/api/users/1/plans', params={'limit': 100, **({'cursor': deep} if deep else {})}).json()['next_cursor']
+
+    def check(r):
+        r.raise_for_status()
+        return r
+
+    # Varied requests so `api_post_plan` measures generation, not the cache
+    rng = random.Random(3)
+    varied = itertools.cycle([
+        dict(payload, semanas=rng.randint(2, 12), disponibilidad=sorted(rng.sample(DAYS, rng.randint(3, 6)), key=DAYS.index),
+             objetivos=rng.sample(['mejorar tiro', 'defensa', 'resistencia', 'manejo de balon'], rng.randint(0, 2)))
+        for _ in range(64)
+    ])
+
+    def post_plan_uncached():
+        PLAN_CACHE.clear()
+        return check(client.post('/api/plan', json=next(varied)))
+
+    return {
+        'api_post_plan': post_plan_uncached,
+        'api_post_plan_cached': lambda: check(client.post('/api/plan', json=payload)),
+        'api_get_plan': lambda: check(client.get(f'/api/plan/{plan_id}')),
+        'api_export_csv': lambda: check(client.get(f'/export/csv?plan_id={plan_id}')),
+        'api_export_pdf_cached': lambda: check(client.get(f'/export/pdf?plan_id={plan_id}')),
+        'api_user_plans_first_page': lambda: check(client.get('/api/users/1/plans?cargas=true')),
+        'api_user_plans_deep_page': lambda: check(client.get('/api/users/1/plans', params={'cargas': 'true', 'cursor': deep})),
+    }
+
+
+def git_commit():
+    """Return the short hash of HEAD, or None outside a git checkout."""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    """`run` command: time every selected case and write the JSON report."""
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        cases = planner_cases(args.quick)
+        cases.update(api_cases(tmp))
+        for name, fn in cases.items():
+            if args.filter and args.filter not in name:
+                continue
+            results[name] = time_case(fn, args.rounds, args.min_time)
+            print(f"{name:<45} median {results[name]['median'] * 1e3:>10.4f} ms")
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'quick': args.quick,
+        },
+        'unit': 'seconds per call',
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    return 0
+
+
+def compare(args):
+    """`compare` command: print median changes; 1 if any case regressed."""
+    with open(args.base, encoding='utf-8') as f:
+        base = json.load(f)['results']
+    with open(args.new, encoding='utf-8') as f:
+        new = json.load(f)['results']
+    regressions = []
+    for name in sorted(set(base) & set(new)):
+        change = new[name]['median'] / base[name]['median'] - 1 if base[name]['median'] else 0.0
+        flag = ''
+        if change > args.threshold:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print(f'{name:<45} {base[name]["median"] * 1e3:>10.4f} -> {new[name]["median"] * 1e3:>10.4f} ms {change:>+8.1%}{flag}')
+    for name in sorted(set(base) ^ set(new)):
+        print(f'{name:<45} only in {"base" if name in base else "new"}')
+    print(f'{len(regressions)} regression(s) above {args.threshold:.0%}')
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    """Command-line entry point; returns the process exit status."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_run = sub.add_parser('run', help='run the suite')
+    p_run.add_argument('--output', help='write JSON results here')
+    p_run.add_argument('--filter', help='only cases whose name contains this text')
+    p_run.add_argument('--rounds', type=int, default=5)
+    p_run.add_argument('--min-time', type=float, default=0.05, help='seconds per round')
+    p_run.add_argument('--quick', action='store_true', help='smaller grid, no 50k library')
+    p_cmp = sub.add_parser('compare', help='compare two result files')
+    p_cmp.add_argument('base')
+    p_cmp.add_argument('new')
+    p_cmp.add_argument('--threshold', type=float, default=0.10, help='allowed median slowdown (0.10 = 10%%)')
+    args = parser.parse_args(argv)
+    return run(args) if args.command == 'run' else compare(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
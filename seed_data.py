@@ -1,7 +1,7 @@
 from app.db import SessionLocal, engine
 from app import models
 
-models.Base.metadata.create_all(bind=engine)
+models.create_schema(engine)
 
 if __name__=='__main__':
     db = SessionLocal()
@@ -0,0 +1,23 @@
+import os
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# The suite runs against a throwaway SQLite file, never ./app.db. It has to
+# be set here, at conftest import: `app.db` reads DATABASE_URL when first
+# imported, which happens while the test modules are collected (before any
+# fixture, including a session-scoped `tmp_path_factory` one, runs).
+_BASE_DE_DATOS = tempfile.TemporaryDirectory(prefix='baloncestia-tests-')
+os.environ['DATABASE_URL'] = f"sqlite:///{Path(_BASE_DE_DATOS.name) / 'test.db'}"
+os.environ.pop('ASYNC_DATABASE_URL', None)
+
+
+@pytest.fixture(scope='session', autouse=True)
+def preparar_base_de_datos():
+    """Create the test database schema (the app does it in its lifespan hook,
+    which `TestClient(app)` without a `with` block never runs)."""
+    from app.startup import prepare_database
+    prepare_database()
+    yield
+    _BASE_DE_DATOS.cleanup()
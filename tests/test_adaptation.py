@@ -0,0 +1,36 @@
+from app.planner.adaptation import BLOCK_SHIFT_MIN, adapt_week, decide
+from app.planner.progression import week_load
+
+
+def semana(rpes, duracion=60):
+    return [
+        {'intensidad': 'Alta' if r >= 7 else 'Media', 'rpe': r, 'duracion_min': duracion,
+         'bloques': [{'tipo': 'condicionamiento', 'min': 15}, {'tipo': 'movilidad', 'min': 5}]}
+        for r in rpes
+    ]
+
+
+def test_decision_segun_cumplimiento_y_rpe_percibido():
+    assert decide(50, 5, 5) == 'descarga'
+    assert decide(95, 8, 6) == 'descarga'
+    assert decide(95, 4, 5) == 'progresar'
+    assert decide(80, 5, 5) == 'mantener'
+
+
+def test_adaptar_semana_descarga_progresa_o_mantiene():
+    reportada, siguiente = semana([7, 5, 3]), semana([7, 6, 3])
+    carga = week_load([7, 6, 3], [60] * 3)
+
+    decision, nueva = adapt_week(siguiente, reportada, 50, 6)
+    assert decision == 'descarga'
+    assert week_load([s['rpe'] for s in nueva], [60] * 3) <= carga * 0.9
+    assert nueva[0]['intensidad'] == 'Media'
+    assert [b['min'] for b in nueva[0]['bloques']] == [15 - BLOCK_SHIFT_MIN, 5 + BLOCK_SHIFT_MIN]
+    assert siguiente[0]['rpe'] == 7 and siguiente[0]['bloques'][0]['min'] == 15
+
+    decision, nueva = adapt_week(siguiente, reportada, 100, 4)
+    nueva_carga = week_load([s['rpe'] for s in nueva], [60] * 3)
+    assert decision == 'progresar'
+    assert carga * 1.05 <= nueva_carga <= week_load([7, 5, 3], [60] * 3) * 1.15
+
+    assert adapt_week(siguiente, reportada, 80, 5) == ('mantener', siguiente)
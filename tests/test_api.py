@@ -1,5 +1,17 @@
+import asyncio
+import csv
+import datetime
+import io
+import os
+from contextlib import contextmanager
+
 from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app.db import async_engine
+from app.exports import CSV_HEADER, plan_rows_query, plan_snapshots_query, stream_snapshot_csv
 from app.main import app
+from app.pdf import PDF_JOBS, sweep_cache
 
 client = TestClient(app)
 
@@ -25,3 +37,353 @@ def test_post_plan_and_get():
     r2 = client.get(f'/api/plan/{plan_id}')
     assert r2.status_code==200
     assert 'plan' in r2.json()
+
+def test_post_plans_batch_devuelve_ids_en_orden():
+    base = {"nivel":"intermedio","semanas":2,"disponibilidad":["lun","mie","vie"],
+            "duracion_sesion_min":60,"objetivos":["defensa"],"equipamiento":["balon","conos"]}
+    otro = dict(base, nivel="avanzado", semanas=1)
+    r = client.post('/api/plans/batch', json=[base, otro, base])
+    assert r.status_code==200
+    ids = r.json()['plan_ids']
+    assert len(ids)==3 and len(set(ids))==3
+    niveles = [client.get(f'/api/plan/{i}').json()['plan']['nivel'] for i in ids]
+    assert niveles == ['intermedio','avanzado','intermedio']
+    # semanas may be omitted (4 weeks) but not null
+    sin_semanas = {k: v for k, v in base.items() if k != 'semanas'}
+    plan = client.get(f"/api/plan/{client.post('/api/plan', json=sin_semanas).json()['plan_id']}").json()['plan']
+    assert plan['semanas'] == 4
+    assert client.post('/api/plan', json=dict(base, semanas=None)).status_code==422
+    assert client.post('/api/plan/stream', json=dict(base, semanas=None)).status_code==422
+
+def test_feedback_y_exportaciones():
+    payload = {"nivel":"principiante","semanas":1,"disponibilidad":["lun","jue"],
+               "duracion_sesion_min":45,"objetivos":[],"equipamiento":[]}
+    plan_id = client.post('/api/plan', json=payload).json()['plan_id']
+    r = client.post('/api/feedback', json={"plan_id":plan_id,"week_idx":0,"cumplimiento_pct":80,"rpe_promedio":6})
+    assert r.json()['status']=='ok'
+    csv_r = client.get(f'/export/csv?plan_id={plan_id}')
+    assert csv_r.status_code==200
+    assert csv_r.text.splitlines()[0].startswith('plan_id,week_idx')
+    pdf_r = client.get(f'/export/pdf?plan_id={plan_id}')
+    assert pdf_r.content.startswith(b'%PDF')
+    assert client.get('/export/csv?plan_id=999999').status_code==404
+
+@contextmanager
+def count_queries():
+    """Count SQL statements executed by the app's async engine."""
+    statements = []
+    def before(conn, cursor, statement, params, context, executemany):
+        statements.append(statement)
+    event.listen(async_engine.sync_engine, 'before_cursor_execute', before)
+    try:
+        yield statements
+    finally:
+        event.remove(async_engine.sync_engine, 'before_cursor_execute', before)
+
+def test_lectura_de_plan_usa_consultas_constantes():
+    base = {"nivel":"avanzado","disponibilidad":["lun","mar","mie","jue","vie","sab"],
+            "duracion_sesion_min":90,"objetivos":["defensa"],"equipamiento":["balon"]}
+    counts = []
+    for semanas in (1, 8):
+        plan_id = client.post('/api/plan', json=dict(base, semanas=semanas)).json()['plan_id']
+        for url in (f'/api/plan/{plan_id}', f'/export/csv?plan_id={plan_id}'):
+            with count_queries() as statements:
+                assert client.get(url).status_code==200
+            counts.append(len(statements))
+    assert max(counts) <= 3
+    assert counts[:2] == counts[2:]
+
+def test_exportacion_csv_por_lista_y_rango_en_streaming():
+    base = {"nivel":"intermedio","semanas":2,"disponibilidad":["lun","mie"],
+            "duracion_sesion_min":60,"objetivos":[],"equipamiento":["balon"]}
+    ids = client.post('/api/plans/batch', json=[base, dict(base, nivel="avanzado")]).json()['plan_ids']
+    r = client.get('/export/csv', params={'plan_ids': ','.join(map(str, ids))})
+    rows = r.text.splitlines()[1:]
+    assert r.status_code==200 and rows
+    assert {int(row.split(',')[0]) for row in rows} == set(ids)
+    hoy = datetime.date.today().isoformat()
+    r2 = client.get('/export/csv', params={'plan_ids': ','.join(map(str, ids)), 'desde': '2000-01-01', 'hasta': hoy})
+    assert r2.text.splitlines()[1:] == rows
+    assert client.get('/export/csv', params={'desde': '2999-01-01'}).text.splitlines() == [','.join(CSV_HEADER)]
+    assert client.get('/export/csv').status_code==400
+
+    async def chunks():
+        return [c async for c in stream_snapshot_csv(plan_snapshots_query(plan_ids=ids), chunk_plans=1)]
+    parts = asyncio.run(chunks())
+    assert len(parts) > 1
+    assert b''.join(parts).decode('utf-8').splitlines()[1:] == rows
+
+def test_pdf_por_jobs_y_cache_por_revision(tmp_path, monkeypatch):
+    monkeypatch.setattr(PDF_JOBS, 'cache_dir', tmp_path)
+    payload = {"nivel":"intermedio","semanas":4,"disponibilidad":["lun","mar","jue"],
+               "duracion_sesion_min":60,"objetivos":[],"equipamiento":["balon"]}
+    plan_id = client.post('/api/plan', json=payload).json()['plan_id']
+    r = client.post(f'/export/pdf/jobs?plan_id={plan_id}')
+    assert r.status_code==202
+    job_id = r.json()['job_id']
+    PDF_JOBS.get(job_id)['future'].result(timeout=60)
+    status = client.get(f'/export/pdf/jobs/{job_id}').json()
+    assert status['status']=='done' and status['revision']==1
+    assert client.get(status['download_url']).content.startswith(b'%PDF')
+    assert (tmp_path / f'plan_{plan_id}_r1.pdf').exists()
+
+    # a second request for the same revision reuses the job
+    again = client.post(f'/export/pdf/jobs?plan_id={plan_id}').json()
+    assert again['status']=='done' and again['job_id']==job_id
+    assert client.get(f'/export/pdf?plan_id={plan_id}').content.startswith(b'%PDF')
+    # older revisions stay on disk until the sweep, and only once stale
+    viejo = tmp_path / f'plan_{plan_id}_r0.pdf'
+    viejo.write_bytes(b'%PDF')
+    assert sweep_cache(tmp_path, max_age=60) == 0 and viejo.exists()
+    os.utime(viejo, (0, 0))
+    assert sweep_cache(tmp_path, max_age=60) == 1 and not viejo.exists()
+    assert (tmp_path / f'plan_{plan_id}_r1.pdf').exists()
+    assert client.get('/export/pdf/jobs/desconocido').status_code==404
+
+def test_pdf_sobrevive_a_workers_muertos_y_errores_de_render(tmp_path, monkeypatch):
+    import time
+    from app import main
+    monkeypatch.setattr(PDF_JOBS, 'cache_dir', tmp_path)
+    payload = {"nivel":"intermedio","semanas":1,"disponibilidad":["lun","jue"],
+               "duracion_sesion_min":60,"objetivos":[],"equipamiento":["balon"]}
+    ids = client.post('/api/plans/batch', json=[payload] * 3).json()['plan_ids']
+    assert client.get(f'/export/pdf?plan_id={ids[0]}').status_code == 200
+    # a worker killed (e.g. by the OOM killer) breaks the executor
+    pool = PDF_JOBS._pool
+    for proceso in list(pool._processes.values()):
+        proceso.kill()
+    limite = time.monotonic() + 10
+    while not pool._broken and time.monotonic() < limite:
+        time.sleep(0.01)
+    assert pool._broken
+    r = client.get(f'/export/pdf?plan_id={ids[1]}')
+    assert r.status_code == 200 and r.content.startswith(b'%PDF') and PDF_JOBS._pool is not pool
+    # a render that fails is a 503 with a message, not a traceback
+    monkeypatch.setattr(main, 'plan_export', lambda db, plan_id: {'id': plan_id})
+    r = client.get(f'/export/pdf?plan_id={ids[2]}')
+    assert r.status_code == 503 and r.json()['detail'] == 'PDF rendering failed, try again later'
+
+def test_analitica_incremental_de_carga_y_feedback():
+    payload = {"nivel":"avanzado","semanas":2,"disponibilidad":["lun","mie","vie"],
+               "duracion_sesion_min":60,"objetivos":[],"equipamiento":["balon"]}
+    plan_id = client.post('/api/plan', json=payload).json()['plan_id']
+    plan = client.get(f'/api/plan/{plan_id}').json()['plan']
+    antes = {l['week_idx']: l['feedback'] for l in client.get('/api/analytics/levels?nivel=avanzado').json()['levels']}
+    for pct, rpe in ((80, 6), (60, 8)):
+        with count_queries() as statements:
+            client.post('/api/feedback', json={"plan_id":plan_id,"week_idx":1,"cumplimiento_pct":pct,"rpe_promedio":rpe})
+        # no scans: insert + plan lookup + two summary updates
+        assert not any('GROUP BY' in s or 'count(' in s.lower() for s in statements)
+    weeks = client.get(f'/api/analytics/plans/{plan_id}').json()['weeks']
+    assert [w['week_idx'] for w in weeks] == [0, 1]
+    for w in weeks:
+        sesiones = [s for s in plan['sessions'] if s['week_idx'] == w['week_idx']]
+        assert w['carga_planificada'] == sum(s['carga'] for s in sesiones)
+    assert weeks[0]['feedback'] == 0 and weeks[0]['cumplimiento'] is None
+    assert (weeks[1]['feedback'], weeks[1]['cumplimiento'], weeks[1]['rpe_percibido']) == (2, 70, 7)
+    niveles = client.get('/api/analytics/levels?nivel=avanzado').json()['levels']
+    assert {l['week_idx']: l['feedback'] for l in niveles}[1] == antes.get(1, 0) + 2
+    varios = client.get(f'/api/analytics/plans?plan_ids={plan_id},999999').json()['plans']
+    assert varios[0]['weeks'] == weeks and varios[1] == {'plan_id': 999999, 'weeks': []}
+    assert client.get('/api/analytics/plans/999999').status_code == 404
+
+def test_feedback_adapta_la_semana_siguiente_en_segundo_plano():
+    from app import jobs
+    payload = {"nivel":"intermedio","semanas":2,"disponibilidad":["lun","mie","vie"],
+               "duracion_sesion_min":60,"objetivos":[],"equipamiento":["balon"]}
+    plan_id = client.post('/api/plan', json=payload).json()['plan_id']
+    original = [s for s in client.get(f'/api/plan/{plan_id}').json()['plan']['sessions'] if s['week_idx'] == 1]
+    jobs.run_pending()
+
+    r = client.post('/api/feedback', json={"plan_id":plan_id,"week_idx":0,"cumplimiento_pct":40,"rpe_promedio":8})
+    task_id = r.json()['task_id']
+    assert client.get(f'/api/tasks/{task_id}').json()['status'] == 'pending'
+    assert jobs.run_pending() >= 1
+    assert client.get(f'/api/tasks/{task_id}').json()['status'] == 'done'
+
+    def semana_1():
+        return [s for s in client.get(f'/api/plan/{plan_id}').json()['plan']['sessions'] if s['week_idx'] == 1]
+    adaptada = semana_1()
+    assert sum(s['carga'] for s in adaptada) <= sum(s['carga'] for s in original) * 0.9
+    semanas = client.get(f'/api/analytics/plans/{plan_id}').json()['weeks']
+    assert semanas[1]['carga_planificada'] == sum(s['carga'] for s in adaptada)
+
+    # more (good) feedback re-adapts from the original week instead of compounding
+    for _ in range(3):
+        client.post('/api/feedback', json={"plan_id":plan_id,"week_idx":0,"cumplimiento_pct":100,"rpe_promedio":5})
+    jobs.run_pending()
+    assert [s['rpe'] for s in semana_1()] == [s['rpe'] for s in original]
+    assert client.get('/api/tasks/999999').status_code == 404
+
+def test_feedback_fuera_de_rango_o_de_plan_se_rechaza():
+    payload = {"nivel":"intermedio","semanas":2,"disponibilidad":["lun","mie","vie"],
+               "duracion_sesion_min":60,"objetivos":[],"equipamiento":["balon"]}
+    plan_id = client.post('/api/plan', json=payload).json()['plan_id']
+    valido = {"plan_id":plan_id,"week_idx":0,"cumplimiento_pct":80,"rpe_promedio":6}
+    antes = client.get(f'/api/plan/{plan_id}').json()['plan']
+    for campo, valor in (('week_idx', -1), ('cumplimiento_pct', -50), ('cumplimiento_pct', 101),
+                         ('rpe_promedio', 0), ('rpe_promedio', 900)):
+        assert client.post('/api/feedback', json=dict(valido, **{campo: valor})).status_code == 422, campo
+        assert client.post('/api/feedback/batch', json=[valido, dict(valido, **{campo: valor})]).status_code == 422
+    # unknown plan: 404, a week past the end of the plan: 422
+    assert client.post('/api/feedback', json=dict(valido, plan_id=0)).status_code == 404
+    r = client.post('/api/feedback', json=dict(valido, week_idx=2))
+    assert r.status_code == 422 and 'past the end' in r.json()['detail']
+    assert client.post('/api/feedback/batch', json=[valido, dict(valido, week_idx=2)]).status_code == 422
+    # nothing was stored, queued or adapted
+    assert client.get(f'/api/analytics/plans/{plan_id}').json()['weeks'][0]['feedback'] == 0
+    assert client.get(f'/api/plan/{plan_id}').json()['plan'] == antes
+
+def test_metricas_por_ruta_etapa_y_consultas():
+    payload = {"nivel":"intermedio","semanas":2,"disponibilidad":["lun","jue"],
+               "duracion_sesion_min":60,"objetivos":["tiro"],"equipamiento":["balon"]}
+    plan_id = client.post('/api/plan', json=payload).json()['plan_id']
+    client.get(f'/api/plan/{plan_id}')
+    text = client.get('/metrics').text
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/plan/{plan_id}"}' in text
+    assert 'http_requests_total{method="POST",route="/api/plan",status="200"}' in text
+    # a stored plan is served from its pre-serialized sessions in one statement
+    valores = dict(line.rsplit(' ', 1) for line in text.splitlines() if not line.startswith('#'))
+    serie = '{method="GET",route="/api/plan/{plan_id}"}'
+    assert float(valores['http_request_db_queries_sum' + serie]) == float(valores['http_request_db_queries_count' + serie])
+    for etapa in ('persistence', 'serialization'):
+        assert f'plan_stage_seconds_count{{stage="{etapa}"}}' in text
+    assert 'plan_cache_hits_total' in text and 'drill_pool_cache_hits' in text
+
+def test_plan_guardado_se_sirve_desde_bytes_preserializados(monkeypatch):
+    import json
+    from app import responses
+    from app.db import SessionLocal
+    from app.persistence import load_plan_tree, tree_sessions
+    payload = {"nivel":"avanzado","semanas":2,"disponibilidad":["lun","mie","vie"],
+               "duracion_sesion_min":75,"objetivos":["defensa"],"equipamiento":["balon","conos"]}
+    r = client.post('/api/plan', json=payload)
+    plan_id = r.json()['plan_id']
+    with SessionLocal() as db:
+        p = load_plan_tree(db, plan_id)
+        esperado = {'plan': {'id': p.id, 'semanas': p.semanas, 'nivel': p.nivel, 'sessions': tree_sessions(p.sessions)}}
+        assert p.snapshot is not None and p.snapshot_revision == p.revision
+    assert client.get(f'/api/plan/{plan_id}').json() == esperado
+    # the stdlib fallback produces the same documents
+    monkeypatch.setattr(responses, 'orjson', None)
+    assert json.loads(responses.dumps(esperado)) == esperado
+    assert client.post('/api/plan', json=payload).json()['plan'] == r.json()['plan']
+
+def test_snapshot_obsoleto_o_ausente_se_reconstruye_desde_filas():
+    from sqlalchemy import update
+    from app import models
+    from app.db import SessionLocal
+    payload = {"nivel":"intermedio","semanas":2,"disponibilidad":["lun","jue"],
+               "duracion_sesion_min":60,"objetivos":[],"equipamiento":["balon"]}
+    ids = client.post('/api/plans/batch', json=[payload, dict(payload, nivel="avanzado")]).json()['plan_ids']
+    antes = [client.get(f'/api/plan/{i}').json() for i in ids]
+
+    async def exportar():
+        return b''.join([c async for c in stream_snapshot_csv(plan_snapshots_query(plan_ids=ids), chunk_plans=1)])
+    csv_snapshot = asyncio.run(exportar())
+
+    with SessionLocal() as db:
+        filas = db.execute(plan_rows_query(plan_ids=ids)).all()
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows([CSV_HEADER, *filas])
+    assert csv_snapshot == buffer.getvalue().encode('utf-8')
+    with SessionLocal() as db:
+        db.execute(update(models.Plan).where(models.Plan.id == ids[0]).values(snapshot=None))
+        db.execute(update(models.Plan).where(models.Plan.id == ids[1]).values(revision=models.Plan.revision + 1))
+        db.commit()
+    assert [client.get(f'/api/plan/{i}').json() for i in ids] == antes
+    assert asyncio.run(exportar()) == csv_snapshot
+
+def test_historial_de_planes_por_usuario_paginado_por_cursor():
+    base = {"nivel":"intermedio","semanas":2,"disponibilidad":["lun","jue"],
+            "duracion_sesion_min":60,"objetivos":["tiro"],"equipamiento":["balon"]}
+    usuario = 1
+    base["user_id"] = usuario
+    ids = [client.post('/api/plan', json=base).json()['plan_id'] for _ in range(3)]
+    ids += client.post('/api/plans/batch', json=[base, dict(base, semanas=1), dict(base, user_id=usuario + 1)]).json()['plan_ids'][:2]
+    vistos, cursor = [], None
+    while True:
+        r = client.get(f'/api/users/{usuario}/plans', params={'limit': 2, 'cargas': 'true', **({'cursor': cursor} if cursor else {})})
+        assert r.status_code==200
+        page = r.json()
+        assert len(page['plans']) <= 2 and 'sessions' not in page['plans'][0]
+        vistos += page['plans']
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    assert [p['id'] for p in vistos] == sorted(ids, reverse=True)
+    assert all(p['carga_total'] > 0 and p['feedback'] == 0 for p in vistos)
+    assert len(client.get(f'/api/users/{usuario + 1}/plans').json()['plans']) == 1
+    assert client.get('/api/users/3/plans').json() == {'user_id': 3, 'plans': [], 'next_cursor': None}
+    assert client.get(f'/api/users/{usuario}/plans?cursor=xyz').status_code==422
+
+def test_feedback_en_lote_y_write_behind(monkeypatch):
+    from app import feedback
+    payload = {"nivel":"avanzado","semanas":2,"disponibilidad":["lun","vie"],
+               "duracion_sesion_min":60,"objetivos":[],"equipamiento":["balon"]}
+    plan_id = client.post('/api/plan', json=payload).json()['plan_id']
+    filas = [{"plan_id":plan_id,"week_idx":i % 2,"cumplimiento_pct":80,"rpe_promedio":6} for i in range(10)]
+    r = client.post('/api/feedback/batch', json=filas)
+    assert r.json()['stored'] == 10 and len(r.json()['task_ids']) == 2
+    assert [w['feedback'] for w in client.get(f'/api/analytics/plans/{plan_id}').json()['weeks']] == [5, 5]
+
+    monkeypatch.setattr(feedback, 'FEEDBACK_WRITE_BEHIND', True)
+    r = client.post('/api/feedback', json=filas[0])
+    assert r.status_code == 202 and r.json() == {'status': 'queued'}
+    assert client.get(f'/api/analytics/plans/{plan_id}').json()['weeks'][0]['feedback'] == 5
+    assert feedback.FEEDBACK_BUFFER.flush() == 1
+    assert client.post('/api/feedback', json=dict(filas[0], plan_id=0)).status_code == 404
+    assert client.post('/api/feedback/batch', json=filas + [dict(filas[0], plan_id=0)]).status_code == 404
+    assert client.get(f'/api/analytics/plans/{plan_id}').json()['weeks'][0]['feedback'] == 6
+
+def test_plan_en_streaming_ndjson_semana_a_semana():
+    import json
+    payload = {"nivel":"intermedio","semanas":5,"disponibilidad":["lun","mie","vie"],
+               "duracion_sesion_min":75,"objetivos":["resistencia"],"equipamiento":["balon","conos"]}
+    r = client.post('/api/plan/stream', json=payload)
+    assert r.status_code == 200 and r.headers['content-type'].startswith('application/x-ndjson')
+    lineas = [json.loads(l) for l in r.text.splitlines()]
+    assert [l['week_idx'] for l in lineas[:-1]] == list(range(5))
+    plan_id = lineas[-1]['plan_id']
+    # same plan as the non-streaming endpoint (same cache key and seed)
+    assert [l['sessions'] for l in lineas[:-1]] == client.post('/api/plan', json=payload).json()['plan']['weeks']
+    guardado = client.get(f'/api/plan/{plan_id}').json()['plan']
+    assert [s['rpe'] for s in guardado['sessions']] == [s['indicadores']['RPE'] for l in lineas[:-1] for s in l['sessions']]
+
+
+def test_plan_en_streaming_genera_semanas_bajo_demanda():
+    from app.planner.cache import PlanCache, cached_plan_weeks
+    cache = PlanCache()
+    kwargs = dict(disponibilidad=['lun', 'jue'], duracion_sesion_min=60, nivel='avanzado', objetivos=[],
+                  equipamiento=['balon'], semanas=52)
+    semanas = cached_plan_weeks(cache=cache, **kwargs)
+    next(semanas)
+    semanas.close()  # a client that disconnects after the first week
+    assert len(cache) == 0
+    assert len(list(cached_plan_weeks(cache=cache, **kwargs))) == 52 and len(cache) == 1
+    assert len(list(cached_plan_weeks(cache=cache, **kwargs))) == 52 and cache.hits == 1
+
+
+def test_plan_en_streaming_informa_errores_sin_detalles(monkeypatch):
+    import json
+    from app import main
+    payload = {"nivel":"intermedio","semanas":3,"disponibilidad":["lun","jue"],
+               "duracion_sesion_min":60,"objetivos":[],"equipamiento":["balon"]}
+
+    original = main.cached_plan_weeks
+
+    def semanas_que_fallan(**kwargs):
+        semanas = original(**kwargs)
+        yield next(semanas)
+        semanas.close()
+        raise RuntimeError('detalle interno')
+    monkeypatch.setattr(main, 'cached_plan_weeks', semanas_que_fallan)
+    lineas = [json.loads(l) for l in client.post('/api/plan/stream', json=payload).text.splitlines()]
+    assert lineas[0]['week_idx'] == 0 and lineas[-1] == {'error': 'plan generation failed'}
+    monkeypatch.setattr(main, 'cached_plan_weeks', original)
+
+    def guardado_que_falla(*args):
+        raise RuntimeError('detalle interno')
+    monkeypatch.setattr(main, 'save_plan', guardado_que_falla)
+    lineas = [json.loads(l) for l in client.post('/api/plan/stream', json=payload).text.splitlines()]
+    assert len(lineas) == 4 and lineas[-1] == {'error': 'plan not saved'}
@@ -0,0 +1,65 @@
+from app.planner.cache import PlanCache, cached_generate_plan, prepare_request
+from app.planner.engine import build_plan
+from app.planner.progression import recent_loads
+
+
+def request(**overrides):
+    base = {'disponibilidad': ['lun', 'mar', 'jue'], 'duracion_sesion_min': 60, 'nivel': 'intermedio',
+            'objetivos': ['mejorar tiro', 'Defensa'], 'equipamiento': ['balon', 'conos'], 'semanas': 2}
+    base.update(overrides)
+    return base
+
+
+def test_peticiones_equivalentes_comparten_clave():
+    k1, _ = prepare_request(**request())
+    k2, _ = prepare_request(**request(objetivos=[' defensa', 'Mejorar Tiro'], equipamiento=['conos', 'balon', 'balon']))
+    k3, _ = prepare_request(**request(nivel='avanzado'))
+    # equipment is matched case-sensitively and days name the sessions
+    k4, _ = prepare_request(**request(equipamiento=['Conos', 'balon']))
+    k5, _ = prepare_request(**request(disponibilidad=['Lun', 'mar', 'jue']))
+    assert k1 == k2
+    assert len({k1, k3, k4, k5}) == 4
+
+
+def test_la_cache_no_altera_la_peticion():
+    pedido = request(disponibilidad=['Lun', ' ', 'MIE'], equipamiento=['Balon'])
+    plan = cached_generate_plan(cache=PlanCache(), **pedido).to_dict()
+    _, kwargs = prepare_request(**pedido)
+    assert plan == build_plan(**kwargs)
+    assert [s['dia'] for s in plan['weeks'][0]] == ['Lun', ' ', 'MIE']
+
+
+def test_historial_empatado_usa_la_ultima_entrada_como_el_motor():
+    historial = [{'semana': 1, 'carga_total': 900}, {'semana': 2, 'carga_total': 500},
+                 {'semana': 2, 'carga_total': 1200}, {'semana': 0, 'carga_total': 100}]
+    assert recent_loads(historial, 1) == [sorted(historial, key=lambda x: x['semana'])[-1]['carga_total']]
+    assert recent_loads(historial, 3) == [e['carga_total'] for e in sorted(historial, key=lambda x: x['semana'])[-3:]]
+    # the key follows the entry the planner uses
+    k1, _ = prepare_request(**request(historial_carga=historial))
+    k2, _ = prepare_request(**request(historial_carga=[{'semana': 5, 'carga_total': 1200}]))
+    k3, _ = prepare_request(**request(historial_carga=[{'semana': 5, 'carga_total': 500}]))
+    assert k1 == k2 != k3
+
+
+def test_cache_y_generacion_directa_coinciden():
+    cache = PlanCache()
+    cached = cached_generate_plan(cache=cache, **request())
+    assert cached_generate_plan(cache=cache, **request(objetivos=['defensa', 'mejorar tiro'])) is cached
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+    _, normalized = prepare_request(**request())
+    assert build_plan(**normalized) == cached.to_dict()
+
+
+def test_cache_expulsa_por_lru_ttl_y_bytes():
+    now = [0.0]
+    cache = PlanCache(max_entries=2, max_bytes=100, ttl=10, clock=lambda: now[0])
+    cache.put('a', {'x': 1}, size=10)
+    cache.put('b', {'x': 2}, size=10)
+    assert cache.get('a') == {'x': 1}
+    cache.put('c', {'x': 3}, size=10)  # evicts 'b', the least recently used
+    assert cache.get('b') is None
+    cache.put('d', {'x': 4}, size=95)  # byte budget forces out older entries
+    assert len(cache) == 1 and cache.bytes == 95
+    now[0] = 11
+    assert cache.get('d') is None
+    assert cache.bytes == 0
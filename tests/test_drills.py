@@ -0,0 +1,61 @@
+import itertools
+import random
+
+from app.planner.drills import DrillIndex, filter_drills, load_drills, pick_drills_for_block
+from benchmarks.fixtures import SYNTHETIC_CATEGORIES, SYNTHETIC_EQUIPMENT, synthetic_drills
+
+EQUIPO = list(SYNTHETIC_EQUIPMENT)
+CATEGORIAS = list(SYNTHETIC_CATEGORIES)
+
+
+def test_drill_index_equivale_a_filter_drills():
+    drills = synthetic_drills(2000) + load_drills()
+    index = DrillIndex(drills)
+    for cat, inten in itertools.product(CATEGORIAS + [None], ['baja', 'media', 'alta', None]):
+        for k in range(len(EQUIPO) + 1):
+            equipo = EQUIPO[:k] + ['desconocido']
+            assert index.filter(cat, inten, equipo) == filter_drills(drills, cat, inten, equipo)
+        assert index.filter(cat, inten, None) == filter_drills(drills, cat, inten, None)
+
+
+def test_pick_drills_con_indice_respeta_equipamiento():
+    index = DrillIndex(synthetic_drills(500))
+    for _ in range(50):
+        selected = pick_drills_for_block(index, 'defensa', 'media', ['conos'], 30)
+        assert all(set(d.equipo_requerido) <= {'conos'} for d in selected)
+
+
+def test_pick_drills_llena_los_minutos_exactos():
+    drills = [
+        {'id': f'x{i}', 'categoria': 'defensa', 'intensidad': 'media', 'min_sugeridos': m, 'equipo_requerido': []}
+        for i, m in enumerate([20, 20, 15, 10])
+    ]
+    index = DrillIndex(drills)
+    for objetivo in (10, 25, 35, 45, 65):
+        for fuente in (drills, index):
+            selected = pick_drills_for_block(fuente, 'defensa', 'media', [], objetivo, rng=random.Random(objetivo))
+            assert sum(d.min_sugeridos for d in selected) == objetivo
+            assert len({d.id for d in selected}) == len(selected)
+    # unreachable targets take the closest total, never an empty block
+    selected = pick_drills_for_block(index, 'defensa', 'media', [], 5, rng=random.Random(0))
+    assert [d.min_sugeridos for d in selected] == [10]
+
+
+def test_pick_drills_variedad_semanal_y_rotacion():
+    index = DrillIndex(synthetic_drills(500))
+    rng = random.Random(3)
+    used = set()
+    for _ in range(4):
+        selected = pick_drills_for_block(index, 'defensa', 'media', EQUIPO, 20, rng=rng, exclude=used)
+        keys = {d.id for d in selected}
+        assert not keys & used
+        used |= keys
+    # with every drill of the pool used last week, they are still available
+    pool = index.filter('defensa', 'media', EQUIPO)
+    recent = {d['id'] for d in pool}
+    assert pick_drills_for_block(index, 'defensa', 'media', EQUIPO, 20, rng=rng, avoid=recent)
+    # a fresh drill wins over the ones used last week
+    fresh = pool[0]
+    recent.discard(fresh['id'])
+    selected = pick_drills_for_block(index, 'defensa', 'media', EQUIPO, fresh['min_sugeridos'], rng=rng, avoid=recent)
+    assert [d.id for d in selected] == [fresh['id']]
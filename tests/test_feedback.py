@@ -0,0 +1,136 @@
+import time
+
+import pytest
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.orm import sessionmaker
+
+from app import models
+from app.analytics import backfill, level_trends, plan_weeks
+from app.feedback import FeedbackBuffer, store_feedback_batch
+from app.main import store_feedback
+from app.persistence import save_plan
+from app.planner.engine import build_plan
+from app.schemas import PlanRequest
+
+
+def make_db(tmp_path, nombre, claves_foraneas=False):
+    # a file database: the flush thread uses its own connection
+    engine = create_engine(f"sqlite:///{tmp_path / nombre}")
+    if claves_foraneas:
+        # enforce foreign keys like Postgres does
+        event.listen(engine, 'connect', lambda conn, _: conn.execute('PRAGMA foreign_keys=ON'))
+    models.Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    req = PlanRequest(nivel='intermedio', semanas=2, disponibilidad=['lun', 'jue'],
+                      duracion_sesion_min=60, objetivos=[], equipamiento=['balon'])
+    with factory() as db:
+        plan_ids = [save_plan(db, req, build_plan(req.disponibilidad, 60, 'intermedio', [], ['balon'], semanas=2))
+                    for _ in range(2)]
+    return engine, factory, plan_ids
+
+
+def filas(plan_ids, n):
+    return [{'plan_id': plan_ids[i % 2], 'week_idx': i % 3 // 2, 'cumplimiento_pct': 50 + i % 50,
+             'rpe_promedio': 4 + i % 5, 'notas': None} for i in range(n)]
+
+
+def test_lote_equivale_a_feedback_individual_con_un_commit(tmp_path):
+    _, uno, ids_uno = make_db(tmp_path, 'uno.db')
+    engine, lote, ids_lote = make_db(tmp_path, 'lote.db')
+    with uno() as db:
+        for r in filas(ids_uno, 200):
+            store_feedback(db, r)
+    commits = []
+    event.listen(engine, 'commit', lambda conn: commits.append(1))
+    with lote() as db:
+        task_ids = store_feedback_batch(db, filas(ids_lote, 200))
+    assert len(commits) == 1
+    # one adaptation task per distinct plan week
+    assert len(task_ids) == 4
+    with uno() as a, lote() as b:
+        assert list(plan_weeks(a, ids_uno).values()) == list(plan_weeks(b, ids_lote).values())
+        assert level_trends(a) == level_trends(b)
+        assert b.scalar(select(func.count()).select_from(models.Feedback)) == 200
+
+
+def test_buffer_escribe_por_tamano_y_al_parar(tmp_path):
+    _, factory, plan_ids = make_db(tmp_path, 'buffer.db')
+    avisos = []
+    buffer = FeedbackBuffer(factory, flush_rows=50, flush_seconds=60, max_rows=1000, on_flush=lambda: avisos.append(1))
+    buffer.start()
+    for r in filas(plan_ids, 120):
+        assert buffer.add(r)
+
+    def guardadas():
+        with factory() as db:
+            return db.scalar(select(func.count()).select_from(models.Feedback))
+    limite = time.monotonic() + 5
+    while guardadas() < 50 and time.monotonic() < limite:
+        time.sleep(0.01)
+    assert guardadas() >= 50  # flushed on size, long before the 60 s interval
+    buffer.stop()
+    assert guardadas() == 120 and len(buffer) == 0 and buffer.flushed == 120 and avisos
+
+
+def test_buffer_conserva_filas_si_falla_y_rechaza_si_esta_lleno(tmp_path):
+    _, factory, plan_ids = make_db(tmp_path, 'fallo.db')
+    caida = {'on': True}
+
+    def sesiones():
+        if caida['on']:
+            raise RuntimeError('base de datos no disponible')
+        return factory()
+    buffer = FeedbackBuffer(sesiones, flush_rows=100, flush_seconds=60, max_rows=3)
+    primeras = filas(plan_ids, 4)
+    assert [buffer.add(r) for r in primeras] == [True, True, True, False]
+    with pytest.raises(RuntimeError):
+        buffer.flush()
+    assert len(buffer) == 3 and buffer.failures == 1
+    caida['on'] = False
+    assert buffer.flush() == 3
+    with factory() as db:
+        guardadas = db.execute(select(models.Feedback.cumplimiento_pct).order_by(models.Feedback.id)).scalars().all()
+    assert guardadas == [r['cumplimiento_pct'] for r in primeras[:3]]
+
+
+def test_una_fila_invalida_no_bloquea_el_buffer(tmp_path):
+    _, factory, plan_ids = make_db(tmp_path, 'invalida.db', claves_foraneas=True)
+    buffer = FeedbackBuffer(factory, flush_rows=100, flush_seconds=60, max_rows=100)
+    buenas = filas(plan_ids, 9)
+    mala = dict(buenas[0], plan_id=999999)  # violates the plan foreign key
+    for r in buenas[:4] + [mala] + buenas[4:]:
+        buffer.add(r)
+    assert buffer.flush() == 9
+    assert len(buffer) == 0 and list(buffer.dead_letters) == [mala] and buffer.dead_lettered == 1
+    with factory() as db:
+        assert db.scalar(select(func.count()).select_from(models.Feedback)) == 9
+        assert db.scalar(select(func.sum(models.PlanWeekStat.feedback_count))) == 9
+    # the next flush is not affected
+    buffer.add(buenas[0])
+    assert buffer.flush() == 1 and buffer.dead_lettered == 1
+
+
+def test_feedback_fuera_de_rango_no_llega_a_los_resumenes(tmp_path):
+    engine, factory, plan_ids = make_db(tmp_path, 'rangos.db')
+    malo = dict(filas(plan_ids, 1)[0], rpe_promedio=900)
+    with factory() as db:
+        with pytest.raises(ValueError):
+            store_feedback(db, malo)
+        with pytest.raises(ValueError):
+            store_feedback_batch(db, filas(plan_ids, 3) + [malo])
+        assert db.scalar(select(func.count()).select_from(models.Feedback)) == 0
+    # the write-behind buffer drops it instead of retrying it forever
+    buffer = FeedbackBuffer(factory, flush_rows=100, flush_seconds=60, max_rows=100)
+    for r in filas(plan_ids, 3) + [malo]:
+        buffer.add(r)
+    assert buffer.flush() == 3 and list(buffer.dead_letters) == [malo]
+    # rows stored before validation are left out of a rebuild
+    with factory() as db:
+        db.add(models.Feedback(**malo))
+        db.query(models.PlanWeekStat).delete()
+        db.query(models.LevelWeekStat).delete()
+        db.commit()
+    backfill(engine)
+    with factory() as db:
+        assert all(t['rpe_percibido'] <= 10 for t in level_trends(db))
+        assert sum(t['feedback'] for t in level_trends(db)) == 3
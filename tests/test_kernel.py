@@ -0,0 +1,61 @@
+import itertools
+import random
+
+import pytest
+
+from app.planner.engine import allocate_minutes, block_percentages, build_week_template, round5
+from app.planner.rules import BLOCK_BASE
+
+np = pytest.importorskip('numpy')
+from app.planner import kernel  # noqa: E402
+
+OBJETIVOS = ['mejorar tiro', 'Manejo de balon', 'resistencia', 'aceleración', 'defensa', 'tiro y defensa', 'estiramientos']
+DIAS = ['lun', 'mar', 'mie', 'jue', 'vie', 'sab', 'dom']
+
+
+def legacy_allocate(total_min, blocks_pct):
+    """The ±5 nudge loop `allocate_minutes` replaced (multiples of 5 only)."""
+    alloc = {k: round5(total_min * v) for k, v in blocks_pct.items()}
+    diff = total_min - sum(alloc.values())
+    keys = list(alloc)
+    i = 0
+    while diff != 0:
+        alloc[keys[i % len(keys)]] += 5 if diff > 0 else -5
+        diff = total_min - sum(alloc.values())
+        i += 1
+    return alloc
+
+
+def random_requests(n, seed=5):
+    rng = random.Random(seed)
+    return [
+        {
+            'disponibilidad': DIAS[: rng.randint(1, 7)],
+            'duracion_sesion_min': rng.randint(20, 150),
+            'nivel': rng.choice(['principiante', 'intermedio', 'avanzado']),
+            'objetivos': rng.sample(OBJETIVOS, rng.randint(0, 4)),
+        }
+        for _ in range(n)
+    ]
+
+
+def test_allocate_minutes_igual_al_bucle_y_termina_sin_multiplo_de_5():
+    for nivel, objetivos in itertools.product(['principiante', 'intermedio', 'avanzado'], [[], ['tiro'], ['defensa', 'resistencia']]):
+        pct = block_percentages(nivel, objetivos)
+        for total in range(20, 181, 5):
+            assert allocate_minutes(total, pct) == legacy_allocate(total, pct)
+    for total in (31, 62, 89, 93):
+        assert sum(allocate_minutes(total, BLOCK_BASE).values()) == total
+
+
+def test_kernel_coincide_con_el_camino_escalar():
+    requests = random_requests(3000)
+    pct = kernel.batch_percentages([r['nivel'] for r in requests], [r['objetivos'] for r in requests])
+    minutes = kernel.batch_block_minutes(requests)
+    templates = kernel.batch_templates(requests)
+    for r, row_pct, row_min, tpl in zip(requests, pct, minutes, templates):
+        scalar_pct = block_percentages(r['nivel'], r['objetivos'])
+        assert row_pct.tolist() == [scalar_pct[k] for k in kernel.BLOCK_KEYS]
+        assert dict(zip(kernel.BLOCK_KEYS, row_min.tolist())) == allocate_minutes(r['duracion_sesion_min'], scalar_pct)
+        assert tpl == build_week_template(r['disponibilidad'], r['duracion_sesion_min'], r['nivel'], r['objetivos'])
+
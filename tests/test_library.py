@@ -0,0 +1,58 @@
+import os
+
+import yaml
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.planner import library
+from app.planner.library import DrillLibrary
+
+DRILL = "{nombre}:\n  categoria: defensa\n  intensidad: media\n  min_sugeridos: 10\n  equipo_requerido: []\n  descripcion: x\n"
+
+
+def write_library(path, *names, mtime_ns=None):
+    path.write_text(''.join(DRILL.format(nombre=n) for n in names), encoding='utf-8')
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_library_recarga_solo_si_cambia_el_archivo(tmp_path):
+    yml = tmp_path / 'drills.yml'
+    write_library(yml, 'a', mtime_ns=1_000_000_000)
+    lib = DrillLibrary(yml)
+    first = lib.current()
+    assert [d['id'] for d in first.drills] == ['a']
+    assert lib.current() is first
+
+    write_library(yml, 'a', 'b', mtime_ns=2_000_000_000)
+    second = lib.current()
+    assert [d['id'] for d in second.drills] == ['a', 'b']
+    assert second.etag != first.etag
+    assert len(second.index) == 2
+    assert lib.reloads == 2
+
+
+def test_snapshot_binario_evita_parsear_yaml(tmp_path, monkeypatch):
+    yml = tmp_path / 'drills.yml'
+    write_library(yml, 'a', 'b')
+    snapshot = tmp_path / 'drills.pickle'
+    DrillLibrary(yml, snapshot).current()
+    assert snapshot.exists()
+
+    def no_yaml(*args, **kwargs):
+        raise AssertionError('YAML should not be parsed when the snapshot is fresh')
+
+    monkeypatch.setattr(yaml, 'load', no_yaml)
+    assert [d['id'] for d in DrillLibrary(yml, snapshot).current().drills] == ['a', 'b']
+
+
+def test_templates_etag_devuelve_304():
+    client = TestClient(app)
+    r = client.get('/api/templates')
+    etag = r.headers['etag']
+    assert r.status_code == 200
+    r2 = client.get('/api/templates', headers={'If-None-Match': etag})
+    assert r2.status_code == 304
+    assert r2.content == b''
+    assert library.DRILL_LIBRARY.current().etag == etag
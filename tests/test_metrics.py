@@ -0,0 +1,28 @@
+from app import metrics
+
+
+def test_histograma_y_contador_en_formato_prometheus():
+    h = metrics.Histogram('demo_seconds', 'Demo.', ('route',), buckets=(0.1, 1.0))
+    for v in (0.05, 0.1, 0.5, 3):
+        h.observe(v, '/x')
+    lines = h.render()
+    assert 'demo_seconds_bucket{route="/x",le="0.1"} 2' in lines
+    assert 'demo_seconds_bucket{route="/x",le="1.0"} 3' in lines
+    assert 'demo_seconds_bucket{route="/x",le="+Inf"} 4' in lines
+    assert 'demo_seconds_count{route="/x"} 4' in lines
+    c = metrics.Counter('demo_total', 'Demo.', ('status',))
+    c.inc(200)
+    c.inc(200)
+    assert 'demo_total{status="200"} 2' in c.render()
+
+
+def test_etapas_sin_coste_cuando_se_desactiva(monkeypatch):
+    antes = metrics.STAGE_SECONDS.count('prueba')
+    with metrics.stage('prueba'):
+        pass
+    assert metrics.STAGE_SECONDS.count('prueba') == antes + 1
+    monkeypatch.setattr(metrics, 'METRICS_ENABLED', False)
+    assert metrics.stage('prueba') is metrics.stage('otra')
+    with metrics.stage('prueba'):
+        pass
+    assert metrics.STAGE_SECONDS.count('prueba') == antes + 1
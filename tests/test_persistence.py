@@ -0,0 +1,59 @@
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app import models
+from app.persistence import ensure_users, save_plan
+from app.planner.engine import build_week_plan
+from app.schemas import PlanRequest
+
+
+def make_db():
+    engine = create_engine('sqlite://')
+    models.Base.metadata.create_all(bind=engine)
+    return engine, sessionmaker(bind=engine)()
+
+
+def test_save_plan_persiste_arbol_completo():
+    engine, db = make_db()
+    req = PlanRequest(nivel='intermedio', semanas=2, disponibilidad=['lun', 'mar', 'jue'],
+                      duracion_sesion_min=60, objetivos=['mejorar tiro'], equipamiento=['balon'])
+    week = build_week_plan(req.disponibilidad, 60, 'intermedio', req.objetivos, req.equipamiento)['weeks'][0]
+    plan = {'semanas': 2, 'weeks': [week, week]}
+
+    commits = []
+    event.listen(engine, 'commit', lambda conn: commits.append(1))
+    plan_id = save_plan(db, req, plan)
+    assert len(commits) == 1
+
+    p = db.get(models.Plan, plan_id)
+    assert len(p.sessions) == 6
+    assert [s.week_idx for s in p.sessions] == [0, 0, 0, 1, 1, 1]
+    for s, generated in zip(p.sessions, week + week):
+        assert s.day_name == generated['dia']
+        assert [b.tipo for b in s.blocks] == [b['tipo'] for b in generated['bloques']]
+
+
+def test_backfill_de_analitica_desde_tablas_base():
+    from app.analytics import backfill, plan_weeks
+    engine, db = make_db()
+    req = PlanRequest(nivel='intermedio', semanas=1, disponibilidad=['lun', 'jue'],
+                      duracion_sesion_min=60, objetivos=[], equipamiento=['balon'])
+    plan = build_week_plan(req.disponibilidad, 60, 'intermedio', [], ['balon'])
+    plan_id = save_plan(db, req, plan)
+    db.add(models.Feedback(plan_id=plan_id, week_idx=0, cumplimiento_pct=90, rpe_promedio=5))
+    db.commit()
+    esperado = plan_weeks(db, [plan_id])[plan_id][0]
+    db.query(models.PlanWeekStat).delete()
+    db.commit()
+    backfill(engine)
+    semana = plan_weeks(db, [plan_id])[plan_id][0]
+    assert semana == dict(esperado, feedback=1, cumplimiento=90, rpe_percibido=5)
+    assert db.query(models.LevelWeekStat).one().feedback_count == 1
+
+
+def test_ensure_users_ignora_los_existentes():
+    _, db = make_db()
+    ensure_users(db, {1, 2})
+    ensure_users(db, {2, 3})  # 2 already exists: no IntegrityError
+    db.commit()
+    assert sorted(u.id for u in db.query(models.User)) == [1, 2, 3]
@@ -1,4 +1,5 @@
-from app.planner.engine import build_week_plan
+from app.planner.engine import build_week_plan, build_plan
+from app.planner.library import DRILL_LIBRARY
 
 def test_sumatoria_minutos_por_sesion():
     plan = build_week_plan(['lun','mar','jue'], 90, 'intermedio', ['mejorar tiro'], ['balon'])
@@ -33,3 +34,103 @@ def test_progresion_carga_no_supera_15_por_ciento():
     week = plan['weeks'][0]
     current = sum(s['indicadores']['carga_sesion'] for s in week)
     assert current <= 1000*1.15
+
+def test_build_plan_genera_n_semanas_con_descarga():
+    plan = build_plan(['lun','mar','jue','sab'], 90, 'intermedio', ['mejorar tiro'], ['balon'], semanas=8)
+    assert plan['semanas'] == 8
+    assert len(plan['weeks']) == 8
+    cargas = [sum(s['indicadores']['carga_sesion'] for s in w) for w in plan['weeks']]
+    # deload weeks (4th, 8th) are lighter than the loading week before them
+    assert cargas[3] < cargas[2]
+    assert cargas[7] < cargas[6]
+    # loading weeks never exceed the previous loading week by more than 15%
+    referencia = cargas[0]
+    for i in range(1, 8):
+        assert cargas[i] <= referencia * 1.15
+        if (i + 1) % 4:
+            referencia = cargas[i]
+
+def test_build_plan_52_semanas():
+    # el tiempo se mide en benchmarks/suite.py (build_plan_52w)
+    args = (['lun','mar','mie','jue','vie','sab'], 90, 'avanzado', ['mejorar tiro','defensa'], ['balon','conos','bandas'])
+    plan = build_plan(*args, semanas=52)
+    assert plan['semanas'] == 52 and len(plan['weeks']) == 52
+    for semana in plan['weeks']:
+        assert len(semana) == 6
+        for s in semana:
+            assert sum(b['min'] for b in s['bloques']) == 90
+    cargas = [sum(s['indicadores']['carga_sesion'] for s in w) for w in plan['weeks']]
+    # cada 4.ª semana es de descarga
+    assert all(cargas[i] < cargas[i - 1] for i in range(3, 52, 4))
+
+def test_generate_plans_deduplica_y_usa_process_pool(monkeypatch):
+    from app.planner import batch
+    from app.planner.cache import PlanCache
+    a = {'disponibilidad':['lun','mar','jue'], 'duracion_sesion_min':60, 'nivel':'intermedio',
+         'objetivos':[], 'equipamiento':['balon'], 'semanas':2}
+    b = dict(a, nivel='avanzado')
+    monkeypatch.setattr(batch, 'PROCESS_POOL_THRESHOLD', 2)
+    plans = batch.generate_plans([a, b, a], cache=PlanCache())
+    assert plans[0] is plans[2]
+    assert [len(p.weeks) for p in plans] == [2, 2, 2]
+    # Los workers devuelven el plan empaquetado: se reconstruye idéntico y
+    # con los mismos objetos Drill de la librería de este proceso
+    monkeypatch.setattr(batch, 'PROCESS_POOL_THRESHOLD', 100)
+    locales = batch.generate_plans([a, b], cache=PlanCache())
+    assert [p.to_dict() for p in plans[:2]] == [p.to_dict() for p in locales]
+    drills = [d for s in plans[0].weeks[0] for blk in s.bloques for d in blk.drills]
+    indice = DRILL_LIBRARY.current().index
+    assert drills and all(d is indice.drill(d.id) for d in drills)
+
+
+
+def test_generate_plans_reconstruye_el_pool_si_muere_un_worker(monkeypatch):
+    import time
+    from app.planner import batch
+    from app.planner.cache import PlanCache
+    monkeypatch.setattr(batch, 'PROCESS_POOL_THRESHOLD', 2)
+    base = {'disponibilidad':['lun','jue'], 'duracion_sesion_min':60, 'nivel':'intermedio',
+            'objetivos':[], 'equipamiento':['balon']}
+    batch.generate_plans([dict(base, semanas=1), dict(base, semanas=2)], cache=PlanCache())
+    pool = batch._pool
+    for proceso in list(pool._processes.values()):
+        proceso.kill()
+    limite = time.monotonic() + 10
+    while not pool._broken and time.monotonic() < limite:
+        time.sleep(0.01)
+    assert pool._broken
+    plans = batch.generate_plans([dict(base, semanas=3), dict(base, semanas=4)], cache=PlanCache())
+    assert [len(p.weeks) for p in plans] == [3, 4] and batch._pool is not pool
+
+def test_plan_compacto_serializa_a_la_forma_de_la_api():
+    from app.planner.engine import generate_plan
+    from app.planner.types import Plan
+    args = (['lun', 'mar', 'jue'], 90, 'intermedio', ['mejorar tiro'], ['balon'])
+    plan = generate_plan(*args, semanas=3, seed=5)
+    assert not hasattr(plan.weeks[0].sessions[0], '__dict__')
+    as_dict = build_plan(*args, semanas=3, seed=5)
+    assert plan.to_dict() == as_dict
+    assert Plan.from_dict(as_dict).to_dict() == as_dict
+    s = as_dict['weeks'][1][0]
+    assert s['indicadores']['carga_sesion'] == s['indicadores']['RPE'] * s['duracion_min']
+
+
+def test_tablas_compiladas_coinciden_con_las_reglas():
+    from app.planner import rules
+    for (nivel, mask), pct in rules.RULE_TABLES.percentages.items():
+        assert pct == rules.compute_block_percentages(nivel, mask)
+        assert rules.RULE_TABLES.block_minutes(60, nivel, mask) == rules.allocate_minutes(60, pct)
+        assert rules.RULE_TABLES.block_minutes(63, nivel, mask) == rules.allocate_minutes(63, pct)
+    for n in range(1, 10):
+        assert rules.RULE_TABLES.intensity_sequence(n) == rules.intensity_sequence(n)
+    patron = rules.get_pattern(4)
+    patron[-1] = 'Alta'
+    assert rules.get_pattern(4)[-1] == 'Baja'
+
+
+def test_objetivos_como_bitset_sin_orden_ni_repeticiones():
+    from app.planner.engine import block_percentages
+    base = block_percentages('intermedio', ['mejorar tiro', 'defensa'])
+    assert block_percentages('intermedio', ['Defensa', 'mejorar tiro']) == base
+    assert block_percentages('intermedio', ['tiro libre', 'defensa', 'mejorar TIRO']) == base
+    assert block_percentages('intermedio', ['estiramientos']) == block_percentages('intermedio', [])
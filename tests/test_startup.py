@@ -0,0 +1,28 @@
+import os
+import sqlite3
+import subprocess
+import sys
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parents[1]
+
+
+def ejecutar(tmp_path, *args):
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp_path / 'arranque.db'}", PYTHONPATH=str(RAIZ))
+    return subprocess.run([sys.executable, *args], cwd=RAIZ, env=env, capture_output=True, text=True, check=True)
+
+
+def tablas(tmp_path):
+    db = tmp_path / 'arranque.db'
+    if not db.exists():
+        return set()
+    with sqlite3.connect(db) as conn:
+        return {r[0] for r in conn.execute("select name from sqlite_master where type='table'")}
+
+
+def test_importar_app_main_no_toca_la_base_ni_importa_dependencias_pesadas(tmp_path):
+    salida = ejecutar(tmp_path, '-c', 'import sys, app.main; print(sorted(m for m in ("numpy", "reportlab", "yaml") if m in sys.modules))')
+    assert salida.stdout.strip() == '[]'
+    assert 'plans' not in tablas(tmp_path)
+    ejecutar(tmp_path, '-m', 'app.startup', 'migrate')
+    assert {'plans', 'sessions', 'blocks', 'tasks', 'plan_week_stats'} <= tablas(tmp_path)